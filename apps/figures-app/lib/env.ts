@@ -9,6 +9,7 @@ const serverSchema = z.object({
   OPENAI_API_KEY: z.string().optional(),
   OPENAI_MODEL: z.string().min(1).default("gpt-4o-mini"),
   OPENAI_TEMPERATURE: z.coerce.number().default(0.2),
+  STATUS_SHARDS: z.coerce.number().int().min(1).default(8),
 });
 
 export const env = serverSchema.parse({
@@ -20,6 +21,7 @@ export const env = serverSchema.parse({
   OPENAI_API_KEY: process.env.OPENAI_API_KEY,
   OPENAI_MODEL: process.env.OPENAI_MODEL ?? process.env.OPENAI_COMPLETION_MODEL,
   OPENAI_TEMPERATURE: process.env.OPENAI_TEMPERATURE,
+  STATUS_SHARDS: process.env.STATUS_SHARDS,
 });
 
 export type ServerEnv = typeof env;
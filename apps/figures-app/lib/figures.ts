@@ -1,4 +1,5 @@
 import {
+  GetCommand,
   PutCommand,
   ScanCommand,
   UpdateCommand,
@@ -9,10 +10,45 @@ import { env } from "@/lib/env";
 
 export const FIGURE_STATUSES = ["ready", "available", "locked", "completed"] as const;
 
+// lambdas/shared/schedule.py と同じ形式。優先度が高く、試行が古いものほど先に選ばれる
+const MAX_PRIORITY = 999;
+
+// lambdas/shared/figure_status.py と同じ書き込みシャーディング（available#07 など）
+const SHARDED_STATUSES = new Set(["available", "locked"]);
+
+function crc32(text: string): number {
+  let crc = 0xffffffff;
+  for (const byte of new TextEncoder().encode(text)) {
+    crc ^= byte;
+    for (let bit = 0; bit < 8; bit += 1) {
+      crc = (crc >>> 1) ^ (0xedb88320 & -(crc & 1));
+    }
+  }
+  return (crc ^ 0xffffffff) >>> 0;
+}
+
+export function statusValue(status: string, pk: string): string {
+  if (!SHARDED_STATUSES.has(status) || env.STATUS_SHARDS <= 1) {
+    return status;
+  }
+  return `${status}#${String(crc32(pk) % env.STATUS_SHARDS).padStart(2, "0")}`;
+}
+
+export function statusState(status: string): string {
+  return status.split("#", 1)[0];
+}
+
+export function readyScheduleKey(priority = 0, lastAttemptAt = 0): string {
+  const clamped = Math.min(MAX_PRIORITY, Math.max(0, Math.trunc(priority)));
+  return `ready#${String(MAX_PRIORITY - clamped).padStart(3, "0")}#${String(lastAttemptAt).padStart(13, "0")}`;
+}
+
 export const figureRecordSchema = z.object({
   pk: z.string(),
   name: z.string(),
   status: z.string(),
+  priority: z.number().optional(),
+  scheduleKey: z.string().optional(),
   youtubeTitle: z.string().optional(),
   bio: z.string().optional(),
   notes: z.string().optional(),
@@ -56,6 +92,7 @@ export const newFigureSchema = z.object({
     .min(1, "youtubeTitle is required")
     .max(100, "youtubeTitle must be 100 characters or fewer"),
   status: z.string().default("ready"),
+  priority: z.number().int().min(0).max(MAX_PRIORITY).optional(),
   bio: z.string().optional(),
   notes: z.string().optional(),
   tags: z.array(z.string().min(1)).optional(),
@@ -85,7 +122,8 @@ export async function listFigures(): Promise<FigureRecord[]> {
       if (!parsed.success) {
         return null;
       }
-      return parsed.data;
+      // 画面ではシャード番号を外した状態名だけを扱う
+      return { ...parsed.data, status: statusState(parsed.data.status) };
     })
     .filter((item): item is FigureRecord => item !== null)
     .sort((a, b) => a.pk.localeCompare(b.pk));
@@ -104,7 +142,9 @@ export async function createFigure(input: NewFigureInput): Promise<FigureRecord>
 
   const item: FigureRecord = {
     pk: nextPk,
-    status: data.status ?? "ready",
+    status: statusValue(data.status ?? "ready", nextPk),
+    priority: data.priority,
+    scheduleKey: data.status === "available" ? readyScheduleKey(data.priority) : undefined,
     name: data.name,
     youtubeTitle: data.youtubeTitle,
     bio: data.bio,
@@ -125,7 +165,7 @@ export async function createFigure(input: NewFigureInput): Promise<FigureRecord>
     }),
   );
 
-  return item;
+  return { ...item, status: statusState(item.status) };
 }
 
 export async function updateFigure(
@@ -159,6 +199,10 @@ export async function updateFigure(
 
   apply("name");
   apply("status");
+  if (data.status !== undefined) {
+    values[":status"] = statusValue(data.status, pk);
+  }
+  apply("priority");
   apply("youtubeTitle");
   apply("bio");
   apply("notes");
@@ -171,6 +215,13 @@ export async function updateFigure(
     return;
   }
 
+  // available にする時点で選定キューに載せる（優先度だけの変更は次回の解放・再スケジュール時に反映）
+  if (data.status === "available") {
+    names["#scheduleKey"] = "scheduleKey";
+    values[":scheduleKey"] = readyScheduleKey(data.priority ?? (await currentPriority(pk)));
+    sets.push("#scheduleKey = :scheduleKey");
+  }
+
   sets.push("#updatedAt = :updatedAt");
 
   await dynamoDocClient.send(
@@ -184,6 +235,17 @@ export async function updateFigure(
   );
 }
 
+async function currentPriority(pk: string): Promise<number> {
+  const response = await dynamoDocClient.send(
+    new GetCommand({
+      TableName: env.FIGURES_TABLE_NAME,
+      Key: { pk },
+      ProjectionExpression: "priority",
+    }),
+  );
+  return Number(response.Item?.priority ?? 0);
+}
+
 function determineNextPk(existing: FigureRecord[]): string {
   const prefix = "figure#";
   const maxId = existing.reduce((max, item) => {
@@ -7,6 +7,7 @@ import * as lambda from "aws-cdk-lib/aws-lambda";
 import * as events from "aws-cdk-lib/aws-events";
 import * as targets from "aws-cdk-lib/aws-events-targets";
 import * as destinations from "aws-cdk-lib/aws-lambda-destinations";
+import * as iam from "aws-cdk-lib/aws-iam";
 
 export class HistricalPersonStack extends cdk.Stack {
   constructor(scope: Construct, id: string, props?: cdk.StackProps) {
@@ -25,6 +26,31 @@ export class HistricalPersonStack extends cdk.Stack {
       sortKey: { name: "pk", type: dynamodb.AttributeType.STRING },
     });
 
+    // 優先度順の選定用（scheduleKey は lambdas/shared/schedule.py が管理する疎なキー）
+    figuresTable.addGlobalSecondaryIndex({
+      indexName: "schedule-index",
+      partitionKey: { name: "status", type: dynamodb.AttributeType.STRING },
+      sortKey: { name: "scheduleKey", type: dynamodb.AttributeType.STRING },
+    });
+
+    // DynamoDB は既存テーブルへの 1 回の更新で GSI を 1 つしか追加できない。
+    // schedule-index も lock-expiry-index も無い既存環境では scripts/deploy.sh が
+    // 先に -c figuresIndexStage=schedule で schedule-index だけを追加し、続けて全体をデプロイする。
+    // （lock-expiry-index がある環境でこのフラグを付けると索引が削除されるので手で付けないこと）
+    const scheduleIndexOnly = this.node.tryGetContext("figuresIndexStage") === "schedule";
+
+    // lock_auto_release が期限切れのロックだけをキー条件で引くための疎なインデックス
+    // （lockedUntil はロック中の人物にだけ存在する）
+    if (!scheduleIndexOnly) {
+      figuresTable.addGlobalSecondaryIndex({
+        indexName: "lock-expiry-index",
+        partitionKey: { name: "status", type: dynamodb.AttributeType.STRING },
+        sortKey: { name: "lockedUntil", type: dynamodb.AttributeType.NUMBER },
+        projectionType: dynamodb.ProjectionType.INCLUDE,
+        nonKeyAttributes: ["failures"],
+      });
+    }
+
     const sayingsTable = new dynamodb.Table(this, "SayingsTable", {
       tableName: "sayings",
       partitionKey: { name: "pk", type: dynamodb.AttributeType.STRING },
@@ -33,10 +59,25 @@ export class HistricalPersonStack extends cdk.Stack {
       removalPolicy: cdk.RemovalPolicy.RETAIN,
     });
 
+    // 全人物横断の近似重複検出用 LSH バケット（pk = バンド#ハッシュ, members = "figurePk|sk" の集合）
+    const sayingBucketsTable = new dynamodb.Table(this, "SayingBucketsTable", {
+      tableName: "saying-buckets",
+      partitionKey: { name: "pk", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      removalPolicy: cdk.RemovalPolicy.RETAIN,
+    });
+
     const artifactsBucket = new s3.Bucket(this, "ArtifactsBucket", {
       autoDeleteObjects: false,
       blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
       enforceSSL: true,
+      lifecycleRules: [
+        {
+          id: "ExpireTtsCache",
+          prefix: "cache/tts/",  // render_audio_video の TTS_CACHE_PREFIX
+          expiration: cdk.Duration.days(90),
+        },
+      ],
     });
 
     // サムネイルバケット（既存バケットを参照）
@@ -68,6 +109,7 @@ export class HistricalPersonStack extends cdk.Stack {
     const baseEnv = {
       DDB_FIGURES: figuresTable.tableName,
       DDB_SAYINGS: sayingsTable.tableName,
+      DDB_SAYING_BUCKETS: sayingBucketsTable.tableName,
       S3_BUCKET: artifactsBucket.bucketName,
       OPENAI_API_KEY: process.env.OPENAI_API_KEY ?? "",
       OPENAI_COMPLETION_MODEL: process.env.OPENAI_COMPLETION_MODEL ?? "gpt-4o",
@@ -77,6 +119,7 @@ export class HistricalPersonStack extends cdk.Stack {
       OPENAI_IMAGE_MODEL: process.env.OPENAI_IMAGE_MODEL ?? "gpt-image-1",
       OPENAI_IMAGE_SIZE: process.env.OPENAI_IMAGE_SIZE ?? "1024x1792",
       LOCK_MINUTES: process.env.LOCK_MINUTES ?? "60",
+      STATUS_SHARDS: process.env.STATUS_SHARDS ?? "8",  // 変える場合は scripts/migrate_status_shards.py を実行
       YT_CLIENT_ID: process.env.YT_CLIENT_ID ?? "",
       YT_CLIENT_SECRET: process.env.YT_CLIENT_SECRET ?? "",
       YT_REFRESH_TOKEN: process.env.YT_REFRESH_TOKEN ?? "",
@@ -88,11 +131,14 @@ export class HistricalPersonStack extends cdk.Stack {
       environment: {
         ...baseEnv,
         THUMBNAIL_BUCKET: thumbnailBucket.bucketName,
+        YT_CHUNK_MB: process.env.YT_CHUNK_MB ?? "16",  // S3 から先読みしながら送るチャンクサイズ
       },
       timeout: cdk.Duration.minutes(15),
     });
 
     // renderAudioVideoを次に定義
+    // ストリーミング出力では最終動画を /tmp に置かないため、作業領域は TTS クリップと中間ファイル分で足りる
+    const renderStreamOutput = (process.env.RENDER_STREAM_OUTPUT ?? "false") === "true";
     const renderAudioVideo = this.createPythonFunction("RenderAudioVideo", {
       entry: path.join(__dirname, "../../lambdas/render_audio_video"),
       environment: {
@@ -100,10 +146,11 @@ export class HistricalPersonStack extends cdk.Stack {
         BGM_S3_BUCKET: "histrical-person-bgm",
         BGM_S3_KEY: "bgm.mp3",
         BGM_VOLUME: "0.15",
+        RENDER_STREAM_OUTPUT: String(renderStreamOutput),
       },
       timeout: cdk.Duration.minutes(15),  // Lambdaの最大タイムアウト
       memorySize: 3008,  // Lambda最大メモリ（このアカウントの上限）
-      ephemeralStorageSize: cdk.Size.gibibytes(5),  // 5GB（100個の動画処理に十分）
+      ephemeralStorageSize: cdk.Size.gibibytes(renderStreamOutput ? 2 : 5),  // 5GB（100個の動画処理に十分）
       layers: [ffmpegLayer, fontsLayer],
       onSuccess: new destinations.LambdaDestination(uploadYoutube, {
         responseOnly: false,
@@ -113,8 +160,11 @@ export class HistricalPersonStack extends cdk.Stack {
     // generateSnippetsを次に定義
     const generateSnippets = this.createPythonFunction("GenerateSnippets", {
       entry: path.join(__dirname, "../../lambdas/generate_snippets_for_figure"),
-      environment: baseEnv,
-      timeout: cdk.Duration.minutes(10),  // 150個生成のため5分→10分に延長
+      environment: {
+        ...baseEnv,
+        FETCH_CONCURRENCY: process.env.FETCH_CONCURRENCY ?? "3",  // OpenAIバッチの同時発行数
+      },
+      timeout: cdk.Duration.minutes(5),  // 残り時間が足りなければ自分を再呼び出しして継続する
       onSuccess: new destinations.LambdaDestination(renderAudioVideo, {
         responseOnly: false,
       }),
@@ -122,7 +172,11 @@ export class HistricalPersonStack extends cdk.Stack {
 
     const selectAndLock = this.createPythonFunction("SelectAndLockFigure", {
       entry: path.join(__dirname, "../../lambdas/select_and_lock_figure"),
-      environment: baseEnv,
+      environment: {
+        ...baseEnv,
+        LEASE_COUNT: process.env.LEASE_COUNT ?? "1",  // 1 回の起動でロックする人物数
+        GENERATE_FUNCTION: generateSnippets.functionName,  // 2 件目以降はここから直接起動
+      },
       timeout: cdk.Duration.seconds(30),
       onSuccess: new destinations.LambdaDestination(generateSnippets, {
         responseOnly: false,
@@ -137,12 +191,22 @@ export class HistricalPersonStack extends cdk.Stack {
 
     // Permissions
     figuresTable.grantReadWriteData(selectAndLock);
+    generateSnippets.grantInvoke(selectAndLock);
     figuresTable.grantReadWriteData(generateSnippets);
     figuresTable.grantReadWriteData(lockAutoRelease);
     figuresTable.grantReadWriteData(renderAudioVideo);
     figuresTable.grantReadWriteData(uploadYoutube);
 
     sayingsTable.grantReadWriteData(generateSnippets);
+    // 時間切れ前に自分自身を非同期で再呼び出しして生成を継続する
+    // （関数ARNを直接参照すると循環依存になるため名前のパターンで許可）
+    generateSnippets.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ["lambda:InvokeFunction"],
+        resources: [`arn:aws:lambda:${this.region}:${this.account}:function:${this.stackName}-GenerateSnippets*`],
+      })
+    );
+    sayingBucketsTable.grantReadWriteData(generateSnippets);
     sayingsTable.grantReadData(renderAudioVideo);
 
     artifactsBucket.grantReadWrite(renderAudioVideo);
@@ -189,11 +253,15 @@ export class HistricalPersonStack extends cdk.Stack {
     }
   ): lambda.Function {
     const { entry, environment, timeout, layers, memorySize, ephemeralStorageSize } = props;
+    // 関数ディレクトリと lambdas/shared だけをアセットに含め、共通モジュールは main.py の隣に置く
+    const lambdasRoot = path.dirname(entry);
+    const functionDir = path.basename(entry);
 
     return new lambda.Function(this, id, {
       runtime: lambda.Runtime.PYTHON_3_13,
       handler: "main.handler",
-      code: lambda.Code.fromAsset(entry, {
+      code: lambda.Code.fromAsset(lambdasRoot, {
+        exclude: ["*", `!${functionDir}`, `!${functionDir}/**`, "!shared", "!shared/**", "**/tests", "**/__pycache__"],
         bundling: {
           image: lambda.Runtime.PYTHON_3_13.bundlingImage,
           command: [
@@ -201,8 +269,10 @@ export class HistricalPersonStack extends cdk.Stack {
             "-c",
             [
               "set -euo pipefail",
+              `cd ${functionDir}`,
               "if [ -f requirements.txt ]; then pip install -r requirements.txt -t /asset-output; fi",
               "cp -R . /asset-output/",
+              "find ../shared -maxdepth 1 -name '*.py' ! -name '__init__.py' -exec cp {} /asset-output/ \\;",
             ].join(" && "),
           ],
         },
@@ -4,15 +4,22 @@ from __future__ import annotations
 
 import json
 import logging
+import math
 import os
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Sequence
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Sequence, Set, Tuple, TypeVar
 
 import boto3
 from boto3.dynamodb.conditions import Key
-from openai import OpenAI
 
+import clients
+import figure_status
+import metrics
+import schedule
 import text_utils
 
 
@@ -23,15 +30,43 @@ OPENAI_MODEL = os.environ.get("OPENAI_COMPLETION_MODEL", "gpt-4o-mini")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 DDB_FIGURES = os.environ.get("DDB_FIGURES", "figures")
 DDB_SAYINGS = os.environ.get("DDB_SAYINGS", "sayings")
+DDB_SAYING_BUCKETS = os.environ.get("DDB_SAYING_BUCKETS", "saying-buckets")
+GLOBAL_DEDUP = os.environ.get("GLOBAL_DEDUP", "true").lower() == "true"
 TARGET_COUNT = 60  # 15分以内に確実に処理できる数
 MAX_ATTEMPTS = 10  # 60個生成に十分な試行回数
 BATCH_SIZE = 15
+BATCH_WRITE_LIMIT = 25  # BatchWriteItem の上限
+BATCH_WRITE_RETRIES = 8
+BATCH_GET_RETRIES = 8
+FETCH_CONCURRENCY = max(1, int(os.environ.get("FETCH_CONCURRENCY", "3")))  # 同時に発行するバッチ数
+# saying-buckets への同時書き込み数（1 言葉あたり LSH_BANDS 件）
+BUCKET_WRITE_CONCURRENCY = max(1, int(os.environ.get("BUCKET_WRITE_CONCURRENCY", "8")))
+SIMILARITY_THRESHOLD = 3
+# 全人物横断の照合: 1 バッチで保存済みの言葉を確かめる上限と、MinHash 推定の誤差を見込んだ余裕
+MAX_GLOBAL_SUSPECTS = max(1, int(os.environ.get("MAX_GLOBAL_SUSPECTS", "50")))
+MINHASH_SLACK = 0.1
+LOCK_MINUTES = int(os.environ.get("LOCK_MINUTES", "60"))
+# 1バッチの想定所要時間（実測で更新）と、打ち切り判断時に残す余裕
+BATCH_ESTIMATE_MS = int(os.environ.get("BATCH_ESTIMATE_MS", "45000"))
+TIME_SAFETY_MS = int(os.environ.get("TIME_SAFETY_MS", "20000"))
+CONTINUING = "continuing"
+T = TypeVar("T")
 
-dynamodb = boto3.resource("dynamodb")
-figures_table = dynamodb.Table(DDB_FIGURES)
-sayings_table = dynamodb.Table(DDB_SAYINGS)
+dynamodb = clients.LazyClient(lambda: boto3.resource("dynamodb"))
+figures_table = clients.LazyClient(lambda: dynamodb.Table(DDB_FIGURES))
+sayings_table = clients.LazyClient(lambda: dynamodb.Table(DDB_SAYINGS))
+buckets_table = clients.LazyClient(lambda: dynamodb.Table(DDB_SAYING_BUCKETS))
+lambda_client = clients.LazyClient(lambda: boto3.client("lambda"))
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+
+def _openai_client():
+    # openai の import は重いので、実際に生成するときまで遅らせる
+    from openai import OpenAI
+
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+openai_client = clients.LazyClient(_openai_client) if OPENAI_API_KEY else None
 
 
 @dataclass
@@ -40,22 +75,30 @@ class Snippet:
     sanitized: str
     normalized: str
     norm_hash: str
+    signature: Tuple[int, ...] | None = None
+
+    def lsh_signature(self) -> Tuple[int, ...]:
+        if self.signature is None:
+            self.signature = text_utils.minhash_signature(self.normalized)
+        return self.signature
 
 
 def _load_existing(figure_pk: str) -> List[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
     last_key = None
-    while True:
-        kwargs = {
-            "KeyConditionExpression": Key("pk").eq(figure_pk),
-        }
-        if last_key:
-            kwargs["ExclusiveStartKey"] = last_key
-        response = sayings_table.query(**kwargs)
-        items.extend(response.get("Items") or [])
-        last_key = response.get("LastEvaluatedKey")
-        if not last_key:
-            break
+    with metrics.timed("ddb.query", table=DDB_SAYINGS) as measurement:
+        while True:
+            kwargs = {
+                "KeyConditionExpression": Key("pk").eq(figure_pk),
+            }
+            if last_key:
+                kwargs["ExclusiveStartKey"] = last_key
+            response = sayings_table.query(**kwargs)
+            items.extend(response.get("Items") or [])
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                break
+        measurement.count = len(items)
     return sorted(items, key=lambda item: item["sk"])
 
 
@@ -84,7 +127,7 @@ def _prepare_snippet(raw: str) -> Snippet | None:
     )
 
 
-def _fetch_batch(name: str) -> List[str]:
+def _fetch_batch(name: str, timeout: float | None = None) -> List[str]:
     if openai_client is None:
         raise RuntimeError("OPENAI_API_KEY must be configured")
 
@@ -100,30 +143,35 @@ def _fetch_batch(name: str) -> List[str]:
         "- 番号や句読点での列挙は避け、同義反復もしないでください\n"
         '【出力形式】{"sayings": ["言葉1", "言葉2", ...]} のJSON形式'
     )
-    response = openai_client.chat.completions.create(
-        model=OPENAI_MODEL,
-        temperature=0.1,
-        top_p=0.5,
-        frequency_penalty=0.3,
-        presence_penalty=0.1,
-        response_format={"type": "json_object"},
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "あなたは歴史文献の専門家です。"
-                    "創作は一切禁止。史料・記録に基づく実際の言葉のみを正確に引用してください。"
-                    "不確実な場合は含めないでください。"
-                ),
-            },
-            {
-                "role": "user",
-                "content": json.dumps(
-                    {"figure": name, "instruction": prompt}, ensure_ascii=False
-                ),
-            },
-        ],
-    )
+    with metrics.timed("openai.chat", model=OPENAI_MODEL) as measurement:
+        response = openai_client.chat.completions.create(
+            model=OPENAI_MODEL,
+            timeout=timeout,
+            temperature=0.1,
+            top_p=0.5,
+            frequency_penalty=0.3,
+            presence_penalty=0.1,
+            response_format={"type": "json_object"},
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "あなたは歴史文献の専門家です。"
+                        "創作は一切禁止。史料・記録に基づく実際の言葉のみを正確に引用してください。"
+                        "不確実な場合は含めないでください。"
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(
+                        {"figure": name, "instruction": prompt}, ensure_ascii=False
+                    ),
+                },
+            ],
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            measurement.properties["tokens"] = usage.total_tokens
 
     try:
         message = response.choices[0].message.content or "{}"
@@ -137,25 +185,296 @@ def _fetch_batch(name: str) -> List[str]:
         raise
 
 
-def _should_reject(snippet: Snippet, registry: Dict[str, Snippet]) -> bool:
+class _TimeBudget:
+    """Decide whether another OpenAI batch can finish before the Lambda deadline."""
+
+    def __init__(self, context: Any) -> None:
+        self._context = context
+        self.batch_ms = float(BATCH_ESTIMATE_MS)
+        self.exhausted = False
+
+    def remaining_ms(self) -> float:
+        if self._context is None or not hasattr(self._context, "get_remaining_time_in_millis"):
+            return float("inf")
+        return float(self._context.get_remaining_time_in_millis())
+
+    def record(self, elapsed_ms: float) -> None:
+        # 遅い側に寄せて見積もる（急に遅くなった場合に備える）
+        self.batch_ms = max(elapsed_ms, (self.batch_ms + elapsed_ms) / 2)
+
+    def request_timeout(self) -> float:
+        """Seconds an OpenAI request may take and still leave the safety margin."""
+        return max(1.0, (self.remaining_ms() - TIME_SAFETY_MS) / 1000)
+
+    def allows_batch(self) -> bool:
+        if self.remaining_ms() > self.batch_ms + TIME_SAFETY_MS:
+            return True
+        self.exhausted = True
+        return False
+
+
+def _timed_fetch(name: str, budget: _TimeBudget) -> List[str]:
+    started = time.monotonic()
+    timeout = budget.request_timeout()
+    batch = _fetch_batch(name, None if timeout == float("inf") else timeout)
+    budget.record((time.monotonic() - started) * 1000)
+    return batch
+
+
+def _iter_batches(
+    name: str, max_batches: int, budget: _TimeBudget, wanted: Callable[[], int] | None = None
+) -> Iterator[List[str]]:
+    """Yield up to max_batches OpenAI batches in request order, FETCH_CONCURRENCY at a time.
+
+    No batch is requested once the time budget says it would not finish in time,
+    or while the batches already in flight cover ``wanted()`` (the batches the
+    caller still needs). Requests that are running when the generator is
+    closed cannot be cancelled; they end at the latest on their timeout, which
+    the time budget caps at the Lambda deadline minus TIME_SAFETY_MS.
+    """
+    executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY)
+    pending: Deque[Future[List[str]]] = deque()
+    submitted = 0
+    try:
+        while True:
+            while (
+                submitted < max_batches
+                and len(pending) < FETCH_CONCURRENCY
+                and (wanted is None or len(pending) < wanted())
+                and budget.allows_batch()
+            ):
+                submitted += 1
+                LOGGER.info("Requesting batch %s for %s", submitted, name)
+                pending.append(executor.submit(_timed_fetch, name, budget))
+            if not pending:
+                return
+            yield pending.popleft().result()
+    finally:
+        # 実行中の要求は待たずに返す（取り消せないのでタイムアウトで終わる）
+        executor.shutdown(wait=False)
+
+
+def _batch_get(
+    table_name: str, keys: List[Dict[str, Any]], budget: _TimeBudget | None = None, **options: Any
+) -> List[Dict[str, Any]]:
+    """BatchGetItem with bounded retries of UnprocessedKeys.
+
+    Keys still unprocessed after BATCH_GET_RETRIES, or when the next back-off
+    would eat into the time budget's safety margin, are skipped with a warning;
+    callers treat the result as best-effort.
+    """
+    items: List[Dict[str, Any]] = []
+    with metrics.timed("ddb.batch_get", table=table_name) as measurement:
+        for start in range(0, len(keys), 100):
+            request = {table_name: {"Keys": keys[start : start + 100], **options}}
+            attempt = 0
+            while request:
+                response = dynamodb.batch_get_item(RequestItems=request)
+                items.extend(response.get("Responses", {}).get(table_name) or [])
+                request = response.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                attempt += 1
+                delay = min(0.05 * 2**attempt, 1.0)
+                if attempt > BATCH_GET_RETRIES or (
+                    budget is not None and budget.remaining_ms() < delay * 1000 + TIME_SAFETY_MS
+                ):
+                    # スロットリングが続いても生成の時間を食い潰さないよう、読めた分だけで続ける
+                    skipped = len(request[table_name]["Keys"])
+                    LOGGER.warning(
+                        "Skipping %s unprocessed keys of %s after %s retries", skipped, table_name, attempt - 1
+                    )
+                    measurement.properties["skipped"] = skipped
+                    break
+                measurement.retries += 1
+                time.sleep(delay)
+        measurement.count = len(items)
+    return items
+
+
+def _find_global_duplicates(
+    figure_pk: str, snippets: Sequence[Snippet], budget: _TimeBudget | None = None
+) -> Set[str]:
+    """Return norm hashes of snippets that near-duplicate another figure's saying.
+
+    Candidates come from the LSH bucket table. Only their stored MinHash
+    signatures are read first; pairs whose estimated Jaccard similarity is too
+    low to be within SIMILARITY_THRESHOLD edits are dropped, and at most
+    MAX_GLOBAL_SUSPECTS sayings (most shared buckets first) are fetched and
+    verified against their text, so a bucket collision alone never rejects a
+    snippet.
+    """
+    if not GLOBAL_DEDUP or not snippets:
+        return set()
+
+    bucket_keys: Dict[str, List[Snippet]] = {}
+    for snippet in snippets:
+        for bucket in text_utils.lsh_buckets(snippet.lsh_signature()):
+            bucket_keys.setdefault(bucket, []).append(snippet)
+
+    # 保存済みの言葉ごとに、共有するバケットの数（似ているほど多い）を数える
+    shared: Dict[Tuple[str, str], int] = {}
+    pairs: Dict[Tuple[str, str], Dict[str, Snippet]] = {}
+    for item in _batch_get(DDB_SAYING_BUCKETS, [{"pk": key} for key in bucket_keys], budget):
+        for member in item.get("members") or ():
+            member_pk, _, member_sk = member.partition("|")
+            if member_pk == figure_pk:
+                continue
+            key = (member_pk, member_sk)
+            shared[key] = shared.get(key, 0) + 1
+            for snippet in bucket_keys[item["pk"]]:
+                pairs.setdefault(key, {})[snippet.norm_hash] = snippet
+    if not pairs:
+        return set()
+    ranked = sorted(pairs, key=lambda key: shared[key], reverse=True)
+    if len(ranked) > MAX_GLOBAL_SUSPECTS:
+        LOGGER.warning("Verifying %s of %s cross-figure suspects", MAX_GLOBAL_SUSPECTS, len(ranked))
+        ranked = ranked[:MAX_GLOBAL_SUSPECTS]
+
+    suspects: Dict[Tuple[str, str], List[Snippet]] = {}
+    signatures = _batch_get(
+        DDB_SAYINGS, [{"pk": pk, "sk": sk} for pk, sk in ranked], budget, ProjectionExpression="pk, sk, minhash"
+    )
+    for item in signatures:
+        key = (item["pk"], item["sk"])
+        packed = item.get("minhash")
+        if packed is None:
+            # 署名を持たない古い言葉は本文で確かめる
+            suspects[key] = list(pairs[key].values())
+            continue
+        signature = text_utils.unpack_signature(bytes(getattr(packed, "value", packed)))
+        close = [
+            snippet
+            for snippet in pairs[key].values()
+            if text_utils.estimated_jaccard(snippet.lsh_signature(), signature)
+            >= text_utils.min_jaccard_within(snippet.normalized, SIMILARITY_THRESHOLD) - MINHASH_SLACK
+        ]
+        if close:
+            suspects[key] = close
+    if not suspects:
+        return set()
+
+    duplicates: Set[str] = set()
+    stored = _batch_get(
+        DDB_SAYINGS,
+        [{"pk": pk, "sk": sk} for pk, sk in suspects],
+        budget,
+        ProjectionExpression="pk, sk, #t",
+        ExpressionAttributeNames={"#t": "text"},
+    )
+    for item in stored:
+        other = text_utils.normalize_ja(text_utils.sanitize(item.get("text", "")))
+        for snippet in suspects[(item["pk"], item["sk"])]:
+            if snippet.norm_hash in duplicates:
+                continue
+            if text_utils.within_distance(snippet.normalized, other, SIMILARITY_THRESHOLD):
+                LOGGER.info("Rejecting %s: duplicates %s/%s", snippet.text, item["pk"], item["sk"])
+                duplicates.add(snippet.norm_hash)
+    return duplicates
+
+
+def _should_reject(
+    snippet: Snippet,
+    registry: Dict[str, Snippet],
+    index: text_utils.NearDuplicateIndex,
+    global_duplicates: Set[str],
+) -> bool:
     if snippet.norm_hash in registry:
         return True
-    existing_norms = [item.normalized for item in registry.values()]
-    return text_utils.is_similar(snippet.normalized, existing_norms, threshold=3)
+    if snippet.norm_hash in global_duplicates:
+        return True
+    return index.has_within(snippet.normalized, SIMILARITY_THRESHOLD)
 
 
-def _put_snippet(figure_pk: str, figure_name: str, sk: str, snippet: Snippet) -> None:
-    now_ms = int(time.time() * 1000)
-    sayings_table.put_item(
-        Item={
-            "pk": figure_pk,
-            "sk": sk,
-            "figure": figure_name,
-            "text": snippet.text,
-            "normHash": snippet.norm_hash,
-            "createdAt": now_ms,
-        }
-    )
+def _register(
+    snippet: Snippet, registry: Dict[str, Snippet], index: text_utils.NearDuplicateIndex
+) -> None:
+    registry[snippet.norm_hash] = snippet
+    index.add(snippet.normalized)
+
+
+class _SnippetWriter:
+    """Buffer accepted snippets and persist them with BatchWriteItem.
+
+    ``flush`` returns only once DynamoDB has acknowledged every buffered item and
+    raises otherwise, so callers can rely on it before marking a figure completed.
+    """
+
+    def __init__(self, figure_pk: str, figure_name: str) -> None:
+        self.figure_pk = figure_pk
+        self.figure_name = figure_name
+        self._pending: List[Tuple[str, Snippet]] = []
+
+    def add(self, sk: str, snippet: Snippet) -> None:
+        self._pending.append((sk, snippet))
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        now_ms = int(time.time() * 1000)
+        items = [
+            {
+                "pk": self.figure_pk,
+                "sk": sk,
+                "figure": self.figure_name,
+                "text": snippet.text,
+                "normHash": snippet.norm_hash,
+                "minhash": text_utils.pack_signature(snippet.lsh_signature()),
+                "createdAt": now_ms,
+            }
+            for sk, snippet in self._pending
+        ]
+        _batch_write(DDB_SAYINGS, items)
+        if GLOBAL_DEDUP:
+            _index_buckets(self.figure_pk, self._pending)
+        LOGGER.info("Persisted %s snippets for %s", len(items), self.figure_name)
+        self._pending.clear()
+
+
+def _batch_write(table_name: str, items: List[Dict[str, Any]]) -> None:
+    with metrics.timed("ddb.batch_write", table=table_name) as measurement:
+        measurement.count = len(items)
+        for start in range(0, len(items), BATCH_WRITE_LIMIT):
+            chunk = items[start : start + BATCH_WRITE_LIMIT]
+            request = {table_name: [{"PutRequest": {"Item": item}} for item in chunk]}
+            attempt = 0
+            while request:
+                response = dynamodb.batch_write_item(RequestItems=request)
+                request = response.get("UnprocessedItems") or {}
+                if request:
+                    attempt += 1
+                    measurement.retries += 1
+                    if attempt > BATCH_WRITE_RETRIES:
+                        raise RuntimeError(f"Unprocessed writes remain for {table_name}")
+                    time.sleep(min(0.05 * 2**attempt, 2.0))
+
+
+def _index_buckets(figure_pk: str, pending: Sequence[Tuple[str, Snippet]]) -> None:
+    """Add flushed snippets to their LSH buckets, one set-ADD per bucket, in parallel."""
+    members: Dict[str, Set[str]] = {}
+    for sk, snippet in pending:
+        for bucket in text_utils.lsh_buckets(snippet.lsh_signature()):
+            members.setdefault(bucket, set()).add(f"{figure_pk}|{sk}")
+    _in_parallel(_add_bucket_members, list(members.items()))
+
+
+def _add_bucket_members(entry: Tuple[str, Set[str]]) -> None:
+    bucket, members = entry
+    with metrics.timed("ddb.index_bucket") as measurement:
+        measurement.count = len(members)
+        buckets_table.update_item(
+            Key={"pk": bucket},
+            UpdateExpression="ADD members :members",
+            ExpressionAttributeValues={":members": members},
+        )
+
+
+def _in_parallel(function: Callable[[T], Any], items: List[T]) -> List[Any]:
+    """Apply function to items with at most BUCKET_WRITE_CONCURRENCY DynamoDB writes in flight."""
+    if len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(BUCKET_WRITE_CONCURRENCY, len(items))) as executor:
+        return list(executor.map(function, items))
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -179,10 +498,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
     existing = _load_existing(figure_pk)
     registry: Dict[str, Snippet] = {}
+    index = text_utils.NearDuplicateIndex()
     for item in existing:
         snippet = _prepare_snippet(item.get("text", ""))
         if snippet:
-            registry[snippet.norm_hash] = snippet
+            _register(snippet, registry, index)
 
     if len(registry) >= TARGET_COUNT:
         _mark_completed(figure_pk)
@@ -193,25 +513,52 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             "name": name,
         }
 
+    # 継続呼び出しの場合は前回までの試行回数を引き継ぐ
+    attempts = int(event.get("attempts", 0))
+    budget = _TimeBudget(context)
     next_index = _determine_next_index(existing)
-    attempts = 0
-    while len(registry) < TARGET_COUNT and attempts < MAX_ATTEMPTS:
-        attempts += 1
-        LOGGER.info("Generating batch %s for %s", attempts, name)
-        batch = _fetch_batch(name)
-        for line in batch:
-            snippet = _prepare_snippet(line)
-            if not snippet:
-                continue
-            if _should_reject(snippet, registry):
-                continue
+    writer = _SnippetWriter(figure_pk, name)
 
-            sk = f"snip#{next_index:06d}"
-            _put_snippet(figure_pk, name, sk, snippet)
-            registry[snippet.norm_hash] = snippet
-            next_index += 1
-            if len(registry) >= TARGET_COUNT:
-                break
+    def wanted() -> int:
+        # 1 バッチで最大 BATCH_SIZE 件しか増えないので、残りの必要数を超えて先に要求しない
+        return math.ceil((TARGET_COUNT - len(registry)) / BATCH_SIZE)
+
+    try:
+        with closing(_iter_batches(name, MAX_ATTEMPTS - attempts, budget, wanted)) as batches:
+            for batch in batches:
+                attempts += 1
+                LOGGER.info("Processing batch %s for %s", attempts, name)
+                prepared = [snippet for snippet in map(_prepare_snippet, batch) if snippet]
+                global_duplicates = _find_global_duplicates(figure_pk, prepared, budget)
+                for snippet in prepared:
+                    if _should_reject(snippet, registry, index, global_duplicates):
+                        continue
+
+                    sk = f"snip#{next_index:06d}"
+                    writer.add(sk, snippet)
+                    _register(snippet, registry, index)
+                    next_index += 1
+                    if len(registry) >= TARGET_COUNT:
+                        break
+                writer.flush()
+                if len(registry) >= TARGET_COUNT:
+                    break
+    except BaseException:
+        # 途中で例外が出ても受理済みの言葉は保存する。保存に失敗しても元の例外を優先して投げ直す
+        try:
+            writer.flush()
+        except Exception:  # noqa: BLE001
+            LOGGER.exception("Failed to persist accepted snippets for %s", name)
+        raise
+    writer.flush()
+
+    if (
+        len(registry) < TARGET_COUNT
+        and budget.exhausted
+        and int(event.get("attempts", 0)) < attempts < MAX_ATTEMPTS
+        and _extend_lock(figure_pk)
+    ):
+        return _continue_later(context, figure_pk, name, attempts, len(registry))
 
     if len(registry) < TARGET_COUNT:
         LOGGER.warning(f"Partial completion: {len(registry)}/{TARGET_COUNT} sayings generated")
@@ -226,7 +573,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 "name": name,
             }
         else:
-            # 30個未満の場合は失敗として扱う
+            # 30個未満の場合は失敗として扱い、バックオフを付けてロックを返す
+            _release_after_failure(figure_pk)
             return {
                 "message": "insufficient sayings",
                 "count": len(registry),
@@ -242,16 +590,92 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
 
+def _continue_later(
+    context: Any, figure_pk: str, name: str, attempts: int, count: int
+) -> Dict[str, Any]:
+    """Re-invoke this function asynchronously to resume from the stored sayings."""
+    LOGGER.info(
+        "Time budget exhausted after %s batches (%s/%s sayings); continuing in a new invocation",
+        attempts,
+        count,
+        TARGET_COUNT,
+    )
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType="Event",
+        Payload=json.dumps(
+            {"figurePk": figure_pk, "name": name, "attempts": attempts}, ensure_ascii=False
+        ).encode("utf-8"),
+    )
+    # render_audio_video はこのメッセージを受け取るとスキップする
+    return {"message": CONTINUING, "count": count, "target": TARGET_COUNT, "attempts": attempts}
+
+
+@metrics.timed_call("ddb.extend_lock")
+def _extend_lock(figure_pk: str) -> bool:
+    now_ms = int(time.time() * 1000)
+    try:
+        figures_table.update_item(
+            Key={"pk": figure_pk},
+            UpdateExpression="SET lockedUntil = :until, updatedAt = :updated",
+            ConditionExpression="begins_with(#s, :locked)",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":locked": figure_status.LOCKED,
+                ":until": now_ms + LOCK_MINUTES * 60 * 1000,
+                ":updated": now_ms,
+            },
+        )
+    except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
+        LOGGER.warning("Lock on %s was released; not continuing generation", figure_pk)
+        return False
+    return True
+
+
+@metrics.timed_call("ddb.mark_completed")
 def _mark_completed(figure_pk: str) -> None:
     now_ms = int(time.time() * 1000)
     figures_table.update_item(
         Key={"pk": figure_pk},
-        UpdateExpression="SET #s = :completed, updatedAt = :updated",
-        ConditionExpression="#s IN (:locked, :completed)",
-        ExpressionAttributeNames={"#s": "status"},
+        # 完了した人物はスケジュール対象とロック期限インデックスから外す
+        UpdateExpression="SET #s = :completed, updatedAt = :updated REMOVE #k, failures, lockedUntil",
+        ConditionExpression="begins_with(#s, :locked) OR #s = :completed",
+        ExpressionAttributeNames={"#s": "status", "#k": schedule.SCHEDULE_KEY},
         ExpressionAttributeValues={
-            ":completed": "completed",
-            ":locked": "locked",
+            ":completed": figure_status.COMPLETED,
+            ":locked": figure_status.LOCKED,
             ":updated": now_ms,
         },
     )
+
+
+@metrics.timed_call("ddb.release_after_failure")
+def _release_after_failure(figure_pk: str) -> None:
+    """Return a failed figure to available with an exponential backoff before its next attempt."""
+    figure = figures_table.get_item(
+        Key={"pk": figure_pk}, ConsistentRead=True, ProjectionExpression="failures"
+    ).get("Item") or {}
+    failures = schedule.failures_of(figure) + 1
+    now_ms = int(time.time() * 1000)
+    retry_at = now_ms + schedule.backoff_ms(failures)
+    try:
+        figures_table.update_item(
+            Key={"pk": figure_pk},
+            UpdateExpression=(
+                "SET #s = :available, failures = :failures, #k = :key, updatedAt = :updated "
+                "REMOVE lockedUntil"
+            ),
+            ConditionExpression="begins_with(#s, :locked)",
+            ExpressionAttributeNames={"#s": "status", "#k": schedule.SCHEDULE_KEY},
+            ExpressionAttributeValues={
+                ":available": figure_status.value(figure_status.AVAILABLE, figure_pk),
+                ":locked": figure_status.LOCKED,
+                ":failures": failures,
+                ":key": schedule.backoff_key(retry_at),
+                ":updated": now_ms,
+            },
+        )
+    except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
+        LOGGER.warning("Lock on %s was already released; leaving its schedule as is", figure_pk)
+        return
+    LOGGER.info("Backing off %s after %s failures until %s", figure_pk, failures, retry_at)
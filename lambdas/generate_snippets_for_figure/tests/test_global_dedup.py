@@ -0,0 +1,164 @@
+import importlib.util
+import pathlib
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+
+FUNCTION_DIR = pathlib.Path(__file__).resolve().parents[1]
+SHARED_DIR = FUNCTION_DIR.parent / "shared"
+
+
+class ThrottledDynamoDB:
+    """BatchGetItem が毎回 1 件だけ返し、残りを UnprocessedKeys に回す"""
+
+    def __init__(self, items=None):
+        self.items = items or {}
+        self.calls = 0
+
+    def batch_get_item(self, RequestItems):
+        self.calls += 1
+        ((table, request),) = RequestItems.items()
+        keys = request["Keys"]
+        found = [self.items.get(tuple(sorted(key.items())), dict(key)) for key in keys[:1]]
+        unprocessed = {table: {**request, "Keys": keys[1:]}} if keys[1:] else {}
+        return {"Responses": {table: found}, "UnprocessedKeys": unprocessed}
+
+
+class Budget:
+    def __init__(self, remaining_ms):
+        self.remaining = remaining_ms
+
+    def remaining_ms(self):
+        return self.remaining
+
+
+@pytest.fixture
+def main(monkeypatch):
+    monkeypatch.setenv("METRICS_ENABLED", "false")
+    monkeypatch.syspath_prepend(str(SHARED_DIR))
+    monkeypatch.syspath_prepend(str(FUNCTION_DIR))
+    spec = importlib.util.spec_from_file_location("generate_snippets_main", FUNCTION_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    # dataclass が自分のモジュールを sys.modules から引くため登録しておく
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    return module
+
+
+def test_batch_get_stops_retrying_after_the_limit(main, monkeypatch):
+    dynamodb = ThrottledDynamoDB()
+    monkeypatch.setattr(main, "dynamodb", dynamodb)
+    monkeypatch.setattr(main, "BATCH_GET_RETRIES", 2)
+
+    items = main._batch_get("sayings", [{"pk": f"figure#{i}"} for i in range(10)])
+
+    assert len(items) == 3
+    assert dynamodb.calls == 3
+
+
+def test_batch_get_keeps_the_time_budget_margin(main, monkeypatch):
+    dynamodb = ThrottledDynamoDB()
+    monkeypatch.setattr(main, "dynamodb", dynamodb)
+
+    items = main._batch_get("sayings", [{"pk": f"figure#{i}"} for i in range(10)], Budget(main.TIME_SAFETY_MS))
+
+    assert len(items) == 1
+    assert dynamodb.calls == 1
+
+
+class SayingsDynamoDB:
+    """saying-buckets と sayings の BatchGetItem を辞書から返し、読んだ属性を記録する"""
+
+    def __init__(self, buckets, sayings):
+        self.buckets = buckets
+        self.sayings = sayings
+        self.reads = []
+
+    def batch_get_item(self, RequestItems):
+        ((table, request),) = RequestItems.items()
+        if table == "saying-buckets":
+            found = [
+                {"pk": key["pk"], "members": self.buckets[key["pk"]]}
+                for key in request["Keys"]
+                if key["pk"] in self.buckets
+            ]
+        else:
+            self.reads.append((request["ProjectionExpression"], [key["sk"] for key in request["Keys"]]))
+            found = [self.sayings[key["sk"]] for key in request["Keys"]]
+        return {"Responses": {table: found}}
+
+
+def test_global_dedup_reads_text_only_for_close_signatures(main, monkeypatch):
+    text_utils = main.text_utils
+    snippet = main._prepare_snippet("人は城、人は石垣、人は堀、情けは味方、仇は敵なり")
+    near = text_utils.normalize_ja("人は城、人は石垣、人は堀、情けは味方、仇は敵")
+    other = text_utils.normalize_ja("為せば成る為さねば成らぬ何事も")
+    sayings = {
+        sk: {
+            "pk": "figure#other",
+            "sk": sk,
+            "text": text,
+            "minhash": text_utils.pack_signature(text_utils.minhash_signature(text)),
+        }
+        for sk, text in (("snip#000001", near), ("snip#000002", other))
+    }
+    # 無関係な言葉もバケットが衝突したことにする
+    bucket = text_utils.lsh_buckets(snippet.lsh_signature())[0]
+    dynamodb = SayingsDynamoDB({bucket: {"figure#other|snip#000001", "figure#other|snip#000002"}}, sayings)
+    monkeypatch.setattr(main, "dynamodb", dynamodb)
+
+    assert main._find_global_duplicates("figure#self", [snippet]) == {snippet.norm_hash}
+    signature_read, text_read = dynamodb.reads
+    assert signature_read[0] == "pk, sk, minhash"
+    assert sorted(signature_read[1]) == ["snip#000001", "snip#000002"]
+    assert text_read[1] == ["snip#000001"]
+
+
+def test_global_dedup_caps_the_suspects_per_batch(main, monkeypatch):
+    text_utils = main.text_utils
+    snippet = main._prepare_snippet("為せば成る為さねば成らぬ何事も")
+    buckets = text_utils.lsh_buckets(snippet.lsh_signature())
+    sayings = {f"snip#{i:06d}": {"pk": "figure#other", "sk": f"snip#{i:06d}"} for i in range(5)}
+    # snip#000004 が最も多くのバケットを共有する
+    members = {
+        bucket: {f"figure#other|snip#{i:06d}" for i in range(5) if position < 2 or i == 4}
+        for position, bucket in enumerate(buckets)
+    }
+    dynamodb = SayingsDynamoDB(members, sayings)
+    monkeypatch.setattr(main, "dynamodb", dynamodb)
+    monkeypatch.setattr(main, "MAX_GLOBAL_SUSPECTS", 1)
+
+    main._find_global_duplicates("figure#self", [snippet])
+
+    assert dynamodb.reads[0][1] == ["snip#000004"]
+
+
+class Context:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_iter_batches_requests_no_more_than_still_wanted(main, monkeypatch):
+    timeouts = []
+
+    def fetch(name, timeout=None):
+        timeouts.append(timeout)
+        return [name]
+
+    monkeypatch.setattr(main, "_fetch_batch", fetch)
+    monkeypatch.setattr(main, "FETCH_CONCURRENCY", 3)
+    budget = main._TimeBudget(Context(600_000))
+
+    batches = main._iter_batches("figure", 10, budget, wanted=lambda: 1)
+    assert next(batches) == ["figure"]
+    batches.close()
+
+    # 必要なのが 1 バッチなら並列数が空いていても 1 つしか要求しない
+    assert len(timeouts) == 1
+    assert timeouts[0] == pytest.approx((600_000 - main.TIME_SAFETY_MS) / 1000, abs=1)
@@ -1,3 +1,5 @@
+import random
+
 import pytest
 
 from lambdas.generate_snippets_for_figure import text_utils
@@ -33,3 +35,91 @@ def test_levenshtein_distance(a, b, expected):
 def test_is_similar_threshold():
     assert text_utils.is_similar("志を磨け", ["志を磨け"], threshold=0)
     assert not text_utils.is_similar("志を磨け", ["心を磨け"], threshold=0)
+
+
+@pytest.mark.parametrize(
+    ("a", "b", "k", "expected"),
+    [
+        ("志を磨け", "志を磨け", 0, True),
+        ("志を磨け", "心を磨け", 0, False),
+        ("志を磨け", "心を磨け", 1, True),
+        ("努力を惜しまない", "努力は惜しまない", 3, True),
+        ("志", "志を磨けば道は開ける", 3, False),
+        ("", "あいう", 3, True),
+        ("てんかふぶ", "ふぶてんか", 3, False),
+    ],
+)
+def test_within_distance(a, b, k, expected):
+    assert text_utils.within_distance(a, b, k) is expected
+
+
+def test_within_distance_matches_levenshtein():
+    samples = ["志を磨け", "心を磨け", "志を磨いて進め", "磨け志を", "人は城人は石垣", "人は石垣人は城", ""]
+    for a in samples:
+        for b in samples:
+            distance = text_utils.levenshtein_distance(a, b)
+            for k in range(5):
+                assert text_utils.within_distance(a, b, k) is (distance <= k)
+
+
+def test_near_duplicate_index_matches_linear_scan():
+    samples = ["志を磨け", "心を磨け", "志を磨いて進め", "人は城人は石垣", "人は石垣人は城", "為せば成る"]
+    index = text_utils.NearDuplicateIndex(samples)
+    assert len(index) == len(samples)
+    assert not index.add("志を磨け")
+    for query in ["志を磨く", "人は城", "人は城人は石垣なり", "為さねば成らぬ", "天下布武"]:
+        expected = {text for text in samples if text_utils.levenshtein_distance(query, text) <= 3}
+        assert set(index.query(query, 3)) == expected
+        assert index.has_within(query, 3) is bool(expected)
+
+
+def test_minhash_buckets_collide_for_near_duplicates():
+    base = text_utils.normalize_ja("人は城、人は石垣、人は堀、情けは味方、仇は敵なり")
+    near = text_utils.normalize_ja("人は城、人は石垣、人は堀、情けは味方、仇は敵")
+    other = text_utils.normalize_ja("為せば成る為さねば成らぬ何事も")
+
+    signature = text_utils.minhash_signature(base)
+    assert len(signature) == text_utils.MINHASH_PERMUTATIONS
+    assert text_utils.minhash_signature(base) == signature
+    assert text_utils.unpack_signature(text_utils.pack_signature(signature)) == signature
+
+    buckets = set(text_utils.lsh_buckets(signature))
+    assert len(buckets) == text_utils.LSH_BANDS
+    assert buckets & set(text_utils.lsh_buckets(text_utils.minhash_signature(near)))
+    assert not buckets & set(text_utils.lsh_buckets(text_utils.minhash_signature(other)))
+
+
+def test_lsh_finds_distance_three_pairs_on_short_sayings():
+    rng = random.Random(7)
+    alphabet = [chr(code) for code in range(0x3042, 0x3094)] + list("人生夢道心力天地時愛知信義勇")
+
+    def candidate_rate(length: int, trials: int = 200) -> float:
+        hits = 0
+        for _ in range(trials):
+            base = [rng.choice(alphabet) for _ in range(length)]
+            near = list(base)
+            for position in rng.sample(range(length), 3):
+                near[position] = rng.choice([ch for ch in alphabet if ch != base[position]])
+            a, b = "".join(base), "".join(near)
+            assert text_utils.within_distance(a, b, 3)
+            buckets = set(text_utils.lsh_buckets(text_utils.minhash_signature(a)))
+            hits += bool(buckets & set(text_utils.lsh_buckets(text_utils.minhash_signature(b))))
+        return hits / trials
+
+    # 置換 3 箇所が散らばった最悪ケースでも、短い言葉の大半が候補に上がる
+    assert candidate_rate(10) >= 0.75
+    assert candidate_rate(16) >= 0.95
+
+
+def test_estimated_jaccard_separates_near_duplicates_from_collisions():
+    base = text_utils.normalize_ja("人は城、人は石垣、人は堀、情けは味方、仇は敵なり")
+    near = text_utils.normalize_ja("人は城、人は石垣、人は堀、情けは味方、仇は敵")
+    other = text_utils.normalize_ja("為せば成る為さねば成らぬ何事も")
+    signature = text_utils.minhash_signature(base)
+    floor = text_utils.min_jaccard_within(base, 3)
+
+    assert text_utils.estimated_jaccard(signature, signature) == 1.0
+    assert text_utils.estimated_jaccard(signature, text_utils.minhash_signature(near)) >= floor
+    assert text_utils.estimated_jaccard(signature, text_utils.minhash_signature(other)) < floor
+    # 3 編集で 6 個の 2-gram が変わりうる短い言葉では下限を設けない
+    assert text_utils.min_jaccard_within("志を磨け", 3) == 0.0
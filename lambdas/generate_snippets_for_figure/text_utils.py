@@ -3,9 +3,11 @@
 from __future__ import annotations
 
 import hashlib
+import random
+import struct
 import unicodedata
 from functools import lru_cache
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 import regex as re
 
@@ -19,6 +21,23 @@ _WHITESPACE_RE = re.compile(r"\s+")
 _PARENS_RE = re.compile(r"[（）()［］\[\]｛｝{}「」『』〈〉《》【】＜＞〈〉]")
 _NON_WORD_RE = re.compile(r"[^\p{L}\p{N}]")
 
+# MinHash / LSH parameters. 32 bands of 2 rows put the LSH threshold (50% candidate
+# probability) near Jaccard 0.15 on character bigrams. Three scattered edits on a
+# 10-character saying leave a bigram Jaccard of about 0.2, which becomes a candidate
+# with probability 1-(1-0.2**2)**32 ≈ 0.73; from about 12 characters (Jaccard ≥ 0.3)
+# it is above 0.95. Unrelated sayings (Jaccard ≈ 0.02) collide about 1% of the time.
+# Changing these invalidates saying-buckets; re-run scripts/backfill_saying_buckets.py.
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 32
+_MERSENNE_PRIME = (1 << 61) - 1
+_MINHASH_SEED = 20240601
+_rng = random.Random(_MINHASH_SEED)
+_MINHASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+del _rng
+
 
 def sanitize(text: str) -> str:
     """Collapse spacing, strip brackets, and trim."""
@@ -81,9 +100,199 @@ def levenshtein_distance(a: str, b: str) -> int:
     return previous_row[-1]
 
 
+@lru_cache(maxsize=1024)
+def _pattern_masks(pattern: str) -> Dict[str, int]:
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(pattern):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return masks
+
+
+def _myers_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """Bit-parallel (Myers/Hyyrö) Levenshtein distance.
+
+    When ``limit`` is given the scan stops as soon as the distance is known to
+    exceed it, and any value greater than ``limit`` is returned.
+    """
+    if a == b:
+        return 0
+    # Use the shorter string as the bit-vector pattern.
+    if len(a) > len(b):
+        a, b = b, a
+    m, n = len(a), len(b)
+    if not m:
+        return n
+    if limit is not None and n - m > limit:
+        return n - m
+
+    masks = _pattern_masks(a)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = full
+    mv = 0
+    score = m
+    for j, ch in enumerate(b, start=1):
+        eq = masks.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # The last row can shrink by at most one per remaining column.
+        if limit is not None and score - (n - j) > limit:
+            return score - (n - j)
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def within_distance(a: str, b: str, k: int) -> bool:
+    """Return True when the Levenshtein distance between a and b is at most k."""
+    if k < 0:
+        return False
+    if abs(len(a) - len(b)) > k:
+        return False
+    return _myers_distance(a, b, k) <= k
+
+
 def is_similar(candidate: str, others: Iterable[str], threshold: int = 3) -> bool:
     """Return True when candidate is within threshold Levenshtein distance to any item."""
     for text in others:
-        if levenshtein_distance(candidate, text) <= threshold:
+        if within_distance(candidate, text, threshold):
             return True
     return False
+
+
+def _qgrams(text: str, q: int = 2) -> Set[str]:
+    if len(text) < q:
+        return {text} if text else set()
+    return {text[i : i + q] for i in range(len(text) - q + 1)}
+
+
+def minhash_signature(normalized: str) -> Tuple[int, ...]:
+    """Return a MinHash signature (32-bit values) over character bigrams of normalized text."""
+    hashed = [
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        for gram in _qgrams(normalized)
+    ]
+    if not hashed:
+        return tuple([0xFFFFFFFF] * MINHASH_PERMUTATIONS)
+    return tuple(
+        min((a * value + b) % _MERSENNE_PRIME for value in hashed) & 0xFFFFFFFF
+        for a, b in _MINHASH_PARAMS
+    )
+
+
+def pack_signature(signature: Sequence[int]) -> bytes:
+    return struct.pack(f">{len(signature)}I", *signature)
+
+
+def unpack_signature(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f">{len(data) // 4}I", data)
+
+
+def estimated_jaccard(a: Sequence[int], b: Sequence[int]) -> float:
+    """Share of equal MinHash values, an estimate of the bigram Jaccard similarity."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def min_jaccard_within(text: str, distance: int, q: int = 2) -> float:
+    """Lowest q-gram Jaccard similarity any string within distance edits of text can have.
+
+    Each edit removes at most q of text's grams and adds at most q new ones.
+    """
+    grams = len(_qgrams(text, q))
+    changed = distance * q
+    if grams <= changed:
+        return 0.0
+    return (grams - changed) / (grams + changed)
+
+
+def lsh_buckets(signature: Sequence[int], bands: int = LSH_BANDS) -> List[str]:
+    """Split a signature into bands and hash each band into a bucket key."""
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        chunk = pack_signature(signature[band * rows : (band + 1) * rows])
+        keys.append(f"{band:02d}#{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+    return keys
+
+
+class NearDuplicateIndex:
+    """Incremental q-gram index answering "anything within radius?" queries.
+
+    Each stored string is posted under its distinct q-grams. One edit destroys at
+    most q grams, so a string within ``radius`` edits of the query must share at
+    least ``grams(query) - radius * q`` of them; only those survivors are verified
+    with ``within_distance``.
+    """
+
+    def __init__(self, items: Iterable[str] = (), q: int = 2) -> None:
+        self._q = q
+        self._items: List[str] = []
+        self._gram_counts: List[int] = []
+        self._known: Set[str] = set()
+        self._postings: Dict[str, List[int]] = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, text: str) -> bool:
+        """Insert text; return False when an identical string is already present."""
+        if text in self._known:
+            return False
+        self._known.add(text)
+        ident = len(self._items)
+        grams = _qgrams(text, self._q)
+        self._items.append(text)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(ident)
+        return True
+
+    def query(self, text: str, radius: int) -> List[str]:
+        """Return every stored string within radius of text."""
+        if radius < 0:
+            return []
+        return [
+            self._items[ident]
+            for ident in self._candidates(text, radius)
+            if within_distance(text, self._items[ident], radius)
+        ]
+
+    def has_within(self, text: str, radius: int) -> bool:
+        """Return True as soon as any stored string lies within radius of text."""
+        if radius < 0:
+            return False
+        if text in self._known:
+            return True
+        return any(
+            within_distance(text, self._items[ident], radius)
+            for ident in self._candidates(text, radius)
+        )
+
+    def _candidates(self, text: str, radius: int) -> Iterable[int]:
+        grams = _qgrams(text, self._q)
+        slack = radius * self._q
+        if len(grams) <= slack:
+            # Too short for the count filter to exclude anything.
+            return range(len(self._items))
+        counts: Dict[int, int] = {}
+        for gram in grams:
+            for ident in self._postings.get(gram, ()):
+                counts[ident] = counts.get(ident, 0) + 1
+        required = len(grams) - slack
+        return [
+            ident
+            for ident, shared in counts.items()
+            if shared >= required and shared >= self._gram_counts[ident] - slack
+        ]
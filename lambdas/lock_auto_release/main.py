@@ -1,68 +1,149 @@
-"""Automatically release stale figure locks."""
+"""Automatically release stale figure locks and reschedule figures whose backoff has ended."""
 
 from __future__ import annotations
 
 import logging
 import os
 import time
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
 
 import boto3
 from boto3.dynamodb.conditions import Key
 
+import clients
+import figure_status
+import metrics
+import schedule
+
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
 
 DDB_FIGURES = os.environ.get("DDB_FIGURES", "figures")
-STATUS_INDEX = "status-index"
+# status × lockedUntil。lockedUntil はロック中だけ存在するので、期限切れ候補だけが載る疎なインデックス
+LOCK_EXPIRY_INDEX = "lock-expiry-index"
+RELEASE_CONCURRENCY = max(1, int(os.environ.get("RELEASE_CONCURRENCY", "8")))
 
-dynamodb = boto3.resource("dynamodb")
-figures_table = dynamodb.Table(DDB_FIGURES)
+dynamodb = clients.LazyClient(lambda: boto3.resource("dynamodb"))
+figures_table = clients.LazyClient(lambda: dynamodb.Table(DDB_FIGURES))
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     now_ms = int(time.time() * 1000)
     expired = _find_expired(now_ms)
-    released = 0
-    for item in expired:
-        pk = item["pk"]
-        locked_until = item.get("lockedUntil", 0)
-        try:
+    with metrics.timed("ddb.release_expired") as measurement:
+        released = sum(_in_parallel(lambda item: _release(item, now_ms), expired))
+        measurement.count = released
+    rescheduled = _reschedule_due(now_ms)
+    return {"released": released, "checked": len(expired), "rescheduled": rescheduled}
+
+
+def _release(item: Dict[str, Any], now_ms: int) -> bool:
+    pk = item["pk"]
+    locked_until = item.get("lockedUntil", 0)
+    # 期限切れ = 生成が完了しなかった試行なので、失敗回数に応じて次の試行を遅らせる
+    failures = schedule.failures_of(item) + 1
+    try:
+        with metrics.timed("ddb.release_lock"):
             figures_table.update_item(
                 Key={"pk": pk},
-                UpdateExpression="SET #s = :available, updatedAt = :updated REMOVE lockedUntil",
-                ConditionExpression="#s = :locked AND lockedUntil = :expected",
-                ExpressionAttributeNames={"#s": "status"},
+                UpdateExpression=(
+                    "SET #s = :available, updatedAt = :updated, failures = :failures, #k = :key "
+                    "REMOVE lockedUntil"
+                ),
+                ConditionExpression="begins_with(#s, :locked) AND lockedUntil = :expected",
+                ExpressionAttributeNames={"#s": "status", "#k": schedule.SCHEDULE_KEY},
                 ExpressionAttributeValues={
-                    ":available": "available",
-                    ":locked": "locked",
+                    ":available": figure_status.value(figure_status.AVAILABLE, pk),
+                    ":locked": figure_status.LOCKED,
                     ":updated": now_ms,
                     ":expected": locked_until,
+                    ":failures": failures,
+                    ":key": schedule.backoff_key(now_ms + schedule.backoff_ms(failures)),
                 },
             )
-            released += 1
-        except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
-            LOGGER.info("Lock skipped for %s due to concurrent update", pk)
+    except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
+        LOGGER.info("Lock skipped for %s due to concurrent update", pk)
+        return False
+    return True
+
+
+def _reschedule_due(now_ms: int) -> int:
+    """Give figures whose backoff has ended a ready key again so select_and_lock_figure sees them."""
+    low, high = schedule.due_backoff_range(now_ms)
+    with metrics.timed("ddb.reschedule", index=schedule.SCHEDULE_INDEX) as measurement:
+        due = _query_shards(
+            figure_status.AVAILABLE,
+            lambda partition: {
+                "IndexName": schedule.SCHEDULE_INDEX,
+                "KeyConditionExpression": Key("status").eq(partition)
+                & Key(schedule.SCHEDULE_KEY).between(low, high),
+            },
+        )
+        rescheduled = sum(_in_parallel(lambda item: _reschedule(item, now_ms), due))
+        measurement.count = rescheduled
+    return rescheduled
+
 
-    return {"released": released, "checked": len(expired)}
+def _reschedule(item: Dict[str, Any], now_ms: int) -> bool:
+    try:
+        figures_table.update_item(
+            Key={"pk": item["pk"]},
+            UpdateExpression="SET #k = :ready, updatedAt = :updated",
+            ConditionExpression="begins_with(#s, :available) AND #k = :expected",
+            ExpressionAttributeNames={"#s": "status", "#k": schedule.SCHEDULE_KEY},
+            ExpressionAttributeValues={
+                ":available": figure_status.AVAILABLE,
+                ":ready": schedule.ready_key_for(item),
+                ":expected": item[schedule.SCHEDULE_KEY],
+                ":updated": now_ms,
+            },
+        )
+    except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
+        LOGGER.info("Reschedule skipped for %s due to concurrent update", item["pk"])
+        return False
+    return True
 
 
 def _find_expired(now_ms: int) -> List[Dict[str, Any]]:
-    candidates: List[Dict[str, Any]] = []
+    """Query only locks that have already expired, using the sparse lock-expiry-index."""
+    with metrics.timed("ddb.query", index=LOCK_EXPIRY_INDEX) as measurement:
+        expired = _query_shards(
+            figure_status.LOCKED,
+            lambda partition: {
+                "IndexName": LOCK_EXPIRY_INDEX,
+                "KeyConditionExpression": Key("status").eq(partition) & Key("lockedUntil").lt(now_ms),
+            },
+        )
+        measurement.count = len(expired)
+    return expired
+
+
+def _in_parallel(function: Callable[[Dict[str, Any]], bool], items: List[Dict[str, Any]]) -> List[bool]:
+    """Apply function to items with at most RELEASE_CONCURRENCY DynamoDB writes in flight."""
+    if len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(RELEASE_CONCURRENCY, len(items))) as executor:
+        return list(executor.map(function, items))
+
+
+def _query_shards(state: str, query: Callable[[str], Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run query against every status shard of state in parallel and return all items."""
+    partitions = figure_status.partitions(state)
+    with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+        pages = executor.map(lambda partition: _query_all(query(partition)), partitions)
+        return [item for page in pages for item in page]
+
+
+def _query_all(kwargs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
     last_key = None
     while True:
-        kwargs = {
-            "IndexName": STATUS_INDEX,
-            "KeyConditionExpression": Key("status").eq("locked"),
-        }
         if last_key:
             kwargs["ExclusiveStartKey"] = last_key
         response = figures_table.query(**kwargs)
-        for item in response.get("Items") or []:
-            if int(item.get("lockedUntil", now_ms + 1)) < now_ms:
-                candidates.append(item)
+        items.extend(response.get("Items") or [])
         last_key = response.get("LastEvaluatedKey")
         if not last_key:
-            break
-    return candidates
+            return items
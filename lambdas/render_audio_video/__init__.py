@@ -0,0 +1 @@
+# Package marker for render lambda.
@@ -0,0 +1,241 @@
+"""Read audio durations from container headers without spawning ffprobe."""
+
+from __future__ import annotations
+
+import pathlib
+import struct
+from typing import BinaryIO, Callable, Dict, Optional
+
+# OpenAI TTS の pcm 出力はヘッダなしの 24kHz / 16bit / mono
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+_MP3_BITRATES = {
+    # (mpeg1, layer) -> kbps table indexed by bitrate index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+_ADTS_SAMPLE_RATES = [
+    96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350
+]
+
+
+def read_duration(path: pathlib.Path, fmt: Optional[str] = None) -> Optional[float]:
+    """Return the duration of path in seconds, or None when it cannot be read from headers."""
+    reader = _READERS.get((fmt or path.suffix.lstrip(".")).lower())
+    if reader is None:
+        return None
+    try:
+        with path.open("rb") as handle:
+            duration = reader(handle)
+    except (struct.error, ValueError, IndexError, OSError):
+        return None
+    if duration is None or duration <= 0:
+        return None
+    return duration
+
+
+def _mp3_frame(data: bytes, offset: int) -> Optional[tuple]:
+    """Parse the frame header at offset; return (length, samples, sample_rate, mpeg1, mono)."""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = (b1 >> 3) & 0x3
+    layer = 4 - ((b1 >> 1) & 0x3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, mpeg1, (b3 >> 6) == 3
+
+
+def _read_mp3(handle: BinaryIO) -> Optional[float]:
+    data = handle.read()
+    offset = 0
+    if data[:3] == b"ID3":
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset = 10 + size + (10 if data[5] & 0x10 else 0)
+
+    # 先頭フレームを探す（ゴミデータがあっても同期を取り直す）
+    first = None
+    while offset + 4 <= len(data):
+        frame = _mp3_frame(data, offset)
+        if frame and (offset + frame[0] >= len(data) or _mp3_frame(data, offset + frame[0])):
+            first = frame
+            break
+        offset += 1
+    if first is None:
+        return None
+    _, samples, sample_rate, mpeg1, mono = first
+
+    # Xing/Info (VBR) または VBRI ヘッダがあればフレーム数をそのまま使う
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if data[xing : xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", data[xing + 4 : xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", data[xing + 8 : xing + 12])[0]
+            return frames * samples / sample_rate
+    vbri = offset + 4 + 32
+    if data[vbri : vbri + 4] == b"VBRI":
+        frames = struct.unpack(">I", data[vbri + 14 : vbri + 18])[0]
+        return frames * samples / sample_rate
+
+    total_samples = 0
+    while True:
+        frame = _mp3_frame(data, offset)
+        if frame is None:
+            break
+        total_samples += frame[1]
+        offset += frame[0]
+    return total_samples / sample_rate
+
+
+def _read_adts(handle: BinaryIO) -> Optional[float]:
+    data = handle.read()
+    offset = 0
+    if data[:3] == b"ID3":
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        offset = 10 + size
+    total_samples = 0
+    sample_rate = None
+    while offset + 7 <= len(data):
+        if data[offset] != 0xFF or data[offset + 1] & 0xF6 != 0xF0:
+            break
+        sample_rate = _ADTS_SAMPLE_RATES[(data[offset + 2] >> 2) & 0xF]
+        length = ((data[offset + 3] & 0x3) << 11) | (data[offset + 4] << 3) | (data[offset + 5] >> 5)
+        if length < 7:
+            break
+        total_samples += 1024 * ((data[offset + 6] & 0x3) + 1)
+        offset += length
+    if not sample_rate:
+        return None
+    return total_samples / sample_rate
+
+
+def _read_wav(handle: BinaryIO) -> Optional[float]:
+    header = handle.read(12)
+    if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    while True:
+        chunk = handle.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = handle.read(size)
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            if size % 2:
+                handle.read(1)
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            start = handle.tell()
+            end = handle.seek(0, 2)
+            # ストリーミング出力ではサイズ欄が 0 や 0xFFFFFFFF のことがある
+            if size in (0, 0xFFFFFFFF) or start + size > end:
+                size = end - start
+            return size / byte_rate
+        else:
+            handle.seek(size + (size % 2), 1)
+
+
+def _read_pcm(handle: BinaryIO) -> Optional[float]:
+    size = handle.seek(0, 2)
+    return size / (PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS)
+
+
+def _read_flac(handle: BinaryIO) -> Optional[float]:
+    header = handle.read(4 + 4 + 34)
+    if header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return None
+    packed = int.from_bytes(header[18:26], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def _read_ogg_opus(handle: BinaryIO) -> Optional[float]:
+    head = handle.read(4096)
+    marker = head.find(b"OpusHead")
+    if head[:4] != b"OggS" or marker < 0:
+        return None
+    pre_skip = struct.unpack("<H", head[marker + 10 : marker + 12])[0]
+    size = handle.seek(0, 2)
+    handle.seek(max(0, size - 65536))
+    tail = handle.read()
+    page = tail.rfind(b"OggS")
+    if page < 0:
+        return None
+    granule = struct.unpack("<q", tail[page + 6 : page + 14])[0]
+    return (granule - pre_skip) / 48000
+
+
+def _read_mp4(handle: BinaryIO) -> Optional[float]:
+    end = handle.seek(0, 2)
+    handle.seek(0)
+    return _find_mvhd(handle, end)
+
+
+def _find_mvhd(handle: BinaryIO, end: int) -> Optional[float]:
+    while handle.tell() + 8 <= end:
+        start = handle.tell()
+        size, kind = struct.unpack(">I4s", handle.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", handle.read(8))[0]
+        elif size == 0:
+            size = end - start
+        if size < 8:
+            return None
+        if kind == b"moov":
+            return _find_mvhd(handle, start + size)
+        if kind == b"mvhd":
+            version = handle.read(4)[0]
+            if version == 1:
+                handle.read(16)
+                timescale, duration = struct.unpack(">IQ", handle.read(12))
+            else:
+                handle.read(8)
+                timescale, duration = struct.unpack(">II", handle.read(8))
+            return duration / timescale if timescale else None
+        handle.seek(start + size)
+    return None
+
+
+_READERS: Dict[str, Callable[[BinaryIO], Optional[float]]] = {
+    "mp3": _read_mp3,
+    "aac": _read_adts,
+    "wav": _read_wav,
+    "pcm": _read_pcm,
+    "flac": _read_flac,
+    "opus": _read_ogg_opus,
+    "ogg": _read_ogg_opus,
+    "m4a": _read_mp4,
+    "mp4": _read_mp4,
+}
@@ -0,0 +1,141 @@
+"""Assemble the narration timeline in a NumPy buffer instead of an N-input amix graph."""
+
+from __future__ import annotations
+
+import pathlib
+import subprocess
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence, Tuple
+
+import numpy as np
+
+MIX_SAMPLE_RATE = 48000
+# これを超えるタイムラインは /tmp 上のメモリマップに置く（float32 mono で約 90 分）
+MEMMAP_THRESHOLD_BYTES = 1 << 30
+CHUNK_SAMPLES = 1 << 20
+# loudnorm=I=-16 の代わりに、発話部分の RMS をこの値へ揃える
+TARGET_RMS_DB = -16.0
+CEILING_DB = -1.5
+# amix=inputs=2 と同じく声と BGM を半分ずつ足す
+MIX_WEIGHT = 0.5
+_SILENCE = 1e-4
+
+
+def decode_pcm(path: pathlib.Path, sample_rate: int = MIX_SAMPLE_RATE) -> np.ndarray:
+    """Decode any ffmpeg-readable file to mono float32 PCM."""
+    result = subprocess.run(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-i",
+            str(path),
+            "-f",
+            "f32le",
+            "-ac",
+            "1",
+            "-ar",
+            str(sample_rate),
+            "-",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def allocate_timeline(samples: int, scratch_dir: pathlib.Path) -> np.ndarray:
+    """Return a zeroed float32 buffer, memory-mapped when it would be large."""
+    if samples * 4 > MEMMAP_THRESHOLD_BYTES:
+        return np.memmap(scratch_dir / "timeline.f32", dtype=np.float32, mode="w+", shape=(samples,))
+    return np.zeros(samples, dtype=np.float32)
+
+
+def place(timeline: np.ndarray, pcm: np.ndarray, start: float, sample_rate: int = MIX_SAMPLE_RATE) -> None:
+    """Add pcm into timeline starting at start seconds, clipping at the timeline end."""
+    offset = int(round(start * sample_rate))
+    if offset >= len(timeline):
+        return
+    length = min(len(pcm), len(timeline) - offset)
+    timeline[offset : offset + length] += pcm[:length]
+
+
+def normalize_rms(timeline: np.ndarray, target_db: float = TARGET_RMS_DB) -> float:
+    """Scale timeline so its non-silent samples have the target RMS; return the gain used."""
+    energy = 0.0
+    count = 0
+    for start in range(0, len(timeline), CHUNK_SAMPLES):
+        chunk = timeline[start : start + CHUNK_SAMPLES]
+        voiced = chunk[np.abs(chunk) > _SILENCE]
+        energy += float(np.dot(voiced, voiced))
+        count += len(voiced)
+    if not count or not energy:
+        return 1.0
+    gain = 10 ** (target_db / 20.0) / np.sqrt(energy / count)
+    scale(timeline, gain)
+    return float(gain)
+
+
+def scale(timeline: np.ndarray, gain: float) -> None:
+    for start in range(0, len(timeline), CHUNK_SAMPLES):
+        timeline[start : start + CHUNK_SAMPLES] *= gain
+
+
+def add_looped(timeline: np.ndarray, loop: np.ndarray, volume: float) -> None:
+    """Add loop (repeated end to end) to the whole timeline at volume."""
+    if not len(loop):
+        return
+    for start in range(0, len(timeline), CHUNK_SAMPLES):
+        chunk = timeline[start : start + CHUNK_SAMPLES]
+        indices = np.arange(start, start + len(chunk)) % len(loop)
+        chunk += loop[indices] * volume
+
+
+def soft_limit(timeline: np.ndarray, ceiling_db: float = CEILING_DB) -> None:
+    """Keep peaks under the ceiling with a tanh knee above 80% of it."""
+    ceiling = 10 ** (ceiling_db / 20.0)
+    knee = ceiling * 0.8
+    for start in range(0, len(timeline), CHUNK_SAMPLES):
+        chunk = timeline[start : start + CHUNK_SAMPLES]
+        magnitude = np.abs(chunk)
+        loud = magnitude > knee
+        if loud.any():
+            over = (magnitude[loud] - knee) / (ceiling - knee)
+            chunk[loud] = np.sign(chunk[loud]) * (knee + (ceiling - knee) * np.tanh(over))
+
+
+def write_wav(timeline: np.ndarray, path: pathlib.Path, sample_rate: int = MIX_SAMPLE_RATE) -> None:
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(sample_rate)
+        for start in range(0, len(timeline), CHUNK_SAMPLES):
+            chunk = np.clip(timeline[start : start + CHUNK_SAMPLES], -1.0, 1.0)
+            handle.writeframes((chunk * 32767).astype("<i2").tobytes())
+
+
+def mix_timeline(
+    clips: Sequence[Tuple[pathlib.Path, float]],
+    bgm_path: pathlib.Path,
+    output: pathlib.Path,
+    duration: float,
+    voice_gain: float,
+    bgm_volume: float,
+    workers: int = 8,
+) -> pathlib.Path:
+    """Place (audio_path, start) clips, mix looped BGM, limit, and write one WAV file."""
+    timeline = allocate_timeline(int(np.ceil(duration * MIX_SAMPLE_RATE)), output.parent)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        bgm_future = executor.submit(decode_pcm, bgm_path)
+        decoded = executor.map(decode_pcm, [path for path, _ in clips])
+        for (_, start), pcm in zip(clips, decoded):
+            place(timeline, pcm, start)
+        bgm = bgm_future.result()
+
+    normalize_rms(timeline)
+    scale(timeline, voice_gain * MIX_WEIGHT)
+    add_looped(timeline, bgm, bgm_volume * MIX_WEIGHT)
+    soft_limit(timeline)
+    write_wav(timeline, output)
+    return output
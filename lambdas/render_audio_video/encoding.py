@@ -0,0 +1,96 @@
+"""Video encoder settings and named render profiles for render_audio_video."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+STANDARD = "standard"
+STILL = "still"
+MODES = (STANDARD, STILL)
+
+# ffmpeg の color / loop 入力の既定値
+STANDARD_FPS = 25
+# 静止画 + 字幕の切り替えだけなので 2fps で十分（字幕の切り替えは最大 0.5 秒遅れる）
+STILL_FPS = 2
+# 字幕の切り替えがなくてもこの秒数ごとにキーフレームを入れる
+STILL_MAX_KEYFRAME_SECONDS = 10
+
+
+@dataclass(frozen=True)
+class Profile:
+    """x264 / AAC settings for one render. None leaves the value to ffmpeg."""
+
+    name: str
+    mode: str = STANDARD
+    preset: Optional[str] = None
+    crf: Optional[int] = None
+    threads: int = 0  # 0 は ffmpeg に任せる
+    fps: Optional[int] = None
+    audio_bitrate: str = "192k"
+
+    @property
+    def frame_rate(self) -> int:
+        return self.fps or frame_rate(self.mode)
+
+
+PROFILES: Dict[str, Profile] = {
+    # これまでのハードコードされた設定と同じ
+    "default": Profile("default"),
+    "fast": Profile("fast", mode=STILL, preset="veryfast", crf=28, audio_bitrate="128k"),
+    "balanced": Profile("balanced", mode=STILL, preset="medium", crf=23),
+    "quality": Profile("quality", preset="slow", crf=18, audio_bitrate="256k"),
+}
+
+
+def resolve_profile(name: str, mode: Optional[str] = None) -> Profile:
+    """Look up a named profile; mode (VIDEO_MODE) overrides the profile's own mode when given."""
+    key = (name or "default").strip().lower()
+    if key not in PROFILES:
+        raise ValueError(f"Unknown render profile: {name} (expected one of {', '.join(PROFILES)})")
+    profile = PROFILES[key]
+    if mode:
+        if mode not in MODES:
+            raise ValueError(f"Unknown video mode: {mode} (expected one of {', '.join(MODES)})")
+        profile = replace(profile, mode=mode)
+    return profile
+
+
+def frame_rate(mode: str) -> int:
+    return STILL_FPS if mode == STILL else STANDARD_FPS
+
+
+def video_args(profile: Profile, keyframes: Sequence[float] = ()) -> List[str]:
+    """Return ffmpeg output arguments for the video stream.
+
+    In still mode keyframes are forced at every caption change (``keyframes``,
+    in seconds from the start of the output) so each saying begins on an IDR
+    frame, and scene-cut detection is disabled because nothing else changes.
+    """
+    args = ["-c:v", "libx264", "-tune", "stillimage"]
+    if profile.preset:
+        args += ["-preset", profile.preset]
+    if profile.crf is not None:
+        args += ["-crf", str(profile.crf)]
+    if profile.threads:
+        args += ["-threads", str(profile.threads)]
+    if profile.mode != STILL:
+        return args + ["-pix_fmt", "yuv420p"]
+
+    fps = profile.frame_rate
+    args += ["-r", str(fps)]
+    if keyframes:
+        args += ["-force_key_frames", ",".join(f"{max(0.0, t):.3f}" for t in keyframes)]
+    args += [
+        "-x264-params",
+        f"keyint={fps * STILL_MAX_KEYFRAME_SECONDS}:min-keyint=1:scenecut=0",
+        "-pix_fmt",
+        "yuv420p",
+        "-movflags",
+        "+faststart",
+    ]
+    return args
+
+
+def audio_args(profile: Profile) -> List[str]:
+    return ["-c:a", "aac", "-b:a", profile.audio_bitrate]
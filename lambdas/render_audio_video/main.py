@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import logging
 import os
 import pathlib
@@ -10,14 +11,22 @@ import subprocess
 import tempfile
 import textwrap
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Sequence, Tuple
 
 import boto3
 from boto3.dynamodb.conditions import Key
-from openai import OpenAI
+from boto3.exceptions import S3UploadFailedError
 from botocore.exceptions import ClientError
 
+import audio_duration
+import audio_mixer
+import clients
+import encoding
+import metrics
+import s3_stream
+
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
@@ -35,12 +44,60 @@ BGM_S3_BUCKET = os.environ.get("BGM_S3_BUCKET", S3_BUCKET)
 BGM_S3_KEY = os.environ.get("BGM_S3_KEY")
 BGM_VOLUME = float(os.environ.get("BGM_VOLUME", "0.03"))
 VOICE_GAIN = 10 ** (VOICE_GAIN_DB / 20.0)
+TTS_CONCURRENCY = max(1, int(os.environ.get("TTS_CONCURRENCY", "8")))  # TTS の同時リクエスト数
+TTS_RETRIES = max(1, int(os.environ.get("TTS_RETRIES", "3")))
+TTS_SPEED = 0.75  # 読み上げ速度をさらに遅く（1.0がデフォルト、0.75でゆっくり）
+# ffmpeg: amix グラフで合成する / numpy: クリップを PCM バッファ上で合成する
+# numpy は BGM をモノラルに落とし、loudnorm ではなく RMS で音量を揃えるため出力が変わる。検証が済むまで既定は ffmpeg
+AUDIO_MIXER = os.environ.get("AUDIO_MIXER", "ffmpeg").strip().lower()
+# (AUDIO_MIXER=ffmpeg のとき) false にすると従来の複数段階（音声を段階ごとに再エンコード）で描画する
+RENDER_SINGLE_PASS = os.environ.get("RENDER_SINGLE_PASS", "true").lower() == "true"
+# 分割エンコード: auto は尺とコア数から決める。1 なら分割しない
+RENDER_SEGMENTS = os.environ.get("RENDER_SEGMENTS", "auto").strip().lower()
+if RENDER_SEGMENTS != "auto" and not RENDER_SEGMENTS.isdigit():
+    # 描画の途中で ValueError にならないよう、読み込み時に auto へ戻す
+    LOGGER.warning("Invalid RENDER_SEGMENTS=%r (expected auto or a number); using auto", RENDER_SEGMENTS)
+    RENDER_SEGMENTS = "auto"
+MIN_SEGMENT_SECONDS = float(os.environ.get("MIN_SEGMENT_SECONDS", "60"))
+# standard: ffmpeg 既定の 25fps / still: 低フレームレート + 字幕切り替え時にキーフレーム
+# 空ならプロファイル側のモード（standard / still）を使う
+VIDEO_MODE = os.environ.get("VIDEO_MODE", "").strip().lower() or None
+if VIDEO_MODE and VIDEO_MODE not in encoding.MODES:
+    # 設定の打ち間違いはプロファイル側のモードで描画する（RENDER_PROFILE / RENDER_SEGMENTS と同じ扱い）
+    LOGGER.warning(
+        "Invalid VIDEO_MODE=%r (expected one of %s); using the profile's mode", VIDEO_MODE, ", ".join(encoding.MODES)
+    )
+    VIDEO_MODE = None
+RENDER_PROFILE = os.environ.get("RENDER_PROFILE", "default")
+try:
+    DEFAULT_PROFILE = encoding.resolve_profile(RENDER_PROFILE, VIDEO_MODE)
+except ValueError as error:
+    # 設定の打ち間違いで関数ごと読み込めなくならないよう、既定のプロファイルで描画する
+    LOGGER.warning("%s; using the default profile", error)
+    DEFAULT_PROFILE = encoding.resolve_profile("default", VIDEO_MODE)
+PORTRAIT_EXTENSIONS = ["jpg", "png", "webp"]
+PREPARED_PORTRAIT_PREFIX = "portraits/prepared"
+PORTRAIT_PREP_VERSION = "1"  # _prepare_portrait の変換内容を変えたら上げる
+TTS_CACHE_PREFIX = os.environ.get("TTS_CACHE_PREFIX", "cache/tts").rstrip("/")
+# true なら最終動画を /tmp に書かず、エンコードしながら S3 へマルチパートで送る
+RENDER_STREAM_OUTPUT = os.environ.get("RENDER_STREAM_OUTPUT", "false").lower() == "true"
+STREAM_PART_MB = max(5, int(os.environ.get("STREAM_PART_MB", "16")))
+STREAM_PARTS_IN_FLIGHT = max(1, int(os.environ.get("STREAM_PARTS_IN_FLIGHT", "4")))
+FRAGMENTED_MOVFLAGS = "frag_keyframe+empty_moov+default_base_moof"
+
+
+def _openai_client():
+    # TTS キャッシュと肖像画が揃っていれば OpenAI は使わないので、import ごと遅らせる
+    from openai import OpenAI
+
+    return OpenAI()
+
 
-dynamodb = boto3.resource("dynamodb")
-sayings_table = dynamodb.Table(DDB_SAYINGS)
-figures_table = dynamodb.Table(DDB_FIGURES)
-s3_client = boto3.client("s3")
-openai_client = OpenAI()
+dynamodb = clients.LazyClient(lambda: boto3.resource("dynamodb"))
+sayings_table = clients.LazyClient(lambda: dynamodb.Table(DDB_SAYINGS))
+figures_table = clients.LazyClient(lambda: dynamodb.Table(DDB_FIGURES))
+s3_client = clients.LazyClient(lambda: boto3.client("s3"))
+openai_client = clients.LazyClient(_openai_client)
 
 
 @dataclass
@@ -63,6 +120,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         while "requestPayload" in payload and "responsePayload" in payload:
             payload = payload["responsePayload"]
         event = payload
+
+    # 言葉の生成が別呼び出しで継続中の場合は何もしない
+    if event.get("message") == "continuing":
+        LOGGER.info("Snippet generation is continuing; skipping render")
+        return {"message": "continuing"}
     
     figure_pk = event.get("figurePk")
     name = event.get("name")
@@ -71,6 +133,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         LOGGER.error(f"Missing figurePk or name in event: {event}")
         raise ValueError("figurePk and name are required")
 
+    profile = _event_profile(event.get("renderProfile"))
+    LOGGER.info("Render profile: %s", profile)
+
     sayings = _load_sayings(figure_pk)
     if len(sayings) < 30:
         raise ValueError("Figure must have at least 30 sayings before rendering")
@@ -80,19 +145,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp = pathlib.Path(tmpdir)
         clips = _synthesize_audio(tmp, sayings)
-        merged_audio = _concat_audio(tmp, clips)
         total_duration = clips[-1].end if clips else 0.0
         bgm_source = _resolve_bgm(tmp)
-        audio_with_bgm = _mix_audio_with_bgm(tmp, merged_audio, bgm_source)
-        total_duration = max(total_duration, _probe_duration(audio_with_bgm))
         srt_path = tmp / "captions.srt"
         _write_srt(clips, srt_path)
         ass_path = tmp / "captions.ass"
         _write_ass(clips, ass_path)
         portrait = _resolve_portrait(tmp, name)
         video_path = tmp / "final.mp4"
-        _render_video(audio_with_bgm, ass_path, portrait, video_path)
-        _upload_outputs(name, video_path, srt_path)
+        video_key = f"out/{name}/final.mp4"
+        stream_key = video_key if RENDER_STREAM_OUTPUT else None
+        if AUDIO_MIXER == "numpy":
+            # デコード用の ffmpeg もまとめて計測する
+            with metrics.timed("audio.mix", child_rss=True, clips=len(clips)):
+                mixed_audio = audio_mixer.mix_timeline(
+                    [(clip.audio_path, clip.start) for clip in clips],
+                    bgm_source,
+                    tmp / "audio_mixed.wav",
+                    duration=clips[-1].end + 2.0,  # 最後のクリップ終了+2秒
+                    voice_gain=VOICE_GAIN,
+                    bgm_volume=BGM_VOLUME,
+                    workers=TTS_CONCURRENCY,
+                )
+            total_duration = max(total_duration, _probe_duration(mixed_audio))
+            _encode_video(
+                tmp, clips, total_duration, mixed_audio, ass_path, portrait, video_path, profile, stream_key
+            )
+        elif RENDER_SINGLE_PASS and _segment_count(clips[-1].end + 2.0, len(clips)) > 1:
+            # 長い動画は単一パスと同じ音声グラフで音声だけを作り、映像は区間ごとに並列エンコードする
+            mixed_audio = _mix_single_pass_audio(tmp, clips, bgm_source)
+            total_duration = max(total_duration, _probe_duration(mixed_audio))
+            _encode_video(
+                tmp, clips, total_duration, mixed_audio, ass_path, portrait, video_path, profile, stream_key
+            )
+        elif RENDER_SINGLE_PASS:
+            _render_single_pass(clips, bgm_source, ass_path, portrait, video_path, profile, stream_key)
+            if stream_key:
+                # 出力は手元に残らないので、グラフで切り詰めた尺をそのまま使う
+                total_duration = max(total_duration, clips[-1].end + 2.0)
+            else:
+                total_duration = max(total_duration, _probe_duration(video_path))
+        else:
+            merged_audio = _concat_audio(tmp, clips)
+            audio_with_bgm = _mix_audio_with_bgm(tmp, merged_audio, bgm_source)
+            total_duration = max(total_duration, _probe_duration(audio_with_bgm))
+            _encode_video(
+                tmp, clips, total_duration, audio_with_bgm, ass_path, portrait, video_path, profile, stream_key
+            )
+        _upload_outputs(name, None if stream_key else video_path, srt_path)
 
     _update_figure_video(figure_pk, name, total_duration)
 
@@ -101,49 +201,149 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         "figurePk": figure_pk,
         "name": name,
         "outputs": {
-            "video": f"out/{name}/final.mp4",
+            "video": video_key,
             "captions": f"out/{name}/captions.srt",
         },
     }
 
 
+def _event_profile(name: str | None) -> encoding.Profile:
+    """The profile requested by the event; unknown names fall back like RENDER_PROFILE does."""
+    if not name:
+        return DEFAULT_PROFILE
+    try:
+        return encoding.resolve_profile(name, VIDEO_MODE)
+    except ValueError as error:
+        LOGGER.warning("%s; using %s", error, DEFAULT_PROFILE.name)
+        return DEFAULT_PROFILE
+
+
 def _load_sayings(figure_pk: str) -> Sequence[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
     last_key = None
-    while True:
-        kwargs = {"KeyConditionExpression": Key("pk").eq(figure_pk)}
-        if last_key:
-            kwargs["ExclusiveStartKey"] = last_key
-        response = sayings_table.query(**kwargs)
-        items.extend(response.get("Items") or [])
-        last_key = response.get("LastEvaluatedKey")
-        if not last_key:
-            break
+    with metrics.timed("ddb.query", table=DDB_SAYINGS) as measurement:
+        while True:
+            kwargs = {"KeyConditionExpression": Key("pk").eq(figure_pk)}
+            if last_key:
+                kwargs["ExclusiveStartKey"] = last_key
+            response = sayings_table.query(**kwargs)
+            items.extend(response.get("Items") or [])
+            last_key = response.get("LastEvaluatedKey")
+            if not last_key:
+                break
+        measurement.count = len(items)
     return sorted(items, key=lambda item: item["sk"])
 
 
 def _synthesize_audio(tmp: pathlib.Path, sayings: Sequence[Dict[str, Any]]) -> List[Clip]:
-    clips: List[Clip] = []
-    for index, item in enumerate(sayings, start=1):
-        text = item["text"]
-        output_path = tmp / f"clip_{index:02d}.{OPENAI_TTS_FORMAT}"
-        LOGGER.info("Synthesizing clip %s", index)
-        with openai_client.audio.speech.with_streaming_response.create(
-            model=OPENAI_TTS_MODEL,
-            voice=OPENAI_TTS_VOICE,
-            input=text,
-            response_format=OPENAI_TTS_FORMAT,
-            speed=0.75,  # 読み上げ速度をさらに遅く（1.0がデフォルト、0.75でゆっくり）
-        ) as response:
-            response.stream_to_file(output_path)
-        duration = _probe_duration(output_path)
-        clips.append(Clip(index=index, text=text, audio_path=output_path, duration=duration))
+    """各言葉の音声を TTS_CONCURRENCY 並列で生成する（クリップ順は入力順のまま）。"""
+    with ThreadPoolExecutor(max_workers=TTS_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(_synthesize_clip, tmp, index, item["text"], item.get("normHash"))
+            for index, item in enumerate(sayings, start=1)
+        ]
+        clips = [future.result() for future in futures]
     _apply_timings(clips)
     return clips
 
 
+def _synthesize_clip(tmp: pathlib.Path, index: int, text: str, norm_hash: str | None) -> Clip:
+    output_path = tmp / f"clip_{index:02d}.{OPENAI_TTS_FORMAT}"
+    cache_key = _tts_cache_key(text, norm_hash)
+    duration = _load_cached_clip(cache_key, output_path)
+    if duration is not None:
+        LOGGER.info("TTS cache hit for clip %s: %s", index, cache_key)
+        return Clip(index=index, text=text, audio_path=output_path, duration=duration)
+
+    with metrics.timed("openai.tts", model=OPENAI_TTS_MODEL) as measurement:
+        for attempt in range(1, TTS_RETRIES + 1):
+            LOGGER.info("Synthesizing clip %s (attempt %s)", index, attempt)
+            try:
+                with openai_client.audio.speech.with_streaming_response.create(
+                    model=OPENAI_TTS_MODEL,
+                    voice=OPENAI_TTS_VOICE,
+                    input=text,
+                    response_format=OPENAI_TTS_FORMAT,
+                    speed=TTS_SPEED,
+                ) as response:
+                    response.stream_to_file(output_path)
+                break
+            except Exception as error:  # noqa: BLE001
+                if attempt == TTS_RETRIES:
+                    raise
+                measurement.retries += 1
+                LOGGER.warning("TTS failed for clip %s: %s; retrying", index, error)
+                time.sleep(min(2.0**attempt, 10.0))
+        measurement.add_bytes(output_path.stat().st_size)
+    duration = _probe_duration(output_path)
+    _store_cached_clip(cache_key, output_path, duration)
+    return Clip(index=index, text=text, audio_path=output_path, duration=duration)
+
+
+def _tts_cache_key(text: str, norm_hash: str | None) -> str:
+    """同じ言葉・同じ音声設定なら同じキーになる（内容アドレス方式）。"""
+    identity = "|".join(
+        [
+            norm_hash or hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            OPENAI_TTS_MODEL,
+            OPENAI_TTS_VOICE,
+            f"{TTS_SPEED:g}",
+            OPENAI_TTS_FORMAT,
+        ]
+    )
+    digest = hashlib.sha256(identity.encode("utf-8")).hexdigest()
+    return f"{TTS_CACHE_PREFIX}/{digest}.{OPENAI_TTS_FORMAT}"
+
+
+def _load_cached_clip(cache_key: str, destination: pathlib.Path) -> float | None:
+    """キャッシュにあれば音声を保存し、メタデータの長さを返す。"""
+    with metrics.timed("s3.get", purpose="tts-cache") as measurement:
+        try:
+            response = s3_client.get_object(Bucket=S3_BUCKET, Key=cache_key)
+        except ClientError as error:
+            if error.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+            measurement.properties["hit"] = False
+            return None
+        duration = response.get("Metadata", {}).get("duration")
+        if duration is None:
+            # 本文を読まずに返すので閉じて接続をプールへ戻す
+            response["Body"].close()
+            measurement.properties["hit"] = False
+            return None
+        with destination.open("wb") as handle:
+            for chunk in response["Body"].iter_chunks():
+                handle.write(chunk)
+                measurement.add_bytes(len(chunk))
+        measurement.properties["hit"] = True
+    return float(duration)
+
+
+def _store_cached_clip(cache_key: str, path: pathlib.Path, duration: float) -> None:
+    try:
+        with metrics.timed("s3.upload", purpose="tts-cache") as measurement:
+            measurement.add_bytes(path.stat().st_size)
+            s3_client.upload_file(
+                str(path),
+                S3_BUCKET,
+                cache_key,
+                ExtraArgs={"Metadata": {"duration": repr(duration)}},
+            )
+    except (ClientError, S3UploadFailedError) as error:
+        # キャッシュ保存の失敗でレンダリングは止めない（upload_file は ClientError を S3UploadFailedError で包む）
+        LOGGER.warning("Unable to cache TTS clip %s: %s", cache_key, error)
+
+
 def _probe_duration(path: pathlib.Path) -> float:
-    result = subprocess.run(
+    """ヘッダから長さを読む。読めない形式のときだけ ffprobe を起動する。"""
+    duration = audio_duration.read_duration(path)
+    if duration is not None:
+        return duration
+    return _ffprobe_duration(path)
+
+
+def _ffprobe_duration(path: pathlib.Path) -> float:
+    result = metrics.run(
         [
             "ffprobe",
             "-v",
@@ -204,7 +404,7 @@ def _concat_audio(tmp: pathlib.Path, clips: Sequence[Clip]) -> pathlib.Path:
         str(output),
     ])
     
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    metrics.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     return output
 
 
@@ -287,7 +487,9 @@ def _resolve_bgm(tmp: pathlib.Path) -> pathlib.Path:
         download_dir.mkdir(parents=True, exist_ok=True)
         destination = download_dir / pathlib.Path(BGM_S3_KEY).name
         try:
-            s3_client.download_file(BGM_S3_BUCKET, BGM_S3_KEY, str(destination))
+            with metrics.timed("s3.download", purpose="bgm") as measurement:
+                s3_client.download_file(BGM_S3_BUCKET, BGM_S3_KEY, str(destination))
+                measurement.add_bytes(destination.stat().st_size)
             LOGGER.info("BGM downloaded from S3: s3://%s/%s", BGM_S3_BUCKET, BGM_S3_KEY)
             return destination
         except ClientError as error:
@@ -312,7 +514,7 @@ def _mix_audio_with_bgm(
 ) -> pathlib.Path:
     """音声に BGM を重ねる。BGM はループさせて動画尺に合わせる。"""
     normalized_voice = tmp / "voice_normalized.m4a"
-    subprocess.run(
+    metrics.run(
         [
             "ffmpeg",
             "-y",
@@ -353,65 +555,108 @@ def _mix_audio_with_bgm(
         "192k",
         str(output),
     ]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    metrics.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     return output
 
 
 def _resolve_portrait(tmp: pathlib.Path, name: str) -> pathlib.Path:
-    # 複数の画像形式をサポート（優先順位: jpg → png → webp）
-    extensions = ["jpg", "png", "webp"]
-    source_path = None
-    generated = False
-    found_ext = None
-    
-    # S3から画像を探す（複数形式に対応）
-    for ext in extensions:
-        object_key = f"portraits/{name}.{ext}"
-        temp_path = tmp / f"portrait_source.{ext}"
-        try:
-            s3_client.download_file(S3_BUCKET, object_key, str(temp_path))
-            source_path = temp_path
-            found_ext = ext
-            LOGGER.info("Portrait found in S3: %s", object_key)
-            break
-        except ClientError as error:
-            if error.response["Error"]["Code"] != "404":
-                raise
-            # 404の場合は次の形式を試す
-            continue
-    
-    # S3に画像がなければ生成
-    if source_path is None:
-        LOGGER.info("Portrait for %s not found in S3. Generating with %s", name, OPENAI_IMAGE_MODEL)
-        try:
-            source_path = _generate_portrait(tmp, name)
-            generated = True
-            found_ext = "jpg"
-        except Exception as generate_error:  # noqa: BLE001
-            LOGGER.warning("Failed to generate portrait for %s: %s", name, generate_error)
-            fallback = pathlib.Path("/opt/default.jpg")
-            if fallback.exists():
-                source_path = fallback
-                found_ext = "jpg"
-            else:
-                raise FileNotFoundError("Portrait image not found in S3 or layer") from generate_error
-    
-    # FFmpeg用に準備（モノクロ変換など）
+    """960x1080 のモノクロ肖像を返す。変換済みのものが S3 にあれば再変換しない。"""
     prepared_path = tmp / "portrait_prepared.jpg"
+    source_key, source_etag = _find_portrait_source(name)
+
+    if source_key is not None:
+        if _download_prepared_portrait(name, source_etag, prepared_path):
+            LOGGER.info("Prepared portrait cache hit for %s", name)
+            return prepared_path
+        source_path = tmp / f"portrait_source{pathlib.PurePath(source_key).suffix}"
+        with metrics.timed("s3.download", purpose="portrait") as measurement:
+            s3_client.download_file(S3_BUCKET, source_key, str(source_path))
+            measurement.add_bytes(source_path.stat().st_size)
+        LOGGER.info("Portrait found in S3: %s", source_key)
+        _prepare_portrait(source_path, prepared_path)
+        _store_prepared_portrait(name, source_etag, prepared_path)
+        return prepared_path
+
+    # S3に画像がなければ生成
+    LOGGER.info("Portrait for %s not found in S3. Generating with %s", name, OPENAI_IMAGE_MODEL)
+    try:
+        source_path = _generate_portrait(tmp, name)
+    except Exception as generate_error:  # noqa: BLE001
+        LOGGER.warning("Failed to generate portrait for %s: %s", name, generate_error)
+        fallback = pathlib.Path("/opt/default.jpg")
+        if not fallback.exists():
+            raise FileNotFoundError("Portrait image not found in S3 or layer") from generate_error
+        _prepare_portrait(fallback, prepared_path)
+        return prepared_path
+
     _prepare_portrait(source_path, prepared_path)
-    
+
     # 生成した画像はS3にキャッシュ
-    if generated:
-        try:
-            cache_key = f"portraits/{name}.jpg"
-            s3_client.upload_file(str(prepared_path), S3_BUCKET, cache_key)
-            LOGGER.info("Generated portrait cached to S3: %s", cache_key)
-        except ClientError as upload_error:
-            LOGGER.warning("Unable to cache generated portrait to S3: %s", upload_error)
-    
+    try:
+        cache_key = f"portraits/{name}.jpg"
+        s3_client.upload_file(str(prepared_path), S3_BUCKET, cache_key)
+        LOGGER.info("Generated portrait cached to S3: %s", cache_key)
+        etag = s3_client.head_object(Bucket=S3_BUCKET, Key=cache_key)["ETag"]
+        _store_prepared_portrait(name, etag, prepared_path)
+    except (ClientError, S3UploadFailedError) as upload_error:
+        LOGGER.warning("Unable to cache generated portrait to S3: %s", upload_error)
+
     return prepared_path
 
 
+def _find_portrait_source(name: str) -> tuple[str | None, str | None]:
+    """1 回の一覧取得で肖像の元画像を探す（優先順位: jpg → png → webp）。"""
+    prefix = f"portraits/{name}."
+    response = s3_client.list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix)
+    found = {item["Key"]: item["ETag"] for item in response.get("Contents") or []}
+    for ext in PORTRAIT_EXTENSIONS:
+        key = f"{prefix}{ext}"
+        if key in found:
+            return key, found[key]
+    return None, None
+
+
+def _prepared_portrait_key(name: str) -> str:
+    return f"{PREPARED_PORTRAIT_PREFIX}/{name}.jpg"
+
+
+def _download_prepared_portrait(name: str, source_etag: str | None, destination: pathlib.Path) -> bool:
+    """元画像の ETag と変換手順が一致する変換済み肖像があればダウンロードする。"""
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=_prepared_portrait_key(name))
+    except ClientError as error:
+        if error.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+        return False
+    metadata = response.get("Metadata", {})
+    if (
+        metadata.get("source-etag") != source_etag
+        or metadata.get("prep-version") != PORTRAIT_PREP_VERSION
+    ):
+        response["Body"].close()
+        return False
+    with destination.open("wb") as handle:
+        for chunk in response["Body"].iter_chunks():
+            handle.write(chunk)
+    return True
+
+
+def _store_prepared_portrait(name: str, source_etag: str | None, path: pathlib.Path) -> None:
+    try:
+        s3_client.upload_file(
+            str(path),
+            S3_BUCKET,
+            _prepared_portrait_key(name),
+            ExtraArgs={
+                "ContentType": "image/jpeg",
+                "Metadata": {"source-etag": source_etag or "", "prep-version": PORTRAIT_PREP_VERSION},
+            },
+        )
+    except (ClientError, S3UploadFailedError) as error:
+        LOGGER.warning("Unable to cache prepared portrait for %s: %s", name, error)
+
+
+@metrics.timed_call("openai.image")
 def _generate_portrait(tmp: pathlib.Path, name: str) -> pathlib.Path:
     prompt = textwrap.dedent(
         f"""
@@ -452,12 +697,14 @@ def _generate_portrait(tmp: pathlib.Path, name: str) -> pathlib.Path:
 
 
 def _prepare_portrait(source: pathlib.Path, destination: pathlib.Path) -> None:
+    """右半分にそのまま使える 960x1080 のモノクロ画像にする。"""
     vf = (
+        "scale=960:1080:force_original_aspect_ratio=increase,crop=960:1080,setsar=1,"
         "colorchannelmixer=.299:.587:.114:0:"
         ".299:.587:.114:0:"
         ".299:.587:.114:0,format=yuv420p"
     )
-    subprocess.run(
+    metrics.run(
         [
             "ffmpeg",
             "-y",
@@ -473,22 +720,119 @@ def _prepare_portrait(source: pathlib.Path, destination: pathlib.Path) -> None:
     )
 
 
+def _video_filter(ass_path: pathlib.Path, portrait_label: str, fps: int) -> str:
+    """左半分に字幕、右半分に肖像を並べる映像フィルタ（出力ラベル [withsub]）。"""
+    ass_arg = str(ass_path).replace("\\", "\\\\")
+    return (
+        # 肖像は _prepare_portrait で 960x1080 に変換済み
+        f"[{portrait_label}]setsar=1[right];"
+        f"color=size=960x1080:color=black:rate={fps}[leftbase];"
+        f"[leftbase]subtitles={ass_arg}:fontsdir=/opt/fonts[left];"
+        "[left][right]hstack=inputs=2[withsub]"
+    )
+
+
+def _render_single_pass(
+    clips: Sequence[Clip],
+    bgm_audio: pathlib.Path,
+    ass_path: pathlib.Path,
+    portrait_path: pathlib.Path,
+    output_path: pathlib.Path,
+    profile: encoding.Profile = DEFAULT_PROFILE,
+    stream_key: str | None = None,
+) -> None:
+    """クリップ配置・ラウドネス正規化・BGM・字幕・映像合成を 1 回の ffmpeg で行う。
+
+    複数段階の経路（_concat_audio → _mix_audio_with_bgm → _render_video）と同じ
+    フィルタを 1 つのグラフにまとめ、音声のエンコードを最終出力の 1 回だけにする。
+    """
+    portrait_index = len(clips) + 1
+    filter_complex = ";".join(
+        _single_pass_audio_graph(clips)
+        + [_video_filter(ass_path, f"{portrait_index}:v", profile.frame_rate)]
+    )
+
+    cmd = ["ffmpeg", "-y", *_single_pass_audio_inputs(clips, bgm_audio)]
+    cmd.extend(["-loop", "1", "-framerate", str(profile.frame_rate), "-i", str(portrait_path)])
+    cmd.extend(
+        [
+            "-filter_complex",
+            filter_complex,
+            "-map",
+            "[aout]",
+            "-map",
+            "[withsub]",
+            *encoding.video_args(profile, [clip.start for clip in clips]),
+            *encoding.audio_args(profile),
+            "-shortest",
+        ]
+    )
+    _run_output(cmd, output_path, stream_key)
+
+
+def _single_pass_audio_inputs(clips: Sequence[Clip], bgm_audio: pathlib.Path) -> List[str]:
+    """クリップ（入力 0..n-1）と繰り返し再生する BGM（入力 n）。"""
+    args: List[str] = []
+    for clip in clips:
+        args.extend(["-i", str(clip.audio_path)])
+    args.extend(["-stream_loop", "-1", "-i", str(bgm_audio)])
+    return args
+
+
+def _single_pass_audio_graph(clips: Sequence[Clip]) -> List[str]:
+    """クリップ配置・ラウドネス正規化・BGM 合成のフィルタ（出力ラベル [aout]）。"""
+    bgm_index = len(clips)
+    placements = [
+        f"[{i}:a]adelay={int(clip.start * 1000)}|{int(clip.start * 1000)}[a{i}]"
+        for i, clip in enumerate(clips)
+    ]
+    mix_inputs = "".join(f"[a{i}]" for i in range(len(clips)))
+    return placements + [
+        f"{mix_inputs}amix=inputs={len(clips)}:duration=longest,"
+        f"atrim=0:{clips[-1].end + 2.0},"  # 最後のクリップ終了+2秒
+        "loudnorm=I=-16:TP=-1.5:LRA=11,"
+        "aresample=48000,"  # loudnorm は 192kHz で出力するため戻す
+        f"volume={VOICE_GAIN}[voice]",
+        f"[{bgm_index}:a]volume={BGM_VOLUME}[bgm]",
+        "[voice][bgm]amix=inputs=2:duration=first[aout]",
+    ]
+
+
+def _mix_single_pass_audio(tmp: pathlib.Path, clips: Sequence[Clip], bgm_audio: pathlib.Path) -> pathlib.Path:
+    """単一パスと同じ音声グラフを PCM に書き出す（分割エンコードの最後に 1 回だけ AAC にする）。"""
+    output = tmp / "audio_mixed.wav"
+    metrics.run(
+        [
+            "ffmpeg",
+            "-y",
+            *_single_pass_audio_inputs(clips, bgm_audio),
+            "-filter_complex",
+            ";".join(_single_pass_audio_graph(clips)),
+            "-map",
+            "[aout]",
+            "-c:a",
+            "pcm_s16le",
+            str(output),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return output
+
+
 def _render_video(
     audio_path: pathlib.Path,
     ass_path: pathlib.Path,
     portrait_path: pathlib.Path,
     output_path: pathlib.Path,
+    keyframes: Sequence[float] = (),
+    profile: encoding.Profile = DEFAULT_PROFILE,
+    stream_key: str | None = None,
 ) -> None:
-    ass_arg = str(ass_path).replace("\\", "\\\\")
-    filter_complex = (
-        "[1:v]scale=960:1080:force_original_aspect_ratio=increase,"
-        "crop=960:1080,setsar=1[right];"
-        "color=size=960x1080:color=black[leftbase];"
-        f"[leftbase]subtitles={ass_arg}:fontsdir=/opt/fonts[left];"
-        "[left][right]hstack=inputs=2[withsub]"
-    )
+    filter_complex = _video_filter(ass_path, "1:v", profile.frame_rate)
 
-    subprocess.run(
+    _run_output(
         [
             "ffmpeg",
             "-y",
@@ -496,6 +840,8 @@ def _render_video(
             str(audio_path),
             "-loop",
             "1",
+            "-framerate",
+            str(profile.frame_rate),
             "-i",
             str(portrait_path),
             "-filter_complex",
@@ -504,29 +850,237 @@ def _render_video(
             "0:a",
             "-map",
             "[withsub]",
+            *encoding.video_args(profile, keyframes),
+            *encoding.audio_args(profile),
+            "-shortest",
+        ],
+        output_path,
+        stream_key,
+    )
+
+
+def _encode_video(
+    tmp: pathlib.Path,
+    clips: Sequence[Clip],
+    total_duration: float,
+    audio_path: pathlib.Path,
+    ass_path: pathlib.Path,
+    portrait_path: pathlib.Path,
+    output_path: pathlib.Path,
+    profile: encoding.Profile = DEFAULT_PROFILE,
+    stream_key: str | None = None,
+) -> None:
+    """尺と CPU 数から分割数を決め、1 本または分割並列でエンコードする。"""
+    count = _segment_count(total_duration, len(clips))
+    if count <= 1:
+        keyframes = [clip.start for clip in clips]
+        _render_video(audio_path, ass_path, portrait_path, output_path, keyframes, profile, stream_key)
+        return
+    LOGGER.info("Rendering %.1fs of video in %s parallel segments", total_duration, count)
+    _render_video_segmented(
+        tmp, clips, total_duration, count, audio_path, portrait_path, output_path, profile, stream_key
+    )
+
+
+def _segment_count(total_duration: float, clip_count: int) -> int:
+    """分割数の決定。auto では 1 区間が MIN_SEGMENT_SECONDS 以上かつコア数以下になるようにする。"""
+    if RENDER_SEGMENTS != "auto":
+        return max(1, min(int(RENDER_SEGMENTS), clip_count))
+    cores = os.cpu_count() or 1
+    by_duration = int(total_duration // MIN_SEGMENT_SECONDS)
+    return max(1, min(cores, by_duration, clip_count))
+
+
+def _plan_segments(
+    clips: Sequence[Clip], total_duration: float, count: int, fps: int
+) -> List[Tuple[float, float, List[Clip]]]:
+    """クリップ境界で尺をほぼ均等に分ける。境界はフレーム単位に丸める。"""
+    groups: List[List[Clip]] = [[] for _ in range(count)]
+    for clip in clips:
+        slot = min(count - 1, int(clip.start / total_duration * count))
+        groups[slot].append(clip)
+    groups = [group for group in groups if group]
+
+    def snap(value: float) -> float:
+        return round(value * fps) / fps
+
+    segments = []
+    for position, group in enumerate(groups):
+        start = 0.0 if position == 0 else snap(group[0].start)
+        end = snap(groups[position + 1][0].start) if position + 1 < len(groups) else total_duration
+        segments.append((start, end, group))
+    return segments
+
+
+def _render_video_segmented(
+    tmp: pathlib.Path,
+    clips: Sequence[Clip],
+    total_duration: float,
+    count: int,
+    audio_path: pathlib.Path,
+    portrait_path: pathlib.Path,
+    output_path: pathlib.Path,
+    profile: encoding.Profile = DEFAULT_PROFILE,
+    stream_key: str | None = None,
+) -> None:
+    """区間ごとに映像だけを並列エンコードし、concat demuxer のストリームコピーで連結する。"""
+    segments = _plan_segments(clips, total_duration, count, profile.frame_rate)
+    # プロファイルでスレッド数が指定されていなければコアを区間で分け合う
+    segment_profile = profile
+    if not profile.threads:
+        segment_profile = replace(profile, threads=max(1, (os.cpu_count() or 1) // len(segments)))
+    segment_paths = []
+    jobs = []
+    for position, (start, end, group) in enumerate(segments):
+        ass_path = tmp / f"captions_{position:02d}.ass"
+        shifted = [
+            replace(clip, start=max(0.0, clip.start - start), end=min(clip.end, end) - start)
+            for clip in group
+        ]
+        _write_ass(shifted, ass_path)
+        segment_path = tmp / f"segment_{position:02d}.mp4"
+        segment_paths.append(segment_path)
+        keyframes = [clip.start for clip in shifted]
+        jobs.append((ass_path, end - start, segment_path, keyframes))
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = [
+            executor.submit(
+                _render_segment, ass_path, duration, portrait_path, segment_path, keyframes, segment_profile
+            )
+            for ass_path, duration, segment_path, keyframes in jobs
+        ]
+        for future in futures:
+            future.result()
+
+    concat_list = tmp / "segments.txt"
+    concat_list.write_text("".join(f"file '{path}'\n" for path in segment_paths), encoding="utf-8")
+    _run_output(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
+            "-i",
+            str(concat_list),
+            "-i",
+            str(audio_path),
+            "-map",
+            "0:v",
+            "-map",
+            "1:a",
             "-c:v",
-            "libx264",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "192k",
-            "-tune",
-            "stillimage",
-            "-pix_fmt",
-            "yuv420p",
+            "copy",
+            *encoding.audio_args(profile),
+            "-movflags",
+            "+faststart",
             "-shortest",
+        ],
+        output_path,
+        stream_key,
+    )
+
+
+def _render_segment(
+    ass_path: pathlib.Path,
+    duration: float,
+    portrait_path: pathlib.Path,
+    output_path: pathlib.Path,
+    keyframes: Sequence[float] = (),
+    profile: encoding.Profile = DEFAULT_PROFILE,
+) -> None:
+    metrics.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loop",
+            "1",
+            "-framerate",
+            str(profile.frame_rate),
+            "-i",
+            str(portrait_path),
+            "-filter_complex",
+            _video_filter(ass_path, "0:v", profile.frame_rate),
+            "-map",
+            "[withsub]",
+            "-t",
+            f"{duration:.3f}",
+            "-an",
+            *encoding.video_args(profile, keyframes),
             str(output_path),
         ],
         check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
     )
 
 
-def _upload_outputs(name: str, video_path: pathlib.Path, srt_path: pathlib.Path) -> None:
+def _run_output(cmd: List[str], output_path: pathlib.Path, stream_key: str | None) -> None:
+    """最終動画を書き出す ffmpeg を実行する。stream_key があれば /tmp を介さず S3 へ送る。"""
+    if stream_key is None:
+        metrics.run([*cmd, str(output_path)], check=True)
+        return
+    _stream_to_s3(cmd, stream_key)
+
+
+def _stream_to_s3(cmd: List[str], key: str) -> None:
+    """ffmpeg の出力を fragmented MP4 としてパイプで受け、届いた分からマルチパートで送る。
+
+    パイプ出力では moov を後から先頭へ移せないため、faststart の代わりに
+    空の moov + キーフレームごとのフラグメントにする。
+    """
+    args = [*_without_movflags(cmd), "-movflags", FRAGMENTED_MOVFLAGS, "-f", "mp4", "pipe:1"]
+    with metrics.timed("s3.stream_upload", child_rss=True, purpose="outputs") as measurement:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE)
+        try:
+            with s3_stream.MultipartStreamUpload(
+                s3_client,
+                S3_BUCKET,
+                key,
+                part_size=STREAM_PART_MB * 1024 * 1024,
+                max_in_flight=STREAM_PARTS_IN_FLIGHT,
+            ) as upload:
+                upload.copy_from(process.stdout)
+                # ffmpeg が失敗したら途中までのパートは破棄する（with を例外で抜けると abort）
+                if process.wait() != 0:
+                    raise subprocess.CalledProcessError(process.returncode, args)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        measurement.add_bytes(upload.bytes_sent)
+        measurement.count = upload.part_count
+    LOGGER.info("Streamed %s bytes to s3://%s/%s", upload.bytes_sent, S3_BUCKET, key)
+
+
+def _without_movflags(cmd: Sequence[str]) -> List[str]:
+    args: List[str] = []
+    skip = False
+    for arg in cmd:
+        if skip:
+            skip = False
+        elif arg == "-movflags":
+            skip = True
+        else:
+            args.append(arg)
+    return args
+
+
+def _upload_outputs(name: str, video_path: pathlib.Path | None, srt_path: pathlib.Path) -> None:
+    """字幕と動画をアップロードする。ストリーミング済みの動画は video_path=None で渡す。"""
     prefix = f"out/{name}"
-    s3_client.upload_file(str(video_path), S3_BUCKET, f"{prefix}/final.mp4")
-    s3_client.upload_file(str(srt_path), S3_BUCKET, f"{prefix}/captions.srt")
+    with metrics.timed("s3.upload", purpose="outputs") as measurement:
+        measurement.add_bytes(srt_path.stat().st_size)
+        if video_path is not None:
+            measurement.add_bytes(video_path.stat().st_size)
+            s3_client.upload_file(str(video_path), S3_BUCKET, f"{prefix}/final.mp4")
+        s3_client.upload_file(str(srt_path), S3_BUCKET, f"{prefix}/captions.srt")
 
 
+@metrics.timed_call("ddb.update_figure")
 def _update_figure_video(figure_pk: str, name: str, duration: float) -> None:
     now_ms = int(time.time() * 1000)
     duration_ms = int(duration * 1000)
@@ -0,0 +1,130 @@
+"""Upload a byte stream to S3 with a multipart upload while it is still being produced."""
+
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, BinaryIO, Deque, Dict, List, Optional
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 の最小パートサイズ（最後のパートを除く）
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+class MultipartStreamUpload:
+    """Buffer writes into fixed-size parts and upload them in the background.
+
+    At most ``max_in_flight`` parts are uploading at once, so memory stays near
+    ``(max_in_flight + 1) * part_size`` however long the stream is. Use it as a
+    context manager: a clean exit completes the upload, an exception aborts it
+    so no orphaned parts are left behind.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_in_flight: int = 4,
+        content_type: str = "video/mp4",
+    ) -> None:
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.content_type = content_type
+        self.upload_id: Optional[str] = None
+        self.bytes_sent = 0
+        self._buffer = bytearray()
+        self._parts: List[Dict[str, Any]] = []
+        self._pending: Deque[Future] = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __enter__(self) -> "MultipartStreamUpload":
+        response = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, ContentType=self.content_type
+        )
+        self.upload_id = response["UploadId"]
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        try:
+            if exc_type is not None:
+                self.abort()
+                return
+            try:
+                self.complete()
+            except BaseException:
+                self.abort()
+                raise
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def part_count(self) -> int:
+        return len(self._parts) + len(self._pending)
+
+    def write(self, data: bytes) -> None:
+        self._buffer.extend(data)
+        while len(self._buffer) >= self.part_size:
+            body = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            self._submit(body)
+
+    def copy_from(self, stream: BinaryIO, read_size: int = READ_SIZE) -> None:
+        """Write everything readable from stream (e.g. a subprocess stdout pipe)."""
+        while True:
+            chunk = stream.read(read_size)
+            if not chunk:
+                return
+            self.write(chunk)
+
+    def complete(self) -> None:
+        # 空のストリームでもパートが 1 つは必要
+        if self._buffer or not self.part_count:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        self._drain(0)
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": sorted(self._parts, key=lambda part: part["PartNumber"])},
+        )
+
+    def abort(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        for future in self._pending:
+            if not future.cancelled():
+                future.exception()  # 中断前に送信中のパートを待つ
+        self._pending.clear()
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def _submit(self, body: bytes) -> None:
+        self._drain(self.max_in_flight - 1)
+        part_number = self.part_count + 1
+        self.bytes_sent += len(body)
+        self._pending.append(self._executor.submit(self._upload_part, part_number, body))
+
+    def _drain(self, keep: int) -> None:
+        """Wait for the oldest uploads until at most keep remain in flight."""
+        while len(self._pending) > keep:
+            self._parts.append(self._pending.popleft().result())
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict[str, Any]:
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
@@ -0,0 +1,98 @@
+import struct
+import wave
+
+import pytest
+
+from lambdas.render_audio_video import audio_duration
+
+
+def _mp3_frame(padding=0):
+    # MPEG1 Layer III, 128 kbps, 44.1 kHz, stereo -> 417/418 byte frames of 1152 samples
+    header = bytes([0xFF, 0xFB, 0x90 | (padding << 1), 0x00])
+    return header + b"\x00" * (144 * 128000 // 44100 + padding - 4)
+
+
+def test_mp3_counts_frames(tmp_path):
+    path = tmp_path / "clip.mp3"
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+    path.write_bytes(id3 + b"".join(_mp3_frame(i % 2) for i in range(100)))
+    assert audio_duration.read_duration(path) == pytest.approx(100 * 1152 / 44100)
+
+
+def test_mp3_uses_xing_frame_count(tmp_path):
+    path = tmp_path / "clip.mp3"
+    first = bytearray(_mp3_frame())
+    first[4 + 32 : 4 + 32 + 12] = b"Xing" + struct.pack(">II", 1, 500)
+    path.write_bytes(bytes(first) + _mp3_frame() * 3)
+    assert audio_duration.read_duration(path) == pytest.approx(500 * 1152 / 44100)
+
+
+def test_wav_header(tmp_path):
+    path = tmp_path / "clip.wav"
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(24000)
+        handle.writeframes(b"\x00\x00" * 36000)
+    assert audio_duration.read_duration(path) == pytest.approx(1.5)
+
+
+def test_pcm_size(tmp_path):
+    path = tmp_path / "clip.pcm"
+    path.write_bytes(b"\x00" * 24000 * 2 * 3)
+    assert audio_duration.read_duration(path) == pytest.approx(3.0)
+
+
+def test_adts_frames(tmp_path):
+    path = tmp_path / "clip.aac"
+    length = 200
+    # sampling index 6 = 24 kHz, one raw data block per frame
+    header = bytes(
+        [
+            0xFF,
+            0xF1,
+            (1 << 6) | (6 << 2),
+            0x80 | (length >> 11),
+            (length >> 3) & 0xFF,
+            (length & 7) << 5 | 0x1F,
+            0xFC,
+        ]
+    )
+    path.write_bytes((header + b"\x00" * (length - 7)) * 47)
+    assert audio_duration.read_duration(path) == pytest.approx(47 * 1024 / 24000)
+
+
+def test_flac_streaminfo(tmp_path):
+    path = tmp_path / "clip.flac"
+    packed = (24000 << 44) | (0 << 41) | (15 << 36) | 60000
+    streaminfo = b"\x00" * 10 + packed.to_bytes(8, "big") + b"\x00" * 16
+    path.write_bytes(b"fLaC" + b"\x80\x00\x00\x22" + streaminfo)
+    assert audio_duration.read_duration(path) == pytest.approx(2.5)
+
+
+def test_ogg_opus_granule(tmp_path):
+    path = tmp_path / "clip.opus"
+    head = b"OggS" + b"\x00" * 23 + b"OpusHead\x01\x01" + struct.pack("<H", 312) + b"\x00" * 8
+    last = b"OggS\x00\x04" + struct.pack("<q", 48000 * 2 + 312) + b"\x00" * 13
+    path.write_bytes(head + b"\x00" * 100 + last)
+    assert audio_duration.read_duration(path) == pytest.approx(2.0)
+
+
+def test_m4a_mvhd(tmp_path):
+    path = tmp_path / "mix.m4a"
+    ftyp = struct.pack(">I4s", 16, b"ftyp") + b"M4A \x00\x00\x00\x00"
+    mdat = struct.pack(">I4s", 16, b"mdat") + b"\x00" * 8
+    mvhd_body = b"\x00\x00\x00\x00" + struct.pack(">IIII", 0, 0, 1000, 61500) + b"\x00" * 80
+    mvhd = struct.pack(">I4s", 8 + len(mvhd_body), b"mvhd") + mvhd_body
+    moov = struct.pack(">I4s", 8 + len(mvhd), b"moov") + mvhd
+    path.write_bytes(ftyp + mdat + moov)
+    assert audio_duration.read_duration(path) == pytest.approx(61.5)
+
+
+def test_unknown_or_corrupt_returns_none(tmp_path):
+    unknown = tmp_path / "clip.xyz"
+    unknown.write_bytes(b"\x00" * 10)
+    corrupt = tmp_path / "clip.mp3"
+    corrupt.write_bytes(b"not audio")
+    assert audio_duration.read_duration(unknown) is None
+    assert audio_duration.read_duration(corrupt) is None
@@ -0,0 +1,53 @@
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from lambdas.render_audio_video import audio_mixer  # noqa: E402
+
+
+def test_place_adds_at_offset_and_clips_to_end():
+    timeline = np.zeros(10, dtype=np.float32)
+    audio_mixer.place(timeline, np.ones(4, dtype=np.float32), start=0.2, sample_rate=10)
+    audio_mixer.place(timeline, np.ones(4, dtype=np.float32), start=0.8, sample_rate=10)
+    assert timeline.tolist() == [0, 0, 1, 1, 1, 1, 0, 0, 1, 1]
+
+
+def test_add_looped_repeats_across_chunks(monkeypatch):
+    monkeypatch.setattr(audio_mixer, "CHUNK_SAMPLES", 4)
+    timeline = np.zeros(10, dtype=np.float32)
+    audio_mixer.add_looped(timeline, np.array([1, 2, 3], dtype=np.float32), volume=0.5)
+    assert timeline.tolist() == pytest.approx([0.5, 1, 1.5, 0.5, 1, 1.5, 0.5, 1, 1.5, 0.5])
+
+
+def test_normalize_rms_ignores_silence():
+    timeline = np.zeros(1000, dtype=np.float32)
+    timeline[100:200] = 0.01
+    audio_mixer.normalize_rms(timeline, target_db=-20.0)
+    assert float(timeline[150]) == pytest.approx(0.1, rel=1e-4)
+    assert float(timeline[0]) == 0.0
+
+
+def test_soft_limit_keeps_peaks_under_ceiling():
+    timeline = np.array([0.1, -0.5, 2.0, -3.0], dtype=np.float32)
+    audio_mixer.soft_limit(timeline, ceiling_db=-1.5)
+    ceiling = 10 ** (-1.5 / 20)
+    assert timeline[:2].tolist() == pytest.approx([0.1, -0.5])
+    assert np.all(np.abs(timeline) <= ceiling)
+    assert timeline[2] > 0 > timeline[3]
+
+
+def test_large_timeline_is_memory_mapped(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_mixer, "MEMMAP_THRESHOLD_BYTES", 16)
+    timeline = audio_mixer.allocate_timeline(100, tmp_path)
+    assert isinstance(timeline, np.memmap)
+    assert (tmp_path / "timeline.f32").exists()
+
+
+def test_write_wav_roundtrip(tmp_path):
+    path = tmp_path / "mix.wav"
+    audio_mixer.write_wav(np.full(480, 0.5, dtype=np.float32), path, sample_rate=48000)
+    with wave.open(str(path)) as handle:
+        assert handle.getnframes() == 480
+        assert handle.getframerate() == 48000
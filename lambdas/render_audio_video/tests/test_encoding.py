@@ -0,0 +1,70 @@
+"""Still-image mode trades YouTube's recommended GOP (half the frame rate) for size.
+
+The upload stays H.264 / yuv420p with the moov atom up front, runs at >= 1 fps,
+and starts every saying on a keyframe; captions may appear up to one frame
+(0.5 s at 2 fps) after the narration starts.
+"""
+
+import pytest
+
+from lambdas.render_audio_video import encoding
+
+STILL = encoding.resolve_profile("default", encoding.STILL)
+
+
+def _value(args, flag):
+    return args[args.index(flag) + 1]
+
+
+def test_standard_mode_keeps_previous_arguments():
+    args = encoding.video_args(encoding.resolve_profile("default"), [0.0, 3.0])
+    assert args == ["-c:v", "libx264", "-tune", "stillimage", "-pix_fmt", "yuv420p"]
+    assert encoding.frame_rate(encoding.STANDARD) == 25
+
+
+def test_still_mode_is_youtube_compatible():
+    args = encoding.video_args(STILL)
+    assert _value(args, "-c:v") == "libx264"
+    assert _value(args, "-pix_fmt") == "yuv420p"
+    assert _value(args, "-movflags") == "+faststart"
+    assert int(_value(args, "-r")) >= 1
+    assert encoding.frame_rate(encoding.STILL) >= 1
+
+
+def test_still_mode_forces_keyframe_at_each_caption():
+    args = encoding.video_args(STILL, [0.0, 2.5, 7.125, -0.01])
+    assert _value(args, "-force_key_frames") == "0.000,2.500,7.125,0.000"
+
+
+def test_still_mode_bounds_keyframe_spacing():
+    params = dict(item.split("=") for item in _value(encoding.video_args(STILL), "-x264-params").split(":"))
+    assert int(params["keyint"]) / encoding.STILL_FPS <= 10
+    assert params["scenecut"] == "0"
+
+
+def test_profiles_add_preset_crf_and_threads():
+    profile = encoding.resolve_profile("Fast")
+    args = encoding.video_args(encoding.Profile("custom", preset="veryfast", crf=28, threads=2))
+    assert _value(args, "-preset") == "veryfast"
+    assert _value(args, "-crf") == "28"
+    assert _value(args, "-threads") == "2"
+    assert encoding.audio_args(profile) == ["-c:a", "aac", "-b:a", "128k"]
+    assert encoding.audio_args(encoding.resolve_profile("")) == ["-c:a", "aac", "-b:a", "192k"]
+
+
+def test_profile_fps_overrides_mode_default():
+    profile = encoding.Profile("custom", mode=encoding.STILL, fps=5)
+    args = encoding.video_args(profile)
+    assert _value(args, "-r") == "5"
+    assert "keyint=50:" in _value(args, "-x264-params")
+
+
+def test_resolve_profile_applies_mode_and_rejects_unknown():
+    assert encoding.resolve_profile("quality", encoding.STILL).mode == encoding.STILL
+    with pytest.raises(ValueError):
+        encoding.resolve_profile("ultra")
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        encoding.resolve_profile("default", "stil")
@@ -0,0 +1,106 @@
+import importlib.util
+import pathlib
+import sys
+
+import pytest
+
+pytest.importorskip("boto3")
+
+FUNCTION_DIR = pathlib.Path(__file__).resolve().parents[1]
+SHARED_DIR = FUNCTION_DIR.parent / "shared"
+
+
+def _load(monkeypatch, **env):
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setenv("METRICS_ENABLED", "false")
+    # 既定の設定で読み込む
+    for key in (
+        "AUDIO_MIXER",
+        "RENDER_SINGLE_PASS",
+        "RENDER_SEGMENTS",
+        "RENDER_STREAM_OUTPUT",
+        "RENDER_PROFILE",
+        "VIDEO_MODE",
+    ):
+        monkeypatch.delenv(key, raising=False)
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.syspath_prepend(str(SHARED_DIR))
+    monkeypatch.syspath_prepend(str(FUNCTION_DIR))
+    spec = importlib.util.spec_from_file_location("render_audio_video_main", FUNCTION_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    # dataclass が自分のモジュールを sys.modules から引くため登録しておく
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def main(monkeypatch):
+    return _load(monkeypatch)
+
+
+def test_mistyped_settings_fall_back_at_load(monkeypatch):
+    main = _load(monkeypatch, RENDER_PROFILE="fastest", VIDEO_MODE="stil", RENDER_SEGMENTS="four")
+    assert main.DEFAULT_PROFILE == main.encoding.resolve_profile("default")
+    assert main.VIDEO_MODE is None
+    assert main.RENDER_SEGMENTS == "auto"
+
+
+def test_unknown_event_profile_falls_back_to_the_default(main):
+    assert main._event_profile("fast").name == "fast"
+    assert main._event_profile("fastest") is main.DEFAULT_PROFILE
+    assert main._event_profile(None) is main.DEFAULT_PROFILE
+
+
+def _stub_render(main, monkeypatch, clip_count, clip_seconds):
+    """TTS / S3 / DynamoDB を差し替え、ffmpeg の呼び出しを記録して出力ファイルだけ作る"""
+    commands = []
+
+    def synthesize(tmp, sayings):
+        clips = []
+        for index, item in enumerate(sayings, start=1):
+            start = (index - 1) * clip_seconds
+            audio = tmp / f"clip_{index:02d}.mp3"
+            audio.touch()
+            clips.append(main.Clip(index, item["text"], audio, clip_seconds, start, start + clip_seconds))
+        return clips
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        pathlib.Path(cmd[-1]).touch()
+
+    monkeypatch.setattr(
+        main, "_load_sayings", lambda pk: [{"sk": f"snip#{i:06d}", "text": "言葉"} for i in range(clip_count)]
+    )
+    monkeypatch.setattr(main, "_synthesize_audio", synthesize)
+    monkeypatch.setattr(main, "_resolve_bgm", lambda tmp: tmp / "bgm.mp3")
+    monkeypatch.setattr(main, "_resolve_portrait", lambda tmp, name: tmp / "portrait.jpg")
+    monkeypatch.setattr(main, "_probe_duration", lambda path: clip_count * clip_seconds + 2.0)
+    monkeypatch.setattr(main, "_upload_outputs", lambda *args: None)
+    monkeypatch.setattr(main, "_update_figure_video", lambda *args: None)
+    monkeypatch.setattr(main.metrics, "run", run)
+    monkeypatch.setattr(main.os, "cpu_count", lambda: 4)
+    return commands
+
+
+def test_long_render_with_default_settings_is_segmented(main, monkeypatch):
+    assert main.AUDIO_MIXER == "ffmpeg" and main.RENDER_SINGLE_PASS and main.RENDER_SEGMENTS == "auto"
+    commands = _stub_render(main, monkeypatch, clip_count=30, clip_seconds=10.0)
+
+    main.handler({"figurePk": "figure#001", "name": "人物"}, None)
+
+    outputs = [pathlib.Path(cmd[-1]).name for cmd in commands]
+    assert outputs[0] == "audio_mixed.wav"
+    assert sorted(name for name in outputs if name.startswith("segment_")) == [f"segment_{i:02d}.mp4" for i in range(4)]
+    assert outputs[-1] == "final.mp4"
+    assert "concat" in commands[-1]
+
+
+def test_short_render_keeps_the_single_pass(main, monkeypatch):
+    commands = _stub_render(main, monkeypatch, clip_count=30, clip_seconds=1.0)
+
+    main.handler({"figurePk": "figure#001", "name": "人物"}, None)
+
+    assert [pathlib.Path(cmd[-1]).name for cmd in commands] == ["final.mp4"]
+    assert "[aout]" in commands[0] and "[withsub]" in commands[0]
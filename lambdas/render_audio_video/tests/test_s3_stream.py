@@ -0,0 +1,77 @@
+import io
+import threading
+
+import pytest
+
+from lambdas.render_audio_video import s3_stream
+
+PART = s3_stream.MIN_PART_SIZE
+
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self.fail_part = fail_part
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, PartNumber, Body, **kwargs):  # noqa: N803
+        if PartNumber == self.fail_part:
+            raise RuntimeError("network down")
+        with self._lock:
+            self.parts[PartNumber] = Body
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, MultipartUpload, **kwargs):  # noqa: N803
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted = True
+
+
+def test_stream_is_split_into_ordered_parts():
+    client = FakeS3()
+    data = bytes(range(256)) * (PART * 2 // 256 + 100)
+    with s3_stream.MultipartStreamUpload(client, "bucket", "out/a/final.mp4", part_size=PART, max_in_flight=2) as upload:
+        upload.copy_from(io.BytesIO(data), read_size=PART // 3)
+
+    assert [part["PartNumber"] for part in client.completed] == [1, 2, 3]
+    assert b"".join(client.parts[n] for n in (1, 2, 3)) == data
+    assert len(client.parts[1]) == len(client.parts[2]) == PART
+    assert upload.bytes_sent == len(data)
+    assert not client.aborted
+
+
+def test_empty_stream_still_completes_with_one_part():
+    client = FakeS3()
+    with s3_stream.MultipartStreamUpload(client, "bucket", "key", part_size=PART):
+        pass
+    assert client.completed == [{"PartNumber": 1, "ETag": '"etag-1"'}]
+
+
+def test_failure_in_producer_aborts_upload():
+    client = FakeS3()
+    with pytest.raises(ValueError):
+        with s3_stream.MultipartStreamUpload(client, "bucket", "key", part_size=PART) as upload:
+            upload.write(b"x" * (PART + 1))
+            raise ValueError("ffmpeg exited with 1")
+    assert client.aborted
+    assert client.completed is None
+
+
+def test_failed_part_aborts_upload():
+    client = FakeS3(fail_part=2)
+    with pytest.raises(RuntimeError):
+        with s3_stream.MultipartStreamUpload(client, "bucket", "key", part_size=PART, max_in_flight=1) as upload:
+            upload.write(b"x" * (PART * 3))
+    assert client.aborted
+    assert client.completed is None
+
+
+def test_rejects_parts_below_s3_minimum():
+    with pytest.raises(ValueError):
+        s3_stream.MultipartStreamUpload(FakeS3(), "bucket", "key", part_size=1024)
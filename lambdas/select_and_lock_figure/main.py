@@ -1,14 +1,21 @@
-"""Select an available figure and lock it for snippet generation."""
+"""Select the highest-priority available figures and lock them for snippet generation."""
 
 from __future__ import annotations
 
+import json
 import logging
 import os
 import time
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
 
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
+
+import clients
+import figure_status
+import metrics
+import schedule
 
 
 LOGGER = logging.getLogger(__name__)
@@ -17,9 +24,18 @@ LOGGER.setLevel(logging.INFO)
 DDB_FIGURES = os.environ.get("DDB_FIGURES", "figures")
 STATUS_INDEX = "status-index"
 LOCK_MINUTES = int(os.environ.get("LOCK_MINUTES", "60"))
+# 1 回の起動でロックする人物数（イベントの count で上書き可）
+LEASE_COUNT = max(1, int(os.environ.get("LEASE_COUNT", "1")))
+MAX_LEASE_COUNT = 25
+# 1 シャードあたり何件ずつ読むか、競合で取り逃した場合に合計何件まで試すか
+CANDIDATE_PAGE_SIZE = max(1, int(os.environ.get("CANDIDATE_PAGE_SIZE", "10")))
+MAX_CANDIDATES = max(1, int(os.environ.get("MAX_CANDIDATES", "100")))
+# 2 件目以降のパイプラインを直接起動する generate_snippets_for_figure（未設定なら返すだけ）
+GENERATE_FUNCTION = os.environ.get("GENERATE_FUNCTION")
 
-dynamodb = boto3.resource("dynamodb")
-figures_table = dynamodb.Table(DDB_FIGURES)
+dynamodb = clients.LazyClient(lambda: boto3.resource("dynamodb"))
+figures_table = clients.LazyClient(lambda: dynamodb.Table(DDB_FIGURES))
+lambda_client = clients.LazyClient(lambda: boto3.client("lambda"))
 
 
 def _lock_until_ms(now_ms: int) -> int:
@@ -29,51 +45,195 @@ def _lock_until_ms(now_ms: int) -> int:
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Lambda entrypoint."""
     LOGGER.info(f"SelectAndLockFigure started. Event: {event}")
-    
-    response = figures_table.query(
-        IndexName=STATUS_INDEX,
-        KeyConditionExpression=Key("status").eq("available"),
-        Limit=1,
-        ScanIndexForward=True,
-    )
-
-    items = response.get("Items") or []
-    LOGGER.info(f"Found {len(items)} available figures")
-    
-    if not items:
+    count = min(MAX_LEASE_COUNT, max(1, int((event or {}).get("count") or LEASE_COUNT)))
+
+    leased = _acquire(count)
+    if not leased:
         LOGGER.info("No available figure found")
         return {"message": "no available figure"}
 
-    figure = items[0]
+    figures = []
+    for position, figure in enumerate(leased):
+        entry = {"figurePk": figure["pk"], "name": figure.get("name")}
+        # 起動できなかった人物は失敗扱いにせずすぐ返し、1 件目の受け渡しは止めない
+        if position and not _start_pipeline(entry):
+            _release(figure)
+            continue
+        figures.append(entry)
+
+    # 1 件目は従来どおり Lambda Destination で generate_snippets_for_figure へ渡る
+    result = dict(figures[0])
+    if count > 1:
+        result["figures"] = figures
+    LOGGER.info(f"Returning result: {result}")
+    return result
+
+
+def _acquire(count: int) -> List[Dict[str, Any]]:
+    """Lock up to count available figures, moving on to the next candidate when a race is lost."""
+    leased: List[Dict[str, Any]] = []
+    lost = 0
+    with metrics.timed("ddb.lease", requested=count) as measurement:
+        with ThreadPoolExecutor(max_workers=min(count, 8)) as executor:
+            for page in _candidate_pages(count):
+                needed = count - len(leased)
+                # 必要数だけ並列に条件付き更新し、負けた分は同じページの次の候補で埋める
+                while page and needed:
+                    batch, page = page[:needed], page[needed:]
+                    for figure, locked in zip(batch, executor.map(_try_lock, batch)):
+                        if locked:
+                            leased.append(figure)
+                        else:
+                            lost += 1
+                    needed = count - len(leased)
+                if not needed:
+                    break
+        measurement.retries = lost
+        measurement.count = len(leased)
+    return leased
+
+
+def _candidate_pages(count: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield pages of available figures, highest priority first, reading at most MAX_CANDIDATES items.
+
+    status is write-sharded, so each page queries every shard in parallel and
+    merges the results. The first page reads count items from each shard, and
+    the best count figures of each shard always include the best count
+    overall, so it already ranks the winners; later pages read
+    CANDIDATE_PAGE_SIZE per shard to replace lost races. Every query's Limit
+    is cut to what is left of MAX_CANDIDATES, so the first page can only rank
+    fewer than count per shard when count times the shard count exceeds it.
+    """
+    partitions = figure_status.partitions(figure_status.AVAILABLE)
+
+    # schedule-index: 優先度の高い順、同じ優先度なら前回の試行が古い順。バックオフ中の人物は含まない
+    def ready(partition: str) -> Dict[str, Any]:
+        return {
+            "IndexName": schedule.SCHEDULE_INDEX,
+            "KeyConditionExpression": Key("status").eq(partition)
+            & Key(schedule.SCHEDULE_KEY).begins_with(schedule.READY_PREFIX),
+        }
+
+    # scheduleKey をまだ持たない人物（CLI などで直接 available にしたもの）は最後に従来の順で拾う
+    def unscheduled(partition: str) -> Dict[str, Any]:
+        return {
+            "IndexName": STATUS_INDEX,
+            "KeyConditionExpression": Key("status").eq(partition),
+            "FilterExpression": Attr(schedule.SCHEDULE_KEY).not_exists(),
+        }
+
+    read = 0
+    with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+        for query, sort_key in ((ready, schedule.SCHEDULE_KEY), (unscheduled, "pk")):
+            cursors: Dict[str, Any] = {partition: None for partition in partitions}
+            page_size = count
+            while cursors and read < MAX_CANDIDATES:
+                # 残りの読み取り枠をシャードに割り振る。1 件ずつも割れなければ先頭のシャードだけ読む
+                left = MAX_CANDIDATES - read
+                pending = list(cursors.items())[:left]
+                limit = min(page_size, max(1, left // len(pending)))
+                page_size = CANDIDATE_PAGE_SIZE
+                responses = executor.map(
+                    lambda entry: _query_page(query(entry[0]), entry[1], limit), pending
+                )
+                page: List[Dict[str, Any]] = []
+                for (partition, _), response in zip(pending, responses):
+                    page.extend(response.get("Items") or [])
+                    # Limit はフィルタ前の件数に掛かるので、読んだ件数で上限を数える
+                    read += response.get("ScannedCount", len(response.get("Items") or []))
+                    if response.get("LastEvaluatedKey"):
+                        cursors[partition] = response["LastEvaluatedKey"]
+                    else:
+                        del cursors[partition]
+                LOGGER.info(f"Found {len(page)} available figures across {len(pending)} shards")
+                if page:
+                    yield sorted(page, key=lambda item: item.get(sort_key, ""))
+
+
+def _query_page(query: Dict[str, Any], start_key: Dict[str, Any] | None, limit: int) -> Dict[str, Any]:
+    kwargs = {**query, "Limit": limit, "ScanIndexForward": True}
+    if start_key:
+        kwargs["ExclusiveStartKey"] = start_key
+    with metrics.timed("ddb.query", index=query["IndexName"]) as measurement:
+        response = figures_table.query(**kwargs)
+        measurement.count = len(response.get("Items") or [])
+    return response
+
+
+def _try_lock(figure: Dict[str, Any]) -> bool:
     pk = figure["pk"]
     name = figure.get("name")
-    LOGGER.info(f"Selected figure: {name} ({pk})")
-    
     now_ms = int(time.time() * 1000)
     lock_until = _lock_until_ms(now_ms)
-
     try:
-        figures_table.update_item(
-            Key={"pk": pk},
-            UpdateExpression="SET #s = :locked, lockedUntil = :until, updatedAt = :updated",
-            ConditionExpression="#s = :available",
-            ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues={
-                ":locked": "locked",
-                ":available": "available",
-                ":until": lock_until,
-                ":updated": now_ms,
-            },
-        )
-        LOGGER.info(f"Successfully locked {name}")
+        with metrics.timed("ddb.lock_figure"):
+            figures_table.update_item(
+                Key={"pk": pk},
+                UpdateExpression=(
+                    "SET #s = :locked, lockedUntil = :until, updatedAt = :updated, "
+                    "lastAttemptAt = :updated, #k = :key"
+                ),
+                # 読んだ後にバックオフへ回った人物は取らない
+                ConditionExpression=(
+                    "begins_with(#s, :available) AND (attribute_not_exists(#k) OR begins_with(#k, :ready))"
+                ),
+                ExpressionAttributeNames={"#s": "status", "#k": schedule.SCHEDULE_KEY},
+                ExpressionAttributeValues={
+                    ":locked": figure_status.value(figure_status.LOCKED, pk),
+                    ":available": figure_status.AVAILABLE,
+                    ":until": lock_until,
+                    ":updated": now_ms,
+                    ":key": schedule.ready_key(schedule.priority_of(figure), now_ms),
+                    ":ready": schedule.READY_PREFIX,
+                },
+            )
     except figures_table.meta.client.exceptions.ConditionalCheckFailedException:
-        # Another worker acquired the lock; fall back to indicating none available.
+        # 他のワーカーが先にロックした。次の候補を試す
         LOGGER.warning(f"Failed to lock {name} - already locked by another worker")
-        return {"message": "no available figure"}
+        return False
+    figure["lockedUntil"] = lock_until
+    LOGGER.info(f"Successfully locked {name} ({pk})")
+    return True
 
-    result = {"figurePk": pk, "name": name}
-    LOGGER.info(f"Returning result: {result}")
-    return result
+
+def _release(figure: Dict[str, Any]) -> None:
+    """Give back a lease this run could not use, only if it still holds it."""
+    pk = figure["pk"]
+    try:
+        with metrics.timed("ddb.release_lock"):
+            figures_table.update_item(
+                Key={"pk": pk},
+                UpdateExpression="SET #s = :available, updatedAt = :updated REMOVE lockedUntil",
+                ConditionExpression="begins_with(#s, :locked) AND lockedUntil = :until",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":available": figure_status.value(figure_status.AVAILABLE, pk),
+                    ":locked": figure_status.LOCKED,
+                    ":until": figure["lockedUntil"],
+                    ":updated": int(time.time() * 1000),
+                },
+            )
+        LOGGER.info(f"Released {figure.get('name')} ({pk})")
+    except Exception:  # noqa: BLE001
+        # 解放できなくてもロック期限で lock_auto_release が戻す
+        LOGGER.exception(f"Failed to release {figure.get('name')} ({pk})")
+
+
+def _start_pipeline(figure: Dict[str, Any]) -> bool:
+    if not GENERATE_FUNCTION:
+        return True
+    try:
+        with metrics.timed("lambda.invoke_generate"):
+            lambda_client.invoke(
+                FunctionName=GENERATE_FUNCTION,
+                InvocationType="Event",
+                Payload=json.dumps(figure, ensure_ascii=False).encode("utf-8"),
+            )
+    except Exception:  # noqa: BLE001
+        LOGGER.exception(f"Failed to start snippet generation for {figure['name']} ({figure['figurePk']})")
+        return False
+    LOGGER.info(f"Started snippet generation for {figure['name']} ({figure['figurePk']})")
+    return True
 
 
 if __name__ == "__main__":
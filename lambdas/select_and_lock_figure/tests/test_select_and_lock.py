@@ -0,0 +1,127 @@
+import importlib.util
+import json
+import pathlib
+import types
+
+import pytest
+
+pytest.importorskip("boto3")
+
+FUNCTION_DIR = pathlib.Path(__file__).resolve().parents[1]
+SHARED_DIR = FUNCTION_DIR.parent / "shared"
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class FakeTable:
+    """update_item だけを持つ figures テーブル。taken の pk は他のワーカーがロック済み"""
+
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self.updates = []
+        self.meta = types.SimpleNamespace(
+            client=types.SimpleNamespace(
+                exceptions=types.SimpleNamespace(ConditionalCheckFailedException=ConditionalCheckFailedException)
+            )
+        )
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        if kwargs["Key"]["pk"] in self.taken:
+            raise ConditionalCheckFailedException()
+
+
+class FailingLambda:
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.invoked = []
+
+    def invoke(self, **kwargs):
+        pk = json.loads(kwargs["Payload"])["figurePk"]
+        if pk in self.failing:
+            raise RuntimeError("throttled")
+        self.invoked.append(pk)
+
+
+@pytest.fixture
+def main(monkeypatch):
+    monkeypatch.setenv("METRICS_ENABLED", "false")
+    monkeypatch.syspath_prepend(str(SHARED_DIR))
+    spec = importlib.util.spec_from_file_location("select_and_lock_figure_main", FUNCTION_DIR / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _use(main, monkeypatch, table, candidates):
+    monkeypatch.setattr(main, "figures_table", table)
+    monkeypatch.setattr(main, "_candidate_pages", lambda count: iter([list(candidates)]))
+
+
+def _figures(*pks):
+    return [{"pk": pk, "name": pk} for pk in pks]
+
+
+def test_lost_race_moves_on_to_the_next_candidate(main, monkeypatch):
+    table = FakeTable(taken={"figure#1"})
+    _use(main, monkeypatch, table, _figures("figure#1", "figure#2", "figure#3"))
+
+    leased = main._acquire(1)
+
+    assert [figure["pk"] for figure in leased] == ["figure#2"]
+    assert [update["Key"]["pk"] for update in table.updates] == ["figure#1", "figure#2"]
+
+
+def test_multi_lease_fills_the_requested_count(main, monkeypatch):
+    table = FakeTable(taken={"figure#2", "figure#4"})
+    _use(main, monkeypatch, table, _figures(*(f"figure#{i}" for i in range(1, 7))))
+
+    leased = main._acquire(3)
+
+    assert sorted(figure["pk"] for figure in leased) == ["figure#1", "figure#3", "figure#5"]
+    assert all("lockedUntil" in figure for figure in leased)
+
+
+def test_failed_invoke_releases_only_that_lease(main, monkeypatch):
+    table = FakeTable()
+    _use(main, monkeypatch, table, _figures("figure#1", "figure#2", "figure#3"))
+    lambda_client = FailingLambda(failing={"figure#2"})
+    monkeypatch.setattr(main, "lambda_client", lambda_client)
+    monkeypatch.setattr(main, "GENERATE_FUNCTION", "generate")
+
+    result = main.handler({"count": 3}, None)
+
+    assert result["figurePk"] == "figure#1"
+    assert [figure["figurePk"] for figure in result["figures"]] == ["figure#1", "figure#3"]
+    assert lambda_client.invoked == ["figure#3"]
+    release = table.updates[-1]
+    assert release["Key"] == {"pk": "figure#2"}
+    assert release["ExpressionAttributeValues"][":available"].startswith("available")
+    assert "begins_with(#s, :locked)" in release["ConditionExpression"]
+
+
+class EndlessTable(FakeTable):
+    """どのシャードにも Limit 件ずつ無限に候補がある"""
+
+    def __init__(self):
+        super().__init__()
+        self.limits = []
+
+    def query(self, **kwargs):
+        self.limits.append(kwargs["Limit"])
+        items = [{"pk": f"figure#{len(self.limits)}-{i}", "scheduleKey": "ready#"} for i in range(kwargs["Limit"])]
+        return {"Items": items, "ScannedCount": len(items), "LastEvaluatedKey": {"pk": "next"}}
+
+
+def test_candidate_pages_read_count_first_and_stay_within_the_cap(main, monkeypatch):
+    table = EndlessTable()
+    monkeypatch.setattr(main, "figures_table", table)
+    monkeypatch.setattr(main, "MAX_CANDIDATES", 50)
+    shards = len(main.figure_status.partitions(main.figure_status.AVAILABLE))
+
+    pages = list(main._candidate_pages(4))
+
+    assert len(pages[0]) == 4 * shards
+    assert sum(table.limits) == 50
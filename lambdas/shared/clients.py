@@ -0,0 +1,38 @@
+"""Lazily constructed, module-cached AWS / API clients shared by every Lambda.
+
+Building boto3 resources and API clients at import time makes every cold
+start pay for clients the invocation may never use. ``LazyClient`` defers the
+construction to the first attribute access and then reuses the instance for
+the rest of the container's life, so call sites keep using a plain module
+attribute (``figures_table.update_item(...)``).
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class LazyClient(Generic[T]):
+    """Proxy that calls factory once, on first use, and forwards attribute access to the result."""
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._instance: T | None = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            # スレッドプールから同時に触られても 1 回だけ生成する
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    def __getattr__(self, name: str) -> Any:
+        # プロキシ自身の属性は _ で始まるものだけにして、転送先の名前と衝突させない
+        return getattr(self._get(), name)
@@ -0,0 +1,56 @@
+"""Write-sharded ``status`` values for the figures table.
+
+``status`` is the partition key of status-index and schedule-index, so with
+plain values every available or locked figure lands on one hot index key.
+Available and locked figures therefore store ``<state>#<shard>`` (for example
+``available#07``), where the shard is a stable hash of ``pk``; readers fan out
+over every shard of a state. Other states are rare and stay unsharded.
+
+Conditions should use ``begins_with(status, <state>)`` so that items still
+holding a plain value (before scripts/migrate_status_shards.py has run) or a
+different shard count keep matching. The module is copied next to each
+function's main.py at bundle time.
+"""
+
+from __future__ import annotations
+
+import os
+import zlib
+from typing import List
+
+READY = "ready"
+AVAILABLE = "available"
+LOCKED = "locked"
+COMPLETED = "completed"
+SHARDED_STATES = (AVAILABLE, LOCKED)
+SEPARATOR = "#"
+STATUS_SHARDS = max(1, int(os.environ.get("STATUS_SHARDS", "8")))
+
+
+def shard_of(pk: str, shards: int = STATUS_SHARDS) -> int:
+    # 管理アプリ（apps/figures-app/lib/figures.ts）も同じ CRC32 で割り振る
+    return zlib.crc32(pk.encode("utf-8")) % shards
+
+
+def value(state: str, pk: str, shards: int = STATUS_SHARDS) -> str:
+    """The stored status for a figure entering state."""
+    if state not in SHARDED_STATES or shards <= 1:
+        return state
+    return f"{state}{SEPARATOR}{shard_of(pk, shards):02d}"
+
+
+def partitions(state: str, shards: int = STATUS_SHARDS, include_plain: bool = True) -> List[str]:
+    """Every index partition that can hold figures in state.
+
+    The plain value is included so figures written before sharding are still
+    found; it is one extra query that returns nothing once migrated.
+    """
+    if state not in SHARDED_STATES or shards <= 1:
+        return [state]
+    values = [f"{state}{SEPARATOR}{shard:02d}" for shard in range(shards)]
+    return values + [state] if include_plain else values
+
+
+def state_of(status: str) -> str:
+    """available#07 -> available"""
+    return (status or "").split(SEPARATOR, 1)[0]
@@ -0,0 +1,128 @@
+"""CloudWatch Embedded Metric Format (EMF) timing helpers shared by every Lambda.
+
+Each measurement is one JSON line on stdout. In Lambda, CloudWatch turns the
+lines into metrics; elsewhere they are just log lines, so nothing here needs
+network access. The module is copied next to each function's main.py at
+bundle time (see createPythonFunction in cdk/lib/stack.ts).
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, TypeVar
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "HistricalPerson")
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+DIMENSIONS = ["Function", "Operation"]
+
+_write_lock = threading.Lock()
+T = TypeVar("T")
+
+
+class Measurement:
+    """Values a timed block can fill in before it is emitted."""
+
+    def __init__(self, operation: str, properties: Dict[str, Any]) -> None:
+        self.operation = operation
+        self.properties = dict(properties)
+        self.bytes: Optional[int] = None
+        self.retries = 0
+        self.count: Optional[int] = None
+
+    def add_bytes(self, value: int) -> None:
+        self.bytes = (self.bytes or 0) + int(value)
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size so far (Linux reports ru_maxrss in KiB)."""
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def emit(operation: str, values: Dict[str, tuple], properties: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Write one EMF record; values maps metric name to (value, unit)."""
+    record: Dict[str, Any] = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [DIMENSIONS],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+                }
+            ],
+        },
+        "Function": FUNCTION_NAME,
+        "Operation": operation,
+    }
+    # プロパティはメトリクスにならず、ログ検索用にそのまま残る
+    record.update(properties or {})
+    record.update({name: value for name, (value, _) in values.items()})
+    if METRICS_ENABLED:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _write_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+    return record
+
+
+@contextmanager
+def timed(operation: str, child_rss: bool = False, **properties: Any) -> Iterator[Measurement]:
+    """Time the block and emit Duration, Errors, PeakRss and any bytes/retries/count it set."""
+    measurement = Measurement(operation, properties)
+    started = time.perf_counter()
+    error: Optional[BaseException] = None
+    try:
+        yield measurement
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        values: Dict[str, tuple] = {
+            "Duration": (round((time.perf_counter() - started) * 1000, 3), "Milliseconds"),
+            "Errors": (1 if error else 0, "Count"),
+            "PeakRss": (round(peak_rss_mb(), 1), "Megabytes"),
+        }
+        if child_rss:
+            values["ChildPeakRss"] = (round(peak_rss_mb(children=True), 1), "Megabytes")
+        if measurement.bytes is not None:
+            values["Bytes"] = (measurement.bytes, "Bytes")
+        if measurement.retries:
+            values["Retries"] = (measurement.retries, "Count")
+        if measurement.count is not None:
+            values["Items"] = (measurement.count, "Count")
+        if error is not None:
+            measurement.properties["error"] = type(error).__name__
+        emit(operation, values, measurement.properties)
+
+
+def timed_call(operation: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator form of timed() for functions that need no extra values."""
+
+    def decorate(function: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with timed(operation):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def run(cmd: Sequence[str], operation: Optional[str] = None, **kwargs: Any) -> subprocess.CompletedProcess:
+    """subprocess.run with a metric per call (operation defaults to the program name, e.g. ffmpeg)."""
+    with timed(operation or os.path.basename(str(cmd[0])), child_rss=True) as measurement:
+        result = subprocess.run(cmd, **kwargs)
+        if isinstance(result.stdout, (bytes, str)):
+            measurement.add_bytes(len(result.stdout))
+        return result
@@ -0,0 +1,70 @@
+"""Scheduling key that orders available figures on the figures schedule-index.
+
+``schedule-index`` is partitioned by ``status`` and sorted by ``scheduleKey``:
+
+* ``ready#<inverted priority>#<last attempt ms>`` for figures that may be
+  picked now, so an ascending query returns the highest ``priority`` first and,
+  among equals, the one attempted longest ago (never attempted = 0).
+* ``backoff#<retry at ms>`` for figures whose last attempt failed. The
+  selection query only reads the ``ready#`` prefix, and lock_auto_release
+  moves them back to a ready key once the retry time has passed, so a figure
+  that keeps failing is not picked every day.
+
+The module is copied next to each function's main.py at bundle time.
+"""
+
+from __future__ import annotations
+
+import os
+from decimal import Decimal
+from typing import Any, Mapping, Tuple
+
+SCHEDULE_INDEX = "schedule-index"
+SCHEDULE_KEY = "scheduleKey"
+READY_PREFIX = "ready#"
+BACKOFF_PREFIX = "backoff#"
+MAX_PRIORITY = 999
+# 失敗ごとに 12h, 24h, 48h ... と待ち、最大 14 日
+FAILURE_BACKOFF_MS = int(float(os.environ.get("FAILURE_BACKOFF_HOURS", "12")) * 3600 * 1000)
+MAX_BACKOFF_MS = int(float(os.environ.get("MAX_BACKOFF_HOURS", str(14 * 24))) * 3600 * 1000)
+_TIME_WIDTH = 13  # ミリ秒の epoch を桁揃えして文字列でも時刻順に並べる
+
+
+def priority_of(item: Mapping[str, Any]) -> int:
+    """The figure's priority clamped to 0..MAX_PRIORITY (missing = 0)."""
+    value = item.get("priority") or 0
+    try:
+        priority = int(Decimal(str(value)))
+    except ArithmeticError:
+        return 0
+    return min(MAX_PRIORITY, max(0, priority))
+
+
+def ready_key(priority: int, last_attempt_ms: int = 0) -> str:
+    inverted = MAX_PRIORITY - min(MAX_PRIORITY, max(0, int(priority)))
+    return f"{READY_PREFIX}{inverted:03d}#{max(0, int(last_attempt_ms)):0{_TIME_WIDTH}d}"
+
+
+def ready_key_for(item: Mapping[str, Any]) -> str:
+    return ready_key(priority_of(item), int(item.get("lastAttemptAt") or 0))
+
+
+def backoff_key(retry_at_ms: int) -> str:
+    return f"{BACKOFF_PREFIX}{max(0, int(retry_at_ms)):0{_TIME_WIDTH}d}"
+
+
+def backoff_ms(failures: int) -> int:
+    """Wait before the next attempt after ``failures`` consecutive failures."""
+    if failures <= 0:
+        return 0
+    # 2 ** n の桁あふれを避けるため指数を頭打ちにする
+    return min(MAX_BACKOFF_MS, FAILURE_BACKOFF_MS * 2 ** min(failures - 1, 32))
+
+
+def due_backoff_range(now_ms: int) -> Tuple[str, str]:
+    """(low, high) for a BETWEEN key condition matching backoff keys due by now_ms."""
+    return backoff_key(0), backoff_key(now_ms)
+
+
+def failures_of(item: Mapping[str, Any]) -> int:
+    return int(item.get("failures") or 0)
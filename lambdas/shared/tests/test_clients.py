@@ -0,0 +1,51 @@
+import threading
+
+from lambdas.shared import clients
+
+
+class Factory:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"name": "client"}
+
+
+def test_client_is_built_on_first_use_only():
+    factory = Factory()
+    client = clients.LazyClient(factory)
+    assert factory.calls == 0
+    assert client._instance is None
+
+    assert client.get("name") == "client"  # dict.get へ転送される
+    assert client.keys() is not None
+    assert factory.calls == 1
+    assert client._instance is not None
+
+
+def test_concurrent_first_use_builds_once():
+    factory = Factory()
+    client = clients.LazyClient(factory)
+    barrier = threading.Barrier(8)
+
+    def use():
+        barrier.wait()
+        client.items()
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert factory.calls == 1
+
+
+def test_nested_lazy_clients_share_the_parent():
+    parent_factory = Factory()
+    parent = clients.LazyClient(parent_factory)
+    child = clients.LazyClient(lambda: parent.copy())
+
+    assert parent._instance is None
+    assert child.get("name") == "client"
+    assert parent_factory.calls == 1
@@ -0,0 +1,36 @@
+from lambdas.shared import figure_status
+
+
+def test_available_and_locked_are_sharded_by_pk():
+    value = figure_status.value(figure_status.AVAILABLE, "figure#001", shards=8)
+    assert value == f"available#{figure_status.shard_of('figure#001', 8):02d}"
+    # 同じ人物はロック中も同じシャード
+    assert figure_status.value(figure_status.LOCKED, "figure#001", shards=8).endswith(value[-3:])
+    # 管理アプリの CRC32 実装と同じ値
+    assert figure_status.shard_of("figure#001", 8) == 2759981806 % 8
+
+
+def test_other_states_and_single_shard_stay_plain():
+    assert figure_status.value(figure_status.COMPLETED, "figure#001", shards=8) == "completed"
+    assert figure_status.value(figure_status.READY, "figure#001", shards=8) == "ready"
+    assert figure_status.value(figure_status.AVAILABLE, "figure#001", shards=1) == "available"
+
+
+def test_shards_spread_sequential_keys():
+    shards = {figure_status.shard_of(f"figure#{i:03d}", 8) for i in range(100)}
+    assert shards == set(range(8))
+
+
+def test_partitions_cover_every_shard_and_the_plain_value():
+    partitions = figure_status.partitions(figure_status.LOCKED, shards=4)
+    assert partitions == ["locked#00", "locked#01", "locked#02", "locked#03", "locked"]
+    assert figure_status.partitions(figure_status.LOCKED, shards=4, include_plain=False)[-1] == "locked#03"
+    assert figure_status.partitions(figure_status.COMPLETED, shards=4) == ["completed"]
+    for pk in ("figure#001", "figure#Confucius"):
+        assert figure_status.value(figure_status.LOCKED, pk, shards=4) in partitions
+
+
+def test_state_of_strips_the_shard():
+    assert figure_status.state_of("available#07") == "available"
+    assert figure_status.state_of("completed") == "completed"
+    assert figure_status.state_of("") == ""
@@ -0,0 +1,62 @@
+import json
+import sys
+
+import pytest
+
+from lambdas.shared import metrics
+
+
+def _records(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_timed_emits_embedded_metric_format(capsys):
+    with metrics.timed("s3.upload", purpose="outputs") as measurement:
+        measurement.add_bytes(10)
+        measurement.add_bytes(5)
+        measurement.retries += 2
+
+    (record,) = _records(capsys)
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Dimensions"] == [["Function", "Operation"]]
+    names = {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]}
+    assert names == {
+        "Duration": "Milliseconds",
+        "Errors": "Count",
+        "PeakRss": "Megabytes",
+        "Bytes": "Bytes",
+        "Retries": "Count",
+    }
+    # ディメンションとメトリクスの値はトップレベルに置かれる
+    assert record["Operation"] == "s3.upload"
+    assert record["Bytes"] == 15
+    assert record["Retries"] == 2
+    assert record["Errors"] == 0
+    assert record["purpose"] == "outputs"
+
+
+def test_timed_records_errors_and_reraises(capsys):
+    with pytest.raises(KeyError):
+        with metrics.timed("ddb.query"):
+            raise KeyError("pk")
+
+    (record,) = _records(capsys)
+    assert record["Errors"] == 1
+    assert record["error"] == "KeyError"
+
+
+def test_run_reports_child_rss_and_output_bytes(capsys):
+    result = metrics.run([sys.executable, "-c", "print('abc')"], capture_output=True, check=True)
+
+    assert result.stdout.strip() == b"abc"
+    (record,) = _records(capsys)
+    assert record["Operation"] == sys.executable.rsplit("/", 1)[-1]
+    assert record["Bytes"] == len(result.stdout)
+    assert "ChildPeakRss" in record
+
+
+def test_disabled_metrics_write_nothing(capsys, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    with metrics.timed("ddb.query"):
+        pass
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from lambdas.shared import schedule
+
+
+def test_higher_priority_sorts_first():
+    keys = [schedule.ready_key(0), schedule.ready_key(10), schedule.ready_key(999)]
+    assert sorted(keys) == keys[::-1]
+
+
+def test_older_attempt_sorts_first_within_priority():
+    never = schedule.ready_key(5, 0)
+    old = schedule.ready_key(5, 1_700_000_000_000)
+    recent = schedule.ready_key(5, 1_800_000_000_000)
+    assert sorted([recent, old, never]) == [never, old, recent]
+    # 優先度の差は試行時刻より強い
+    assert schedule.ready_key(6, 1_800_000_000_000) < never
+
+
+def test_priority_is_clamped_and_read_from_items():
+    assert schedule.ready_key(5000) == schedule.ready_key(schedule.MAX_PRIORITY)
+    assert schedule.ready_key(-3) == schedule.ready_key(0)
+    assert schedule.priority_of({"priority": Decimal("42")}) == 42
+    assert schedule.priority_of({"priority": "oops"}) == 0
+    assert schedule.priority_of({}) == 0
+    item = {"priority": Decimal("7"), "lastAttemptAt": Decimal("123")}
+    assert schedule.ready_key_for(item) == schedule.ready_key(7, 123)
+
+
+def test_backoff_keys_are_outside_the_ready_prefix():
+    assert not schedule.backoff_key(1).startswith(schedule.READY_PREFIX)
+    assert schedule.ready_key(0).startswith(schedule.READY_PREFIX)
+
+
+def test_due_range_matches_only_elapsed_backoffs():
+    low, high = schedule.due_backoff_range(1_000_000)
+    assert low <= schedule.backoff_key(999_999) <= high
+    assert low <= schedule.backoff_key(1_000_000) <= high
+    assert not low <= schedule.backoff_key(1_000_001) <= high
+
+
+def test_backoff_doubles_up_to_the_cap():
+    base = schedule.FAILURE_BACKOFF_MS
+    assert schedule.backoff_ms(0) == 0
+    assert schedule.backoff_ms(1) == base
+    assert schedule.backoff_ms(2) == base * 2
+    assert schedule.backoff_ms(3) == base * 4
+    assert schedule.backoff_ms(100) == schedule.MAX_BACKOFF_MS
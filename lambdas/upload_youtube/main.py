@@ -8,14 +8,19 @@ import os
 import pathlib
 import tempfile
 import time
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Dict, Tuple
 
 import boto3
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 
+import clients
+import metrics
+import s3_media
+import upload_session
+from upload_session import EXPIRED_STATUSES, UploadSession
+
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.INFO)
@@ -23,6 +28,8 @@ LOGGER.setLevel(logging.INFO)
 S3_BUCKET = os.environ["S3_BUCKET"]
 DDB_FIGURES = os.environ.get("DDB_FIGURES", "figures")
 THUMBNAIL_BUCKET = os.environ.get("THUMBNAIL_BUCKET", "histrical-person-thumbnails")
+# 再開可能アップロードの 1 リクエストあたりのサイズ（256KiB の倍数になるよう MiB 単位）
+YT_CHUNK_MB = max(1, int(os.environ.get("YT_CHUNK_MB", "16")))
 
 YT_CLIENT_ID = os.environ["YT_CLIENT_ID"]
 YT_CLIENT_SECRET = os.environ["YT_CLIENT_SECRET"]
@@ -63,9 +70,9 @@ FIXED_TAGS = ["名言", "歴史", "偉人", "日本史", "格言", "人生訓",
 
 TOKEN_URI = "https://oauth2.googleapis.com/token"
 
-dynamodb = boto3.resource("dynamodb")
-figures_table = dynamodb.Table(DDB_FIGURES)
-s3_client = boto3.client("s3")
+dynamodb = clients.LazyClient(lambda: boto3.resource("dynamodb"))
+figures_table = clients.LazyClient(lambda: dynamodb.Table(DDB_FIGURES))
+s3_client = clients.LazyClient(lambda: boto3.client("s3"))
 
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
@@ -78,6 +85,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         while "requestPayload" in payload and "responsePayload" in payload:
             payload = payload["responsePayload"]
         event = payload
+
+    # 言葉の生成が別呼び出しで継続中の場合は何もしない
+    if event.get("message") == "continuing":
+        LOGGER.info("Snippet generation is continuing; skipping upload")
+        return {"message": "continuing"}
     
     figure_pk = event.get("figurePk")
     name = event.get("name")
@@ -86,7 +98,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         LOGGER.error(f"Missing figurePk or name in event: {event}")
         raise ValueError("figurePk and name are required")
 
-    figure = figures_table.get_item(Key={"pk": figure_pk}).get("Item")
+    with metrics.timed("ddb.get_figure"):
+        figure = figures_table.get_item(Key={"pk": figure_pk}).get("Item")
     if not figure:
         raise ValueError(f"Figure {figure_pk} not found")
 
@@ -97,23 +110,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
 
     video_info = figure.get("video") or {}
     s3_key = video_info.get("s3Key") or f"out/{name}/final.mp4"
-    local_video = _download_from_s3(S3_BUCKET, s3_key)
 
     # サムネイルをダウンロード
     thumbnail_key = f"{name}_サムネ.png"
     local_thumbnail = _download_thumbnail(thumbnail_key, name)
 
-    credentials = Credentials(
-        token=None,
-        refresh_token=YT_REFRESH_TOKEN,
-        token_uri=TOKEN_URI,
-        client_id=YT_CLIENT_ID,
-        client_secret=YT_CLIENT_SECRET,
-        scopes=["https://www.googleapis.com/auth/youtube.upload"],
-    )
-
-    youtube = build("youtube", "v3", credentials=credentials)
-    media = MediaFileUpload(str(local_video), chunksize=-1, resumable=True, mimetype="video/mp4")
+    youtube = _youtube()
+    # 動画は /tmp に落とさず、S3 の範囲取得で次のチャンクを先読みしながら送る
+    media = s3_media.S3RangeMedia(s3_client, S3_BUCKET, s3_key, chunksize=YT_CHUNK_MB * 1024 * 1024)
 
     # 概要欄とタグを生成
     description = DESCRIPTION_TEMPLATE.format(name=name)
@@ -133,19 +137,21 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         },
     }
 
-    request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+    # 前回の呼び出しがタイムアウト等で中断していれば、同じセッションの続きから送る
+    session = UploadSession.from_item(figure.get("youtubeUpload"))
+    if session is not None and not session.usable_for(s3_key, media.size(), int(time.time() * 1000)):
+        LOGGER.info("Discarding stale upload session for %s", name)
+        session = None
 
     try:
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                LOGGER.info("Upload progress: %.2f%%", status.progress() * 100)
+        response = _upload_video(youtube, body, media, figure_pk, s3_key, session)
         youtube_id = response["id"]
         LOGGER.info("Uploaded video id: %s", youtube_id)
     except HttpError as exc:
         LOGGER.error("YouTube upload failed: %s", exc)
         raise
+    finally:
+        media.close()
 
     # サムネイルをアップロード
     if local_thumbnail:
@@ -155,10 +161,108 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     return {"youtubeId": youtube_id}
 
 
-def _download_from_s3(bucket: str, key: str) -> pathlib.Path:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-        s3_client.download_fileobj(bucket, key, tmp)
-        return pathlib.Path(tmp.name)
+@lru_cache(maxsize=1)
+def _youtube():
+    """Build the YouTube client once per container; the refreshed access token is reused while valid."""
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+
+    credentials = Credentials(
+        token=None,
+        refresh_token=YT_REFRESH_TOKEN,
+        token_uri=TOKEN_URI,
+        client_id=YT_CLIENT_ID,
+        client_secret=YT_CLIENT_SECRET,
+        scopes=["https://www.googleapis.com/auth/youtube.upload"],
+    )
+    # ライブラリ同梱のディスカバリー文書を使い、ネットワーク取得やファイルキャッシュを避ける
+    return build("youtube", "v3", credentials=credentials, static_discovery=True, cache_discovery=False)
+
+
+def _upload_video(
+    youtube,
+    body: Dict[str, Any],
+    media: s3_media.S3RangeMedia,
+    figure_pk: str,
+    s3_key: str,
+    session: UploadSession | None,
+) -> Dict[str, Any]:
+    """Send the video chunk by chunk, saving the session URI and confirmed offset after each one."""
+    request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+    resuming = session is not None
+    response = None
+    if resuming:
+        LOGGER.info("Resuming upload session at byte %s of %s", session.offset, session.size)
+        request.resumable_uri = session.uri
+        # 保存した offset の後に送った分が届いている場合もあるので、受信済みの位置をサーバーに問い合わせる
+        try:
+            request.resumable_progress, response = _query_upload_status(request, media.size())
+        except HttpError as exc:
+            if exc.resp.status not in EXPIRED_STATUSES:
+                raise
+            LOGGER.warning("Upload session expired (HTTP %s); starting over", exc.resp.status)
+            _save_upload_session(figure_pk, None)
+            return _upload_video(youtube, body, media, figure_pk, s3_key, None)
+
+    while response is None:
+        with metrics.timed("youtube.chunk", resumed=resuming) as measurement:
+            sent = request.resumable_progress
+            try:
+                status, response = request.next_chunk()
+            except HttpError as exc:
+                # セッションはどのチャンクの途中でも失効しうる
+                if session is not None and exc.resp.status in EXPIRED_STATUSES:
+                    LOGGER.warning("Upload session expired (HTTP %s); starting over", exc.resp.status)
+                    _save_upload_session(figure_pk, None)
+                    return _upload_video(youtube, body, media, figure_pk, s3_key, None)
+                raise
+            measurement.add_bytes(
+                (request.resumable_progress if response is None else media.size()) - sent
+            )
+        resuming = False
+        if response is None and request.resumable_uri:
+            if session is None:
+                session = UploadSession(
+                    uri=request.resumable_uri,
+                    offset=request.resumable_progress,
+                    s3_key=s3_key,
+                    size=media.size(),
+                    started_at=int(time.time() * 1000),
+                )
+            else:
+                session = session.advanced(request.resumable_uri, request.resumable_progress)
+            _save_upload_session(figure_pk, session)
+        if status:
+            LOGGER.info("Upload progress: %.2f%%", status.progress() * 100)
+    return response
+
+
+@metrics.timed_call("youtube.upload_status")
+def _query_upload_status(request, size: int) -> Tuple[int, Dict[str, Any] | None]:
+    """Ask the session URI how many bytes it holds; returns (offset, video) where video is set if already complete."""
+    resp, content = request.http.request(
+        request.resumable_uri, method="PUT", body="", headers=upload_session.status_query_headers(size)
+    )
+    if resp.status == upload_session.INCOMPLETE_STATUS:
+        if "location" in resp:
+            request.resumable_uri = resp["location"]
+        return upload_session.received_bytes(resp.get("range")), None
+    if resp.status in (200, 201):
+        # 前回の最後のチャンクは届いていて、レスポンスだけ受け取れなかった
+        return size, json.loads(content)
+    raise HttpError(resp, content, uri=request.resumable_uri)
+
+
+@metrics.timed_call("ddb.save_upload_session")
+def _save_upload_session(figure_pk: str, session: UploadSession | None) -> None:
+    if session is None:
+        figures_table.update_item(Key={"pk": figure_pk}, UpdateExpression="REMOVE youtubeUpload")
+        return
+    figures_table.update_item(
+        Key={"pk": figure_pk},
+        UpdateExpression="SET youtubeUpload = :session",
+        ExpressionAttributeValues={":session": session.to_item()},
+    )
 
 
 def _download_thumbnail(key: str, name: str) -> pathlib.Path | None:
@@ -174,6 +278,7 @@ def _download_thumbnail(key: str, name: str) -> pathlib.Path | None:
         return None
 
 
+@metrics.timed_call("youtube.thumbnail")
 def _upload_thumbnail(youtube, video_id: str, thumbnail_path: pathlib.Path) -> None:
     """YouTubeにサムネイルをアップロード"""
     try:
@@ -188,6 +293,7 @@ def _upload_thumbnail(youtube, video_id: str, thumbnail_path: pathlib.Path) -> N
         # サムネイルアップロード失敗は致命的ではないので続行
 
 
+@metrics.timed_call("ddb.update_figure")
 def _record_youtube_id(figure_pk: str, youtube_id: str, video_info: Dict[str, Any], s3_key: str) -> None:
     now_ms = int(time.time() * 1000)
     payload = {
@@ -201,7 +307,7 @@ def _record_youtube_id(figure_pk: str, youtube_id: str, video_info: Dict[str, An
 
     figures_table.update_item(
         Key={"pk": figure_pk},
-        UpdateExpression="SET video = :video, updatedAt = :updated",
+        UpdateExpression="SET video = :video, updatedAt = :updated REMOVE youtubeUpload",
         ExpressionAttributeValues={
             ":video": payload,
             ":updated": now_ms,
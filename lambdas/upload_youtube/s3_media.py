@@ -0,0 +1,110 @@
+"""Feed a YouTube resumable upload straight from S3 with ranged GETs."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional, Tuple
+
+from googleapiclient.http import MediaUpload
+
+CHUNK_ALIGNMENT = 256 * 1024  # YouTube の再開可能アップロードは 256KiB の倍数で送る
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+class S3RangeMedia(MediaUpload):
+    """MediaUpload whose bytes come from ranged S3 GETs instead of a local file.
+
+    Only the buffered chunk, the next one (fetched in the background while the
+    current request is sent) and the request body are held in memory, so memory
+    use stays around three chunks and no disk is needed whatever the video size.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        bucket: str,
+        key: str,
+        chunksize: int = DEFAULT_CHUNK_SIZE,
+        mimetype: str = "video/mp4",
+        size: Optional[int] = None,
+    ) -> None:
+        if chunksize <= 0 or chunksize % CHUNK_ALIGNMENT:
+            raise ValueError(f"chunksize must be a positive multiple of {CHUNK_ALIGNMENT}")
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._chunksize = chunksize
+        self._mimetype = mimetype
+        self._size = size if size is not None else client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._current: Tuple[int, bytes] = (0, b"")
+        self._prefetch: Optional[Tuple[int, Future]] = None
+        self.bytes_fetched = 0
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return self._mimetype
+
+    def size(self) -> int:
+        return self._size
+
+    def resumable(self) -> bool:
+        return True
+
+    def has_stream(self) -> bool:
+        return False
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        with self._lock:
+            pieces = []
+            position = begin
+            end = min(begin + length, self._size)
+            while position < end:
+                start, body = self._current
+                if not start <= position < start + len(body):
+                    self._load(position)
+                    continue
+                piece = body[position - start : end - start]
+                pieces.append(piece)
+                position += len(piece)
+            self._schedule(position)
+            return b"".join(pieces)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _load(self, position: int) -> None:
+        """Make the chunk starting at position current, using the prefetched one when it matches."""
+        if self._prefetch is not None and self._prefetch[0] == position:
+            body = self._prefetch[1].result()
+        else:
+            # 再開位置がずれた場合などは先読みを捨てて取り直す
+            if self._prefetch is not None:
+                self._prefetch[1].cancel()
+            body = self._fetch(position, self._chunksize)
+        self._prefetch = None
+        self._current = (position, body)
+
+    def _schedule(self, position: int) -> None:
+        """Start fetching the chunk that follows the bytes already buffered past position."""
+        start, body = self._current
+        if start <= position < start + len(body):
+            position = start + len(body)
+        if position >= self._size or (self._prefetch and self._prefetch[0] == position):
+            return
+        if self._prefetch is not None:
+            self._prefetch[1].cancel()
+        self._prefetch = (position, self._executor.submit(self._fetch, position, self._chunksize))
+
+    def _fetch(self, begin: int, length: int) -> bytes:
+        if begin >= self._size:
+            return b""
+        end = min(begin + length, self._size) - 1
+        response = self._client.get_object(Bucket=self._bucket, Key=self._key, Range=f"bytes={begin}-{end}")
+        body = response["Body"].read()
+        self.bytes_fetched += len(body)
+        return body
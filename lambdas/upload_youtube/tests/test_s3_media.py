@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from lambdas.upload_youtube import s3_media  # noqa: E402
+
+CHUNK = s3_media.CHUNK_ALIGNMENT
+
+
+class FakeS3:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.ranges = []
+
+    def head_object(self, Bucket, Key):  # noqa: N803
+        return {"ContentLength": len(self.data)}
+
+    def get_object(self, Bucket, Key, Range):  # noqa: N803
+        start, end = (int(value) for value in Range.removeprefix("bytes=").split("-"))
+        self.ranges.append((start, end))
+        return {"Body": io.BytesIO(self.data[start : end + 1])}
+
+
+def _media(data: bytes) -> tuple:
+    client = FakeS3(data)
+    return client, s3_media.S3RangeMedia(client, "bucket", "out/a/final.mp4", chunksize=CHUNK)
+
+
+def test_chunks_are_read_in_order_with_prefetch():
+    data = bytes(range(256)) * (CHUNK * 2 // 256 + 10)
+    client, media = _media(data)
+
+    first = media.getbytes(0, CHUNK)
+    second = media.getbytes(CHUNK, CHUNK)
+    third = media.getbytes(2 * CHUNK, CHUNK)
+    media.close()
+
+    assert first + second + third == data
+    assert len(third) < CHUNK  # 短い読み取りで最後のチャンクと分かる
+    # 各範囲は 1 回だけ取得される（先読みが使われている）
+    assert client.ranges == [(0, CHUNK - 1), (CHUNK, 2 * CHUNK - 1), (2 * CHUNK, len(data) - 1)]
+    assert media.size() == len(data)
+    assert media.resumable() and not media.has_stream()
+
+
+def test_resume_inside_current_chunk_reuses_buffer():
+    data = b"x" * CHUNK + b"y" * CHUNK
+    client, media = _media(data)
+
+    media.getbytes(0, CHUNK)
+    # サーバーが途中までしか受け取らなかった場合、その位置から再送する
+    retry = media.getbytes(1000, CHUNK)
+    media.close()
+
+    assert retry == data[1000 : 1000 + CHUNK]
+    assert client.ranges == [(0, CHUNK - 1), (CHUNK, 2 * CHUNK - 1)]
+
+
+def test_resume_at_arbitrary_offset_fetches_directly():
+    data = bytes(range(256)) * (CHUNK * 3 // 256)
+    client, media = _media(data)
+
+    assert media.getbytes(2 * CHUNK + 5, CHUNK) == data[2 * CHUNK + 5 :]
+    media.close()
+    assert client.ranges[0] == (2 * CHUNK + 5, len(data) - 1)
+
+
+def test_chunksize_must_be_aligned():
+    with pytest.raises(ValueError):
+        s3_media.S3RangeMedia(FakeS3(b""), "bucket", "key", chunksize=CHUNK + 1)
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from lambdas.upload_youtube import upload_session
+from lambdas.upload_youtube.upload_session import UploadSession
+
+NOW = 1_700_000_000_000
+
+
+def _session(**overrides):
+    values = {"uri": "https://upload/abc", "offset": 1024, "s3_key": "out/a/final.mp4", "size": 4096, "started_at": NOW}
+    values.update(overrides)
+    return UploadSession(**values)
+
+
+def test_round_trips_through_dynamodb_item():
+    item = {key: Decimal(value) if isinstance(value, int) else value for key, value in _session().to_item().items()}
+    assert UploadSession.from_item(item) == _session()
+
+
+def test_missing_or_malformed_items_are_ignored():
+    assert UploadSession.from_item(None) is None
+    assert UploadSession.from_item({}) is None
+    assert UploadSession.from_item({"uri": "https://upload/abc", "size": "big"}) is None
+
+
+def test_session_only_resumes_same_file_before_expiry():
+    session = _session()
+    assert session.usable_for("out/a/final.mp4", 4096, NOW + 1000)
+    assert not session.usable_for("out/b/final.mp4", 4096, NOW)
+    assert not session.usable_for("out/a/final.mp4", 8192, NOW)  # 再レンダリングされた
+    assert not session.usable_for("out/a/final.mp4", 4096, NOW + upload_session.SESSION_TTL_MS)
+
+
+def test_advanced_keeps_identity_and_start_time():
+    moved = _session().advanced("https://upload/def", 2048)
+    assert moved == _session(uri="https://upload/def", offset=2048)
+
+
+def test_status_query_asks_for_the_received_range():
+    assert upload_session.status_query_headers(4096) == {"Content-Length": "0", "Content-Range": "bytes */4096"}
+
+
+def test_received_bytes_reads_the_308_range_header():
+    assert upload_session.received_bytes("bytes=0-1048575") == 1048576
+    assert upload_session.received_bytes(None) == 0
+    assert upload_session.received_bytes("") == 0
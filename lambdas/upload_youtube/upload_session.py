@@ -0,0 +1,71 @@
+"""Resumable YouTube upload sessions persisted on the figure item."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+# YouTube の再開可能セッションは約 1 週間で失効する。余裕を持って早めに捨てる
+SESSION_TTL_MS = 6 * 24 * 60 * 60 * 1000
+# セッション URI に対してこれらが返ったら失効扱いで最初からやり直す
+EXPIRED_STATUSES = (404, 410)
+# 状態問い合わせに対し、未完了なら 308 と受信済み範囲（Range: bytes=0-<最後のバイト>）が返る
+INCOMPLETE_STATUS = 308
+
+
+def status_query_headers(size: int) -> Dict[str, str]:
+    """Headers of the empty PUT that asks the server how much of size it has received."""
+    return {"Content-Length": "0", "Content-Range": f"bytes */{size}"}
+
+
+def received_bytes(range_header: Optional[str]) -> int:
+    """Bytes the server has confirmed, from the Range header of a 308 (absent = nothing yet)."""
+    if not range_header:
+        return 0
+    return int(range_header.rsplit("-", 1)[1]) + 1
+
+
+@dataclass(frozen=True)
+class UploadSession:
+    uri: str
+    offset: int
+    s3_key: str
+    size: int
+    started_at: int
+
+    @classmethod
+    def from_item(cls, item: Optional[Dict[str, Any]]) -> Optional["UploadSession"]:
+        """Build a session from the stored map (DynamoDB numbers arrive as Decimal)."""
+        if not item or not item.get("uri"):
+            return None
+        try:
+            return cls(
+                uri=str(item["uri"]),
+                offset=int(item.get("offset", 0)),
+                s3_key=str(item["s3Key"]),
+                size=int(item["size"]),
+                started_at=int(item["startedAt"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def to_item(self) -> Dict[str, Any]:
+        return {
+            "uri": self.uri,
+            "offset": self.offset,
+            "s3Key": self.s3_key,
+            "size": self.size,
+            "startedAt": self.started_at,
+        }
+
+    def usable_for(self, s3_key: str, size: int, now_ms: int) -> bool:
+        """A session only resumes the same rendered file, and only before it expires."""
+        return (
+            self.s3_key == s3_key
+            and self.size == size
+            and 0 <= self.offset <= size
+            and now_ms - self.started_at < SESSION_TTL_MS
+        )
+
+    def advanced(self, uri: str, offset: int) -> "UploadSession":
+        return replace(self, uri=uri, offset=offset)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Backfill MinHash signatures and LSH buckets for sayings stored before global dedup."""
+
+import pathlib
+import sys
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "generate_snippets_for_figure"))
+
+import text_utils  # noqa: E402
+
+
+def backfill(sayings_table_name: str = "sayings", buckets_table_name: str = "saying-buckets") -> None:
+    """Sign every saying and register it in its LSH buckets."""
+    dynamodb = boto3.resource("dynamodb")
+    sayings_table = dynamodb.Table(sayings_table_name)
+    buckets_table = dynamodb.Table(buckets_table_name)
+
+    print(f"Backfilling {buckets_table_name} from {sayings_table_name}")
+    print("-" * 60)
+
+    success_count = 0
+    error_count = 0
+    last_key = None
+    while True:
+        kwargs = {"ProjectionExpression": "pk, sk, #t", "ExpressionAttributeNames": {"#t": "text"}}
+        if last_key:
+            kwargs["ExclusiveStartKey"] = last_key
+        response = sayings_table.scan(**kwargs)
+        for item in response.get("Items") or []:
+            normalized = text_utils.normalize_ja(text_utils.sanitize(item.get("text", "")))
+            if not normalized:
+                continue
+            signature = text_utils.minhash_signature(normalized)
+            member = f"{item['pk']}|{item['sk']}"
+            try:
+                sayings_table.update_item(
+                    Key={"pk": item["pk"], "sk": item["sk"]},
+                    UpdateExpression="SET minhash = :minhash",
+                    ExpressionAttributeValues={":minhash": text_utils.pack_signature(signature)},
+                )
+                for bucket in text_utils.lsh_buckets(signature):
+                    buckets_table.update_item(
+                        Key={"pk": bucket},
+                        UpdateExpression="ADD members :member",
+                        ExpressionAttributeValues={":member": {member}},
+                    )
+                success_count += 1
+            except ClientError as e:
+                print(f"✗ Error indexing {member}: {e}")
+                error_count += 1
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            break
+
+    print("-" * 60)
+    print(f"Summary: {success_count} indexed, {error_count} errors")
+
+    if error_count > 0:
+        sys.exit(1)
+
+
+def main():
+    """Main entry point."""
+    sayings_table_name = sys.argv[1] if len(sys.argv) > 1 else "sayings"
+    buckets_table_name = sys.argv[2] if len(sys.argv) > 2 else "saying-buckets"
+    backfill(sayings_table_name, buckets_table_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Benchmark in-process audio duration parsing against ffprobe.
+
+Generates a short tone in every format OPENAI_TTS_FORMAT can produce (plus the
+m4a mix written by render_audio_video) with ffmpeg, then times
+audio_duration.read_duration and an ffprobe subprocess on each file.
+"""
+
+import argparse
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "render_audio_video"))
+
+import audio_duration  # noqa: E402
+
+# 形式ごとの ffmpeg 出力引数（OpenAI TTS と同じ 24kHz mono）
+FORMATS = {
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k"],
+    "opus": ["-c:a", "libopus", "-b:a", "32k"],
+    "aac": ["-c:a", "aac", "-b:a", "64k", "-f", "adts"],
+    "flac": ["-c:a", "flac"],
+    "wav": ["-c:a", "pcm_s16le"],
+    "pcm": ["-c:a", "pcm_s16le", "-f", "s16le"],
+    "m4a": ["-c:a", "aac", "-b:a", "192k"],
+}
+
+
+def _generate(directory: pathlib.Path, fmt: str, seconds: float) -> pathlib.Path:
+    path = directory / f"tone.{fmt}"
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:sample_rate=24000:duration={seconds}",
+            "-ac",
+            "1",
+            *FORMATS[fmt],
+            str(path),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return path
+
+
+def _ffprobe(path: pathlib.Path) -> float:
+    args = ["-f", "s16le", "-ar", "24000", "-ac", "1"] if path.suffix == ".pcm" else []
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            *args,
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            str(path),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout.strip())
+
+
+def _time(func, path: pathlib.Path, repeat: int):
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = func(path)
+        best = min(best, time.perf_counter() - started)
+    return value, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6.5, help="length of each test tone")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'format':<6} {'parsed s':>10} {'ffprobe s':>10} {'parse ms':>10} {'ffprobe ms':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for fmt in FORMATS:
+            path = _generate(pathlib.Path(tmpdir), fmt, args.seconds)
+            parsed, parse_time = _time(audio_duration.read_duration, path, args.repeat)
+            probed, probe_time = _time(_ffprobe, path, max(1, args.repeat // 4))
+            parsed_text = f"{parsed:10.3f}" if parsed is not None else f"{'n/a':>10}"
+            print(
+                f"{fmt:<6} {parsed_text} {probed:10.3f} {parse_time * 1000:10.3f} "
+                f"{probe_time * 1000:11.3f} {probe_time / parse_time:7.0f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark the NumPy timeline mixer against the ffmpeg amix graph.
+
+Synthesizes N tone clips and a BGM loop with ffmpeg, lays them out with
+render_audio_video._apply_timings, then times the legacy
+_concat_audio + _mix_audio_with_bgm path and audio_mixer.mix_timeline.
+Requires ffmpeg/ffprobe on PATH; no AWS or OpenAI access is made.
+"""
+
+import argparse
+import os
+import pathlib
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+LAMBDA_DIR = pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "render_audio_video"
+sys.path.insert(0, str(LAMBDA_DIR))
+sys.path.insert(0, str(LAMBDA_DIR.parent / "shared"))  # デプロイ時は main.py の隣に置かれる
+
+# main.py はインポート時に環境変数とクライアントを必要とする
+os.environ.setdefault("S3_BUCKET", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+import audio_mixer  # noqa: E402
+import main as render  # noqa: E402
+
+
+def _tone(path: pathlib.Path, seconds: float, frequency: int) -> None:
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency={frequency}:sample_rate=24000:duration={seconds:.2f}",
+            "-ac",
+            "1",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            "64k",
+            str(path),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _build_clips(tmp: pathlib.Path, count: int, seed: int):
+    rng = random.Random(seed)
+    clips = []
+    for index in range(1, count + 1):
+        path = tmp / f"clip_{index:02d}.mp3"
+        duration = rng.uniform(2.5, 7.0)
+        _tone(path, duration, 220 + index * 7)
+        clips.append(render.Clip(index=index, text="", audio_path=path, duration=render._probe_duration(path)))
+    render._apply_timings(clips)
+    return clips
+
+
+def _children_peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def _self_peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, nargs="+", default=[30, 60, 150])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'clips':>5} {'amix s':>8} {'numpy s':>8} {'speedup':>8}")
+    for count in args.clips:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = pathlib.Path(tmpdir)
+            clips = _build_clips(tmp, count, args.seed)
+            bgm = tmp / "bgm.mp3"
+            _tone(bgm, 45.0, 110)
+
+            started = time.perf_counter()
+            merged = render._concat_audio(tmp, clips)
+            render._mix_audio_with_bgm(tmp, merged, bgm)
+            legacy = time.perf_counter() - started
+
+            started = time.perf_counter()
+            audio_mixer.mix_timeline(
+                [(clip.audio_path, clip.start) for clip in clips],
+                bgm,
+                tmp / "audio_mixed.wav",
+                duration=clips[-1].end + 2.0,
+                voice_gain=render.VOICE_GAIN,
+                bgm_volume=render.BGM_VOLUME,
+            )
+            mixer = time.perf_counter() - started
+            print(f"{count:>5} {legacy:8.2f} {mixer:8.2f} {legacy / mixer:7.1f}x")
+
+    print(f"peak RSS: bench {_self_peak_rss_mb():.0f} MB, ffmpeg children {_children_peak_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Measure cold-start import time of each Lambda's main module with python -X importtime.
+
+Each handler is imported in a fresh interpreter (the function directory and
+lambdas/shared on sys.path, as in the bundled asset) --repeat times; the
+median cumulative import time of ``main`` is compared with the budget in
+scripts/import_time_budget.json. --check exits non-zero when a Lambda exceeds
+its budget by more than --tolerance, so regressions can gate CI; --update
+rewrites the budget from the current measurements (do this on the CI host,
+the numbers are machine dependent). No AWS, OpenAI or YouTube access is made.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+LAMBDAS_DIR = ROOT / "lambdas"
+BUDGET_PATH = pathlib.Path(__file__).with_name("import_time_budget.json")
+LAMBDAS = [
+    "select_and_lock_figure",
+    "generate_snippets_for_figure",
+    "render_audio_video",
+    "upload_youtube",
+    "lock_auto_release",
+]
+# import 時に必須の環境変数（値はダミー）
+ENV_DEFAULTS = {
+    "AWS_DEFAULT_REGION": "ap-northeast-1",
+    "S3_BUCKET": "bench",
+    "OPENAI_API_KEY": "bench",
+    "YT_CLIENT_ID": "bench",
+    "YT_CLIENT_SECRET": "bench",
+    "YT_REFRESH_TOKEN": "bench",
+    "METRICS_ENABLED": "false",
+}
+
+
+def _parse(stderr: str) -> List[Tuple[str, int, int]]:
+    """Return (name, self_us, cumulative_us) rows; nested imports keep their indentation."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(name: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Import main for one Lambda in a new interpreter; return (ms, its direct imports by ms)."""
+    env = {**ENV_DEFAULTS, **os.environ}
+    env["PYTHONPATH"] = os.pathsep.join([str(LAMBDAS_DIR / name), str(LAMBDAS_DIR / "shared")])
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=LAMBDAS_DIR / name,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"importing {name}/main.py failed:\n{completed.stderr[-2000:]}")
+    rows = _parse(completed.stderr)
+    position = max(i for i, (module, _, _) in enumerate(rows) if module == "main")
+    # main の直下で import されたモジュール（子は親より先に出力される）
+    children = []
+    for module, _, cumulative in reversed(rows[:position]):
+        if not module.startswith("  "):
+            break
+        if not module.startswith("   "):
+            children.append((module.strip(), cumulative / 1000))
+    children.sort(key=lambda row: row[1], reverse=True)
+    return rows[position][2] / 1000, children
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lambdas", nargs="+", choices=LAMBDAS, default=LAMBDAS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest direct imports of main to list")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fraction over budget")
+    parser.add_argument("--check", action="store_true", help="exit 1 when a Lambda is over budget")
+    parser.add_argument("--update", action="store_true", help="write the measurements as the new budget")
+    args = parser.parse_args()
+
+    budget: Dict[str, float] = json.loads(BUDGET_PATH.read_text()) if BUDGET_PATH.exists() else {}
+    results: Dict[str, float] = {}
+    over = []
+    print(f"{'lambda':<30} {'median ms':>10} {'budget ms':>10}")
+    for name in args.lambdas:
+        # 1 回目は .pyc の生成を含むので捨てる
+        measure(name)
+        samples = [measure(name) for _ in range(args.repeat)]
+        median = statistics.median(total for total, _ in samples)
+        results[name] = round(median, 1)
+        limit = budget.get(name)
+        flag = ""
+        if limit is not None and median > limit * (1 + args.tolerance):
+            over.append(name)
+            flag = "  OVER"
+        print(f"{name:<30} {median:10.1f} {limit if limit is not None else '-':>10}{flag}")
+        for module, ms in samples[-1][1][: args.top]:
+            print(f"    {module:<40} {ms:8.1f}")
+
+    if args.update:
+        budget.update(results)
+        BUDGET_PATH.write_text(json.dumps(budget, indent=2, sort_keys=True) + "\n")
+        print(f"budget written to {BUDGET_PATH}")
+    if args.check and over:
+        print(f"import time over budget: {', '.join(over)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""Render a synthetic figure with each encoder profile and report resource usage.
+
+Builds N tone clips, a BGM loop, a portrait and captions with ffmpeg, mixes
+the narration once with audio_mixer, then encodes the video with every
+profile in encoding.PROFILES (or --profiles). Each encode runs in its own
+worker process so CPU time and peak RSS (ffmpeg included) are per profile.
+Requires ffmpeg on PATH; no AWS or OpenAI access is made.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+LAMBDA_DIR = (
+    pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "render_audio_video"
+)
+sys.path.insert(0, str(LAMBDA_DIR))
+sys.path.insert(
+    0, str(LAMBDA_DIR.parent / "shared")
+)  # デプロイ時は main.py の隣に置かれる
+
+# main.py はインポート時に環境変数とクライアントを必要とする
+os.environ.setdefault("S3_BUCKET", "bench")
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+import audio_mixer  # noqa: E402
+import encoding  # noqa: E402
+import main as render  # noqa: E402
+
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(
+        ["ffmpeg", "-y", *args],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _prepare_inputs(tmp: pathlib.Path, count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    clips = []
+    for index in range(1, count + 1):
+        path = tmp / f"clip_{index:03d}.mp3"
+        duration = rng.uniform(2.5, 7.0)
+        _ffmpeg(
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency={220 + index * 7}:sample_rate=24000:duration={duration:.2f}",
+            "-ac",
+            "1",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            "64k",
+            str(path),
+        )
+        text = "".join(
+            rng.choice("人生とは選択の連続である") for _ in range(rng.randint(12, 40))
+        )
+        clips.append(
+            render.Clip(
+                index=index,
+                text=text,
+                audio_path=path,
+                duration=render._probe_duration(path),
+            )
+        )
+    render._apply_timings(clips)
+
+    bgm = tmp / "bgm.mp3"
+    _ffmpeg(
+        "-f",
+        "lavfi",
+        "-i",
+        "sine=frequency=110:duration=45",
+        "-c:a",
+        "libmp3lame",
+        str(bgm),
+    )
+    source = tmp / "portrait_source.png"
+    _ffmpeg(
+        "-f", "lavfi", "-i", "testsrc2=size=1024x1792", "-frames:v", "1", str(source)
+    )
+    render._prepare_portrait(source, tmp / "portrait.png")
+    render._write_ass(clips, tmp / "captions.ass")
+    audio_mixer.mix_timeline(
+        [(clip.audio_path, clip.start) for clip in clips],
+        bgm,
+        tmp / "audio_mixed.wav",
+        duration=clips[-1].end + 2.0,
+        voice_gain=render.VOICE_GAIN,
+        bgm_volume=render.BGM_VOLUME,
+    )
+    manifest = [
+        {
+            "index": c.index,
+            "text": c.text,
+            "path": str(c.audio_path),
+            "duration": c.duration,
+            "start": c.start,
+            "end": c.end,
+        }
+        for c in clips
+    ]
+    (tmp / "clips.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def _run_worker(tmp: pathlib.Path, profile_name: str) -> None:
+    """Encode once and print a JSON line; called in a fresh process per profile."""
+    manifest = json.loads((tmp / "clips.json").read_text(encoding="utf-8"))
+    clips = [
+        render.Clip(
+            index=m["index"],
+            text=m["text"],
+            audio_path=pathlib.Path(m["path"]),
+            duration=m["duration"],
+            start=m["start"],
+            end=m["end"],
+        )
+        for m in manifest
+    ]
+    audio = tmp / "audio_mixed.wav"
+    total_duration = max(clips[-1].end, render._probe_duration(audio))
+    output = tmp / f"out_{profile_name}.mp4"
+    profile = encoding.resolve_profile(profile_name, render.VIDEO_MODE)
+
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    render._encode_video(
+        tmp,
+        clips,
+        total_duration,
+        audio,
+        tmp / "captions.ass",
+        tmp / "portrait.png",
+        output,
+        profile,
+    )
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (
+        (after.ru_utime - before.ru_utime)
+        + (after.ru_stime - before.ru_stime)
+        + children.ru_utime
+        + children.ru_stime
+    )
+    print(
+        json.dumps(
+            {
+                "profile": profile_name,
+                "video_seconds": total_duration,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "peak_rss_mb": max(children.ru_maxrss, after.ru_maxrss) / 1024,
+                "size_mb": output.stat().st_size / (1 << 20),
+            }
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profiles", nargs="+", default=list(encoding.PROFILES))
+    parser.add_argument(
+        "--json", action="store_true", help="print raw JSON lines instead of a table"
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        _run_worker(pathlib.Path(args.workdir), args.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = pathlib.Path(tmpdir)
+        _prepare_inputs(tmp, args.clips, args.seed)
+        results = []
+        for name in args.profiles:
+            completed = subprocess.run(
+                [sys.executable, __file__, "--worker", name, "--workdir", str(tmp)],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    print(
+        f"{args.clips} clips, {results[0]['video_seconds']:.0f}s of video, {os.cpu_count()} CPUs"
+    )
+    print(
+        f"{'profile':>10} {'wall s':>8} {'cpu s':>8} {'x rt':>6} {'rss MB':>8} {'size MB':>8}"
+    )
+    for r in results:
+        speed = r["video_seconds"] / r["wall_s"]
+        print(
+            f"{r['profile']:>10} {r['wall_s']:8.2f} {r['cpu_s']:8.2f} {speed:5.1f}x {r['peak_rss_mb']:8.0f} {r['size_mb']:8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Drive render_audio_video.handler end to end offline and write per-stage timings.
+
+OpenAI TTS is replaced by ffmpeg tones whose length follows the narration
+speed, S3 by a directory tree and DynamoDB by in-memory tables, so the run
+needs only ffmpeg on PATH. Each (pipeline, clip count) pair renders a fresh
+synthetic figure; the JSON report (sorted keys, one entry per run) is meant
+to be committed or diffed between commits with --baseline.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+LAMBDA_DIR = pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "render_audio_video"
+sys.path.insert(0, str(LAMBDA_DIR))
+sys.path.insert(0, str(LAMBDA_DIR.parent / "shared"))  # デプロイ時は main.py の隣に置かれる
+
+# main.py はインポート時に環境変数とクライアントを必要とする
+os.environ.setdefault("S3_BUCKET", "bench")
+os.environ.setdefault("BGM_S3_KEY", "audio/bgm.mp3")
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+from botocore.exceptions import ClientError  # noqa: E402
+
+import main as render  # noqa: E402
+
+# 計測する段階。入れ子になるもの（_encode_video → _render_video など）は両方に計上される
+STAGES = [
+    ("render", "_load_sayings"),
+    ("render", "_synthesize_audio"),
+    ("render", "_resolve_bgm"),
+    ("render", "_resolve_portrait"),
+    ("render", "_concat_audio"),
+    ("render", "_mix_audio_with_bgm"),
+    ("audio_mixer", "mix_timeline"),
+    ("render", "_render_single_pass"),
+    ("render", "_encode_video"),
+    ("render", "_render_video"),
+    ("render", "_render_video_segmented"),
+    ("render", "_upload_outputs"),
+    ("render", "_update_figure_video"),
+]
+PIPELINES = {
+    "numpy": {"AUDIO_MIXER": "numpy", "RENDER_SINGLE_PASS": True},
+    "single-pass": {"AUDIO_MIXER": "ffmpeg", "RENDER_SINGLE_PASS": True},
+    "legacy": {"AUDIO_MIXER": "ffmpeg", "RENDER_SINGLE_PASS": False},
+    "numpy-stream": {"AUDIO_MIXER": "numpy", "RENDER_SINGLE_PASS": True, "RENDER_STREAM_OUTPUT": True},
+}
+# gpt-4o-mini-tts を speed=0.75 で読ませたときのおおよその速さ
+CHARS_PER_SECOND = 5.0
+WORDS = "人生とは選択の連続である学びて思わざれば則ち罔し天才とは努力する凡才のことだ"
+
+
+def _ffmpeg(*args: str) -> None:
+    subprocess.run(["ffmpeg", "-y", *args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _tone(path: pathlib.Path, seconds: float, frequency: int) -> None:
+    _ffmpeg(
+        "-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate=24000:duration={seconds:.2f}",
+        "-ac", "1", "-c:a", "libmp3lame", "-b:a", "64k", str(path),
+    )
+
+
+class LocalS3:
+    """The subset of the boto3 S3 client used by render_audio_video, backed by a directory."""
+
+    def __init__(self, root: pathlib.Path) -> None:
+        self.root = root
+        self.bytes_uploaded = 0
+
+    def _path(self, bucket: str, key: str) -> pathlib.Path:
+        return self.root / bucket / key
+
+    def _missing(self, operation: str) -> ClientError:
+        return ClientError({"Error": {"Code": "NoSuchKey", "Message": "missing"}}, operation)
+
+    def _etag(self, path: pathlib.Path) -> str:
+        stat = path.stat()
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):  # noqa: N803
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(Filename, path)
+        self.bytes_uploaded += path.stat().st_size
+        metadata = (ExtraArgs or {}).get("Metadata", {})
+        path.with_name(path.name + ".meta").write_text(json.dumps(metadata), encoding="utf-8")
+
+    def create_multipart_upload(self, Bucket, Key, **_):  # noqa: N803
+        self._multipart = {}
+        return {"UploadId": f"{Bucket}/{Key}"}
+
+    def upload_part(self, PartNumber, Body, **_):  # noqa: N803
+        self._multipart[PartNumber] = Body
+        self.bytes_uploaded += len(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, MultipartUpload, **_):  # noqa: N803
+        path = self._path(Bucket, Key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as handle:
+            for part in MultipartUpload["Parts"]:
+                handle.write(self._multipart[part["PartNumber"]])
+
+    def abort_multipart_upload(self, **_):
+        self._multipart = {}
+
+    def download_file(self, Bucket, Key, Filename):  # noqa: N803
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise ClientError({"Error": {"Code": "404", "Message": "missing"}}, "HeadObject")
+        shutil.copyfile(path, Filename)
+
+    def get_object(self, Bucket, Key):  # noqa: N803
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise self._missing("GetObject")
+        meta = path.with_name(path.name + ".meta")
+        metadata = json.loads(meta.read_text(encoding="utf-8")) if meta.exists() else {}
+        return {"Body": _Body(path), "Metadata": metadata, "ETag": self._etag(path)}
+
+    def head_object(self, Bucket, Key):  # noqa: N803
+        path = self._path(Bucket, Key)
+        if not path.exists():
+            raise self._missing("HeadObject")
+        return {"ETag": self._etag(path), "ContentLength": path.stat().st_size}
+
+    def list_objects_v2(self, Bucket, Prefix=""):  # noqa: N803
+        base = self.root / Bucket
+        contents = [
+            {"Key": str(path.relative_to(base)), "ETag": self._etag(path)}
+            for path in sorted(base.rglob("*"))
+            if path.is_file() and not path.name.endswith(".meta") and str(path.relative_to(base)).startswith(Prefix)
+        ]
+        return {"Contents": contents, "KeyCount": len(contents)}
+
+
+class _Body:
+    def __init__(self, path: pathlib.Path) -> None:
+        self._handle = path.open("rb")
+
+    def iter_chunks(self, chunk_size: int = 1 << 20):
+        with self._handle:
+            while chunk := self._handle.read(chunk_size):
+                yield chunk
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+class LocalTable:
+    """In-memory stand-in for a DynamoDB Table resource (query by pk and update_item)."""
+
+    def __init__(self, items=()) -> None:
+        self.items = list(items)
+        self.updates = []
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None, **_):  # noqa: N803
+        value = KeyConditionExpression.get_expression()["values"][1]
+        return {"Items": [item for item in self.items if item["pk"] == value]}
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+        return {}
+
+
+class ToneSpeech:
+    """Mimics openai_client.audio.speech.with_streaming_response.create with synthetic tones."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def create(self, input, **_):  # noqa: A002
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        seconds = 0.4 + len(input) / CHARS_PER_SECOND
+        yield _ToneResponse(seconds, 200 + len(input) * 5)
+
+
+class _ToneResponse:
+    def __init__(self, seconds: float, frequency: int) -> None:
+        self.seconds = seconds
+        self.frequency = frequency
+
+    def stream_to_file(self, path) -> None:
+        _tone(pathlib.Path(path), self.seconds, self.frequency)
+
+
+class _Namespace:
+    def __init__(self, **attrs) -> None:
+        self.__dict__.update(attrs)
+
+
+class StageTimer:
+    """Accumulates wall time and call counts for the wrapped stage functions."""
+
+    def __init__(self) -> None:
+        self.totals = defaultdict(lambda: {"seconds": 0.0, "calls": 0})
+        self._lock = threading.Lock()
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.totals[name]["seconds"] += elapsed
+                    self.totals[name]["calls"] += 1
+
+        return timed
+
+    def report(self):
+        return {name: {"seconds": round(v["seconds"], 3), "calls": v["calls"]} for name, v in self.totals.items()}
+
+
+@contextlib.contextmanager
+def _patched(settings, timer, s3, sayings_table, figures_table, speech):
+    modules = {"render": render, "audio_mixer": render.audio_mixer}
+    replacements = [(render, key, value) for key, value in settings.items()]
+    replacements += [
+        (render, "s3_client", s3),
+        (render, "sayings_table", sayings_table),
+        (render, "figures_table", figures_table),
+        (render, "openai_client", _Namespace(audio=_Namespace(speech=_Namespace(with_streaming_response=speech)))),
+    ]
+    replacements += [
+        (modules[module], attr, timer.wrap(attr, getattr(modules[module], attr))) for module, attr in STAGES
+    ]
+    originals = [(target, attr, getattr(target, attr)) for target, attr, _ in replacements]
+    try:
+        for target, attr, value in replacements:
+            setattr(target, attr, value)
+        yield
+    finally:
+        for target, attr, value in reversed(originals):
+            setattr(target, attr, value)
+
+
+def _seed_bucket(s3: LocalS3, assets: pathlib.Path, name: str) -> None:
+    s3.upload_file(str(assets / "bgm.mp3"), render.BGM_S3_BUCKET, render.BGM_S3_KEY)
+    s3.upload_file(str(assets / "portrait.png"), render.S3_BUCKET, f"portraits/{name}.png")
+    s3.bytes_uploaded = 0
+
+
+def _sayings(figure_pk: str, count: int, seed: int):
+    rng = random.Random(seed)
+    return [
+        {
+            "pk": figure_pk,
+            "sk": f"{index:04d}",
+            "text": "".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40))),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def run_once(assets, pipeline, count, seed, tts_latency, warm):
+    name = "ベンチ太郎"
+    figure_pk = "FIGURE#bench"
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        s3 = LocalS3(pathlib.Path(bucket_dir))
+        _seed_bucket(s3, assets, name)
+        sayings_table = LocalTable(_sayings(figure_pk, count, seed))
+        figures_table = LocalTable()
+        speech = ToneSpeech(tts_latency)
+        event = {"figurePk": figure_pk, "name": name}
+
+        if warm:
+            # TTS と肖像のキャッシュを温めてから計測する
+            with _patched(PIPELINES[pipeline], StageTimer(), s3, sayings_table, figures_table, speech):
+                render.handler(event, None)
+            speech.requests = 0
+            s3.bytes_uploaded = 0
+
+        timer = StageTimer()
+        with _patched(PIPELINES[pipeline], timer, s3, sayings_table, figures_table, speech):
+            started = time.perf_counter()
+            render.handler(event, None)
+            total = time.perf_counter() - started
+
+        video = s3.head_object(Bucket=render.S3_BUCKET, Key=f"out/{name}/final.mp4")
+        duration_ms = figures_table.updates[-1]["ExpressionAttributeValues"][":video"]["durationMs"]
+        return {
+            "pipeline": pipeline,
+            "clips": count,
+            "cache": "warm" if warm else "cold",
+            "total_seconds": round(total, 3),
+            "video_seconds": duration_ms / 1000,
+            "video_bytes": video["ContentLength"],
+            "uploaded_bytes": s3.bytes_uploaded,
+            "tts_requests": speech.requests,
+            "stages": timer.report(),
+        }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_comparison(report, baseline) -> None:
+    previous = {(r["pipeline"], r["clips"], r["cache"]): r for r in baseline["runs"]}
+    print(f"compared with {baseline.get('revision', '?')}")
+    for run in report["runs"]:
+        old = previous.get((run["pipeline"], run["clips"], run["cache"]))
+        if not old:
+            continue
+        print(f"{run['pipeline']} x{run['clips']} ({run['cache']}): "
+              f"{old['total_seconds']:.2f}s -> {run['total_seconds']:.2f}s")
+        for stage, values in sorted(run["stages"].items()):
+            before = old["stages"].get(stage, {}).get("seconds")
+            if before:
+                print(f"  {stage:<26} {before:8.2f} -> {values['seconds']:8.2f} ({values['seconds'] / before - 1:+.0%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, nargs="+", default=[30, 60, 150])
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES), default=list(PIPELINES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="seconds each fake TTS request sleeps")
+    parser.add_argument("--warm", action="store_true", help="render once first so the TTS/portrait caches hit")
+    parser.add_argument("--output", type=pathlib.Path, default=pathlib.Path("bench-render-pipeline.json"))
+    parser.add_argument("--baseline", type=pathlib.Path, help="previous report to compare against")
+    args = parser.parse_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as assets_dir:
+        assets = pathlib.Path(assets_dir)
+        _tone(assets / "bgm.mp3", 45.0, 110)
+        _ffmpeg("-f", "lavfi", "-i", "testsrc2=size=1024x1792", "-frames:v", "1", str(assets / "portrait.png"))
+        for count in args.clips:
+            for pipeline in args.pipelines:
+                run = run_once(assets, pipeline, count, args.seed, args.tts_latency, args.warm)
+                print(f"{pipeline:>12} x{count:<4} {run['total_seconds']:8.2f}s  ({run['video_seconds']:.0f}s of video)")
+                runs.append(run)
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {"seed": args.seed, "tts_latency": args.tts_latency, "profile": render.DEFAULT_PROFILE.name},
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"report written to {args.output}")
+    if args.baseline:
+        _print_comparison(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark near-duplicate checks in generate_snippets_for_figure.text_utils.
+
+Compares the full-matrix ``levenshtein_distance`` against the threshold-bounded
+``within_distance`` and a prebuilt ``NearDuplicateIndex`` on a workload
+shaped like one snippet batch: 15 candidates checked against 60 stored sayings
+with threshold 3.
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "generate_snippets_for_figure"))
+
+import text_utils  # noqa: E402
+
+ALPHABET = "あいうえおかきくけこさしすせそたちつてとなにぬねの志心道人天下義誠夢力"
+
+
+def _random_saying(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(8, 40)))
+
+
+def _build_workload(seed: int, stored: int, candidates: int):
+    rng = random.Random(seed)
+    existing = [text_utils.normalize_ja(_random_saying(rng)) for _ in range(stored)]
+    batch = [text_utils.normalize_ja(_random_saying(rng)) for _ in range(candidates)]
+    return existing, batch
+
+
+def _baseline(existing, batch, threshold):
+    distance = text_utils.levenshtein_distance.__wrapped__  # bypass lru_cache
+    return sum(
+        any(distance(candidate, text) <= threshold for text in existing) for candidate in batch
+    )
+
+
+def _bounded(existing, batch, threshold):
+    return sum(text_utils.is_similar(candidate, existing, threshold) for candidate in batch)
+
+
+def _indexed(index, batch, threshold):
+    return sum(index.has_within(candidate, threshold) for candidate in batch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stored", type=int, default=60)
+    parser.add_argument("--candidates", type=int, default=15)
+    parser.add_argument("--threshold", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    existing, batch = _build_workload(args.seed, args.stored, args.candidates)
+    index = text_utils.NearDuplicateIndex(existing)
+    expected = _baseline(existing, batch, args.threshold)
+    if _bounded(existing, batch, args.threshold) != expected:
+        sys.exit("within_distance disagrees with levenshtein_distance")
+    if _indexed(index, batch, args.threshold) != expected:
+        sys.exit("NearDuplicateIndex disagrees with levenshtein_distance")
+
+    results = {}
+    cases = (
+        ("levenshtein_distance", _baseline, existing),
+        ("within_distance", _bounded, existing),
+        ("NearDuplicateIndex", _indexed, index),
+    )
+    for label, func, stored in cases:
+        timer = timeit.Timer(lambda: func(stored, batch, args.threshold))
+        loops, _ = timer.autorange()
+        best = min(timer.repeat(repeat=args.repeat, number=loops)) / loops
+        results[label] = best
+        print(f"{label:<30} {best * 1000:9.3f} ms/batch")
+
+    for label in ("within_distance", "NearDuplicateIndex"):
+        speedup = results["levenshtein_distance"] / results[label]
+        print(f"{label + ' speedup':<30} {speedup:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+#!/bin/bash
+# CDK デプロイスクリプト
+# DynamoDB は既存テーブルへの 1 回の更新で GSI を 1 つしか追加できないため、
+# figures に schedule-index も lock-expiry-index も無い場合は 2 回に分けてデプロイします
+
+set -e
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PROJECT_ROOT="$(cd "${SCRIPT_DIR}/.." && pwd)"
+FIGURES_TABLE="figures"  # cdk/lib/stack.ts の tableName
+
+cd "${PROJECT_ROOT}"
+
+# テーブルが無い（初回デプロイ）ときは空になり、作成時はまとめて追加できる
+INDEXES="$(aws dynamodb describe-table --table-name "${FIGURES_TABLE}" \
+    --query "Table.GlobalSecondaryIndexes[].IndexName" --output text 2>/dev/null || true)"
+INDEXES="$(echo ${INDEXES})"  # タブ区切りを空白 1 つに揃える
+
+if [ -n "${INDEXES}" ] \
+    && [[ " ${INDEXES} " != *" schedule-index "* ]] \
+    && [[ " ${INDEXES} " != *" lock-expiry-index "* ]]; then
+    echo "📦 ${FIGURES_TABLE} に schedule-index を追加します（1/2）"
+    pnpm cdk:deploy -c figuresIndexStage=schedule "$@"
+    echo "📦 lock-expiry-index を追加します（2/2）"
+fi
+
+pnpm cdk:deploy "$@"
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """Initialize DynamoDB with sample historical figures."""
 
+import pathlib
 import sys
 import boto3
 from botocore.exceptions import ClientError
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "lambdas" / "shared"))
+
+import figure_status  # noqa: E402
+import schedule  # noqa: E402
+
 # Sample historical figures
 SAMPLE_FIGURES = [
     {
@@ -90,7 +96,7 @@ def init_figures_table(table_name: str = "figures") -> None:
                 continue
 
             # Put new item
-            table.put_item(Item=figure)
+            table.put_item(Item=to_item(figure))
             print(f"✓ Added: {figure['name']} ({figure['pk']})")
             success_count += 1
 
@@ -105,6 +111,16 @@ def init_figures_table(table_name: str = "figures") -> None:
         sys.exit(1)
 
 
+def to_item(figure: dict) -> dict:
+    """Store the status write-sharded and queue available figures on schedule-index."""
+    item = dict(figure)
+    state = figure_status.state_of(item["status"])
+    item["status"] = figure_status.value(state, item["pk"])
+    if state == figure_status.AVAILABLE:
+        item.setdefault(schedule.SCHEDULE_KEY, schedule.ready_key_for(item))
+    return item
+
+
 def verify_table_exists(table_name: str = "figures") -> bool:
     """Check if the DynamoDB table exists."""
     try:
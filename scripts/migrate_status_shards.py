@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Rewrite figures.status to write-sharded values (available#07, locked#03, ...).
+
+Run after deploying Lambdas that read sharded status, or after changing
+STATUS_SHARDS. Every item is scanned once; available/locked items whose status
+is not the value for the current shard count are rewritten with a condition on
+the old value, so a concurrent select/release simply wins. Available items
+without a scheduleKey are also put on schedule-index. Safe to run repeatedly.
+"""
+
+import argparse
+import sys
+
+from botocore.exceptions import ClientError
+
+from init_dynamodb import boto3, figure_status, schedule, to_item, verify_table_exists
+
+
+def migrate(table_name: str, shards: int, dry_run: bool = False) -> None:
+    table = boto3.resource("dynamodb").Table(table_name)
+    print(f"Migrating status shards on {table_name} (STATUS_SHARDS={shards})")
+    print("-" * 60)
+
+    updated = skipped = errors = 0
+    kwargs = {
+        "ProjectionExpression": "pk, #s, #k, priority, lastAttemptAt",
+        "ExpressionAttributeNames": {"#s": "status", "#k": schedule.SCHEDULE_KEY},
+    }
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get("Items", []):
+            status = item.get("status", "")
+            target = figure_status.value(figure_status.state_of(status), item["pk"], shards)
+            key = to_item({**item, "status": target}).get(schedule.SCHEDULE_KEY)
+            if status == target and key == item.get(schedule.SCHEDULE_KEY):
+                skipped += 1
+                continue
+            print(f"{'(dry-run) ' if dry_run else ''}{item['pk']}: {status} -> {target}")
+            if dry_run:
+                updated += 1
+                continue
+            sets = ["#s = :target"]
+            names = {"#s": "status"}
+            values = {":target": target, ":old": status}
+            if key and key != item.get(schedule.SCHEDULE_KEY):
+                sets.append("#k = :key")
+                names["#k"] = schedule.SCHEDULE_KEY
+                values[":key"] = key
+            try:
+                table.update_item(
+                    Key={"pk": item["pk"]},
+                    UpdateExpression="SET " + ", ".join(sets),
+                    ConditionExpression="#s = :old",
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                )
+                updated += 1
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                    print(f"⏩ Skipped (changed concurrently): {item['pk']}")
+                    skipped += 1
+                    continue
+                print(f"✗ Error updating {item['pk']}: {e}")
+                errors += 1
+        if "LastEvaluatedKey" not in response:
+            break
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    print("-" * 60)
+    print(f"Summary: {updated} updated, {skipped} unchanged, {errors} errors")
+    if errors:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", default="figures")
+    parser.add_argument("--shards", type=int, default=figure_status.STATUS_SHARDS)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not verify_table_exists(args.table):
+        sys.exit(1)
+    migrate(args.table, max(1, args.shards), args.dry_run)
+
+
+if __name__ == "__main__":
+    main()